@@ -1,14 +1,132 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
 from .models import Comment, Follow, Group, Post
 
 EMPTY_VALUE_DISPLAY = '-пусто-'
 
 
-class PostAdmin(admin.ModelAdmin):
+def estimate_rows(model, using):
+    """Примерное число строк таблицы model без COUNT(*) или None.
+
+    В SQLite - разница крайних rowid (два шага по B-дереву), она
+    завышает число строк на число удалённых; в PostgreSQL - оценка
+    планировщика из pg_class.
+    """
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f'SELECT MAX(rowid) - MIN(rowid) + 1 FROM {table}'
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass', (model._meta.db_table,)
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для списков админки без точного COUNT(*) большой таблицы.
+
+    Без фильтров число строк оценивается по таблице (estimate_rows), с
+    фильтрами или поиском - считается, но не дальше COUNT_LIMIT строк:
+    глубже листать такой список незачем, его надо уточнить.
+    Маленькие таблицы считаются точно.
+    """
+    COUNT_LIMIT = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.COUNT_LIMIT:
+                return estimate
+        # COUNT(*) по подзапросу с LIMIT останавливается на COUNT_LIMIT
+        return queryset.order_by()[:self.COUNT_LIMIT].count()
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """Фильтр по внешнему ключу с полем автодополнения вместо списка.
+
+    RelatedFieldListFilter выводит в боковую панель все объекты
+    связанной модели, для пользователей это вся таблица. Здесь значения
+    подгружаются по мере ввода из autocomplete_view админки связанной
+    модели, поэтому у неё должны быть search_fields.
+    """
+    template = 'admin/posts/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin,
+                 field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        # очищенное поле select2 присылает пустое значение
+        self.lookup_val = params.get(self.lookup_kwarg) or None
+        if self.lookup_val is None:
+            params.pop(self.lookup_kwarg, None)
+        super().__init__(field, request, params, model, model_admin,
+                         field_path)
+        self.admin_site = model_admin.admin_site
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        field = forms.ModelChoiceField(
+            self.field.remote_field.model._default_manager.all(),
+            required=False,
+            widget=AutocompleteSelect(
+                self.field.remote_field, self.admin_site,
+                attrs={'onchange': 'this.form.submit()'}
+            )
+        )
+        # параметры остальных фильтров, поиска и сортировки сохраняются,
+        # номер страницы - нет
+        hidden = [
+            (name, value) for name, value in changelist.params.items()
+            if value and name not in (self.lookup_kwarg, PAGE_VAR)
+        ]
+        yield {
+            'selected': self.lookup_val is not None,
+            'widget': field.widget.render(self.lookup_kwarg, self.lookup_val),
+            'hidden': hidden,
+            'reset_url': changelist.get_query_string(
+                remove=[self.lookup_kwarg]
+            ),
+        }
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список объектов для таблиц в миллионы строк.
+
+    Вместо двух COUNT(*) на каждую загрузку списка - оценка числа
+    строк, внешние ключи в форме и фильтрах - с автодополнением.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        # select2 для фильтров AutocompleteFilter, в форме он и так есть
+        return super().media + AutocompleteSelect(None, self.admin_site).media
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author')
-    search_fields = ('text',)
-    list_filter = ('pub_date',)
+    list_select_related = ('author',)
+    search_fields = ('text', 'author__username')
+    list_filter = ('pub_date', ('author', AutocompleteFilter))
+    autocomplete_fields = ('author', 'group')
     empty_value_display = EMPTY_VALUE_DISPLAY
 
 
@@ -17,16 +135,25 @@ class GroupAdmin(admin.ModelAdmin):
     search_fields = ('title', 'description', 'slug')
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ('pk', 'text', 'created', 'author', 'post')
-    search_fields = ('text', 'author', 'post')
-    list_filter = ('created',)
+    list_select_related = ('author', 'post')
+    search_fields = ('text', 'author__username')
+    list_filter = ('created', ('author', AutocompleteFilter))
+    autocomplete_fields = ('author', 'post')
+    # по первичному ключу - без сортировки всей таблицы ради одной страницы
+    ordering = ('-pk',)
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('pk', 'user', 'author')
-    search_fields = ('user', 'author')
-    list_filter = ('user',)
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    list_filter = (
+        ('user', AutocompleteFilter), ('author', AutocompleteFilter)
+    )
+    autocomplete_fields = ('user', 'author')
+    ordering = ('-pk',)
 
 
 admin.site.register(Post, PostAdmin)
@@ -0,0 +1,292 @@
+"""JSON API для чтения лент: те же данные, что у index, group_posts,
+profile, post_view и follow_index, но без отрисовки шаблонов.
+
+- Ленты и комментарии записи листаются курсором (posts.paginators):
+  ?cursor= из ссылок next и previous ответа, ?limit= - размер порции
+  до API_PAGE_MAX_SIZE.
+- ?fields=id,text,author - только нужные поля записей. Из базы
+  читаются только их колонки, а связанные автор и подборка
+  подтягиваются тем же запросом, только если нужны.
+- Ответ отдаётся потоком по записи и сжимается gzip, если клиент его
+  принимает.
+- ETag считается по самой новой дате публикации и изменения записей
+  порции, числу их комментариев, остальным данным ответа (профиль,
+  подборка) и параметрам запроса; совпавший
+  If-None-Match получает 304 без сериализации.
+"""
+import hashlib
+import json
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from django.views.decorators.gzip import gzip_page
+
+from yatube.replicas import replica_reads
+
+from . import timeline
+from .models import AuthorStats, Follow, Group, Post, TimelineEntry, User
+from .paginators import CursorPaginator, InvalidCursor
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class Field:
+    """Поле записи в ответе: значение и что для него читать из базы.
+
+    columns - аргументы only(), related - аргументы select_related().
+    """
+
+    def __init__(self, value, columns=(), related=()):
+        self.value = value
+        self.columns = columns
+        self.related = related
+
+
+def _post_url(post):
+    return reverse('post', args=(post.author.username, post.pk))
+
+
+POST_FIELDS = {
+    'id': Field(lambda post: post.pk),
+    'text': Field(lambda post: post.text, ('text',)),
+    'pub_date': Field(lambda post: post.pub_date.isoformat()),
+    'author': Field(lambda post: post.author.username,
+                    ('author', 'author__username'), ('author',)),
+    'group': Field(lambda post: post.group.slug if post.group else None,
+                   ('group', 'group__slug'), ('group',)),
+    'image': Field(lambda post: post.image.url if post.image else None,
+                   ('image',)),
+    'comment_count': Field(lambda post: post.comment_count),
+    'url': Field(_post_url, ('author', 'author__username'), ('author',)),
+}
+# нужны всегда: ключ курсора и ETag
+POST_COLUMNS = ('pub_date', 'updated_at', 'comment_count')
+
+
+def requested_fields(request):
+    value = request.GET.get('fields')
+    if not value:
+        return list(POST_FIELDS)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = sorted(set(names) - POST_FIELDS.keys())
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}. '
+                       f'Есть: {", ".join(POST_FIELDS)}.')
+    return names
+
+
+def posts_for(fields, queryset=None):
+    """Записи только с колонками и связями, нужными полям fields."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    columns, related = set(POST_COLUMNS), set()
+    for name in fields:
+        columns.update(POST_FIELDS[name].columns)
+        related.update(POST_FIELDS[name].related)
+    # select_related() без аргументов подтянул бы все связи
+    queryset = queryset.select_related(None)
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    return queryset.only(*sorted(columns))
+
+
+def serialize_post(post, fields):
+    return {name: POST_FIELDS[name].value(post) for name in fields}
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', settings.PAGINATOR_DEFAULT_SIZE))
+    except ValueError:
+        raise ApiError('limit должен быть числом.')
+    if not 1 <= size <= settings.API_PAGE_MAX_SIZE:
+        raise ApiError(f'limit - от 1 до {settings.API_PAGE_MAX_SIZE}.')
+    return size
+
+
+def cursor_page(request, queryset, date_field='pub_date'):
+    paginator = CursorPaginator(queryset, page_size(request), date_field)
+    try:
+        return paginator.page(request.GET.get('cursor') or None)
+    except InvalidCursor:
+        raise ApiError('Неверный cursor.')
+
+
+def cursor_url(request, cursor):
+    if cursor is None:
+        return None
+    params = {key: value for key, value in request.GET.items()
+              if key != 'cursor'}
+    return f'{request.path}?{urlencode({**params, "cursor": cursor})}'
+
+
+def page_etag(request, posts, meta):
+    """ETag порции по самым новым датам записей, числу комментариев и meta.
+
+    meta - счётчики и подписка в профиле, описание подборки: они
+    меняются и без изменения самих записей.
+    """
+    state = (
+        json.dumps(meta, sort_keys=True),
+        max((post.pub_date for post in posts), default=None),
+        max((post.updated_at for post in posts), default=None),
+        sum(post.comment_count for post in posts),
+        [post.pk for post in posts],
+        request.user.pk,
+        sorted(request.GET.lists()),
+    )
+    return quote_etag(hashlib.md5(repr(state).encode()).hexdigest())
+
+
+def stream_document(meta, results):
+    """JSON-объект meta с ключом results, который пишется по элементу."""
+    head = json.dumps(meta, ensure_ascii=False)[:-1]
+    yield (head + (', ' if meta else '') + '"results": [').encode()
+    for number, item in enumerate(results):
+        yield ((', ' if number else '')
+               + json.dumps(item, ensure_ascii=False)).encode()
+    yield b']}'
+
+
+def json_response(request, posts, meta, results):
+    """Потоковый ответ с ETag или 304, если клиент уже его видел."""
+    etag = page_etag(request, posts, meta)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = StreamingHttpResponse(
+            stream_document(meta, results),
+            content_type='application/json'
+        )
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def feed_response(request, queryset, fields, meta=None):
+    """Порция ленты записей queryset."""
+    page = cursor_page(request, queryset)
+    posts = page.object_list
+    meta = {
+        **(meta or {}),
+        'next': cursor_url(request, page.next_cursor),
+        'previous': cursor_url(request, page.previous_cursor),
+    }
+    return json_response(
+        request, posts, meta,
+        (serialize_post(post, fields) for post in posts)
+    )
+
+
+def api_view(view):
+    """GET-представление API: ошибки - JSON с полем detail."""
+    @replica_reads
+    @gzip_page
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return JsonResponse({'detail': 'Только GET.'}, status=405)
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'detail': str(error)}, status=error.status)
+        except Http404:
+            return JsonResponse({'detail': 'Не найдено.'}, status=404)
+    return wrapper
+
+
+@api_view
+def index(request):
+    fields = requested_fields(request)
+    return feed_response(request, posts_for(fields), fields)
+
+
+@api_view
+def group_posts(request, slug):
+    fields = requested_fields(request)
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(
+        request, posts_for(fields, group.posts.all()), fields,
+        {'group': {'slug': group.slug, 'title': group.title,
+                   'description': group.description}}
+    )
+
+
+def serialize_user(user, stats):
+    return {
+        'username': user.username,
+        'full_name': user.get_full_name(),
+        'posts_count': stats.posts_count,
+        'followers_count': stats.followers_count,
+        'following_count': stats.following_count,
+    }
+
+
+@api_view
+def profile(request, username):
+    fields = requested_fields(request)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    user = serialize_user(author, AuthorStats.objects.for_user(author))
+    if request.user.is_authenticated:
+        user['following'] = Follow.objects.filter(
+            user=request.user, author=author
+        ).exists()
+    return feed_response(
+        request, posts_for(fields, author.posts.all()), fields,
+        {'user': user}
+    )
+
+
+@api_view
+def post_view(request, username, post_id):
+    fields = requested_fields(request)
+    post = get_object_or_404(
+        posts_for(fields), author__username=username, id=post_id
+    )
+    # порция читается до ответа: поток пишется уже после выхода из view
+    page = cursor_page(request, post.comments.select_related('author').only(
+        'post', 'text', 'created', 'author', 'author__username'
+    ), date_field='created')
+    return json_response(
+        request, [post],
+        {'post': serialize_post(post, fields),
+         'next': cursor_url(request, page.next_cursor),
+         'previous': cursor_url(request, page.previous_cursor)},
+        ({'id': comment.pk, 'author': comment.author.username,
+          'text': comment.text, 'created': comment.created.isoformat()}
+         for comment in page.object_list)
+    )
+
+
+@api_view
+def follow_index(request):
+    if not request.user.is_authenticated:
+        raise ApiError('Нужна авторизация.', status=401)
+    fields = requested_fields(request)
+    feed = timeline.follow_feed(request.user)
+    if feed.model is not TimelineEntry:
+        return feed_response(request, posts_for(fields, feed), fields)
+    page = cursor_page(request, feed)
+    entries = page.object_list
+    posts = posts_for(fields).in_bulk(
+        [entry.post_id for entry in entries]
+    )
+    posts = [posts[entry.post_id] for entry in entries
+             if entry.post_id in posts]
+    return json_response(
+        request, posts,
+        {'next': cursor_url(request, page.next_cursor),
+         'previous': cursor_url(request, page.previous_cursor)},
+        (serialize_post(post, fields) for post in posts)
+    )
@@ -0,0 +1,188 @@
+"""Кеширование лент записей.
+
+Карточки includes/post_item.html кешируются по одной: отдельно для
+автора записи (с кнопкой "Редактировать") и для всех остальных.
+Ключи сбрасываются сигналами из posts.signals при изменении записи,
+её комментариев или подборки.
+
+Страницы index и group для анонимов кешируются целиком под номером
+поколения лент, который те же сигналы увеличивают при любом изменении.
+
+В кеш не попадает ничего, прочитанного с реплики (yatube.replicas).
+
+Страницы записи и профиля не кешируются, но отвечают 304 на условный
+GET по дешёвым валидаторам, см. conditional_page.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from yatube.replicas import primary_reads, reading_replica
+
+# поднять при изменении разметки includes/post_item.html и вложенных
+POST_CARD_VERSION = 3
+
+
+def post_card_key(post_id, is_author):
+    return f'post_card:{POST_CARD_VERSION}:{post_id}:{int(is_author)}'
+
+
+def get_post_cards(keys):
+    return cache.get_many(keys)
+
+
+def set_post_cards(cards):
+    # отрисованное по отстающей реплике пережило бы сброс карточки
+    if reading_replica():
+        return
+    cache.set_many(cards, settings.POST_CARD_CACHE_TIMEOUT)
+
+
+def invalidate_post_cards(post_ids):
+    """Сбросить карточки записей post_ids сейчас и после коммита.
+
+    Повторный сброс после коммита не даёт закешировать карточку,
+    отрендеренную параллельным запросом по ещё старым данным.
+    """
+    keys = [post_card_key(post_id, is_author)
+            for post_id in post_ids for is_author in (False, True)]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+FEED_GENERATION_KEY = 'feed_generation'
+FEED_MODIFIED_KEY = 'feed_modified'
+
+
+def feed_generation():
+    """Текущие (поколение лент, время его начала в секундах).
+
+    Если счётчик вытеснен из кеша, новое поколение начинается с текущего
+    времени в миллисекундах - заведомо больше всех прежних номеров.
+    Кеш, который ничего не хранит (DummyCache), даёт каждый раз новое.
+    """
+    keys = (FEED_GENERATION_KEY, FEED_MODIFIED_KEY)
+    values = cache.get_many(keys)
+    if len(values) < len(keys):
+        now = time.time()
+        # add, а не set: другой процесс мог успеть начать поколение
+        cache.add(FEED_GENERATION_KEY, int(now * 1000), None)
+        cache.add(FEED_MODIFIED_KEY, now, None)
+        values = {FEED_GENERATION_KEY: int(now * 1000),
+                  FEED_MODIFIED_KEY: now, **cache.get_many(keys)}
+    return values[FEED_GENERATION_KEY], values[FEED_MODIFIED_KEY]
+
+
+def _bump_feed_generation():
+    try:
+        cache.incr(FEED_GENERATION_KEY)
+    except ValueError:
+        feed_generation()
+    cache.set(FEED_MODIFIED_KEY, time.time(), None)
+
+
+def bump_feed_generation():
+    """Начать новое поколение лент сейчас и ещё раз после коммита."""
+    _bump_feed_generation()
+    transaction.on_commit(_bump_feed_generation)
+
+
+def anonymous_page_key(request, generation):
+    page = request.GET.get('page', '')
+    cursor = request.GET.get('cursor', '')
+    raw = f'{request.path}?page={page}&cursor={cursor}'.encode()
+    return f'anon_page:{generation}:{hashlib.md5(raw).hexdigest()}'
+
+
+def cache_anonymous_page(view):
+    """Кешировать страницу ленты целиком для анонимных посетителей.
+
+    Ключ - путь, параметры page/cursor и поколение лент, поэтому после
+    любого изменения записей старые страницы больше не выдаются. Ответ
+    несёт ETag и Last-Modified, повторный условный GET получает 304.
+    Авторизованным страница всегда рендерится заново: в карточках есть
+    кнопки, зависящие от пользователя.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated):
+            return view(request, *args, **kwargs)
+
+        generation, modified = feed_generation()
+        key = anonymous_page_key(request, generation)
+        cached = cache.get(key)
+        if cached is None:
+            # страница ляжет в кеш на ANONYMOUS_PAGE_CACHE_TIMEOUT -
+            # рендерим её по default, а не по отстающей реплике
+            with primary_reads():
+                response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            etag = quote_etag(hashlib.md5(response.content).hexdigest())
+            cache.set(key, (response.content, etag),
+                      settings.ANONYMOUS_PAGE_CACHE_TIMEOUT)
+        else:
+            content, etag = cached
+            response = HttpResponse(content)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(modified)
+        patch_vary_headers(response, ('Cookie',))
+        return get_conditional_response(
+            request, etag=etag, last_modified=int(modified),
+            response=response
+        )
+    return wrapper
+
+
+def conditional_page(validators):
+    """Отвечать 304 на условный GET, не рендеря страницу.
+
+    validators(request, *args, **kwargs) возвращает None (страницы нет,
+    пусть ответит сама view) или пару (данные, дата изменения): ETag
+    считается от данных, Last-Modified - дата. Для авторизованных
+    Last-Modified не выдаётся: по дате не видно смены пользователя,
+    а ETag включает его id.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            state = validators(request, *args, **kwargs)
+            if state is None:
+                return view(request, *args, **kwargs)
+
+            data, modified = state
+            user_id = request.user.pk
+            raw = repr((data, user_id, sorted(request.GET.lists())))
+            etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+            last_modified = None
+            if user_id is None and modified is not None:
+                last_modified = int(modified.timestamp())
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is not None:
+                response['ETag'] = etag
+                return response
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                if last_modified is not None:
+                    response['Last-Modified'] = http_date(last_modified)
+                patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,60 @@
+"""Изменение поддерживаемых счётчиков AuthorStats и Post.comment_count.
+
+Функции вызывают сигналы post_save и post_delete из posts.signals,
+так что учитываются записи, комментарии и подписки, созданные и
+удалённые любым путём: views, админка, ORM, каскад от удалённого
+пользователя. Счётчик меняется выражением F() без чтения, уменьшение
+не опускает его ниже нуля. bulk_create сигналов не шлёт, после него
+счётчики пересчитывает recount_stats.
+Поле updated_at обновляется вместе со счётчиком: от него считаются
+валидаторы условного GET (posts.cache.conditional_page).
+"""
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AuthorStats, Post
+
+
+def _change_author_stats(user, delta, *fields):
+    changes = {field: F(field) + delta for field in fields}
+    changes['updated_at'] = timezone.now()
+    if not AuthorStats.objects.filter(user=user).update(**changes):
+        # строки ещё нет - for_user посчитает уже с учётом изменения
+        AuthorStats.objects.for_user(user)
+
+
+def _decrement_author_stats(user_id, field):
+    # строку не создаём: при каскаде автор удаляется вместе с ней
+    AuthorStats.objects.filter(
+        user_id=user_id, **{f'{field}__gt': 0}
+    ).update(**{field: F(field) - 1, 'updated_at': timezone.now()})
+
+
+def follow_added(follow):
+    _change_author_stats(follow.user, 1, 'following_count')
+    _change_author_stats(follow.author, 1, 'followers_count')
+
+
+def follow_deleted(follow):
+    _decrement_author_stats(follow.user_id, 'following_count')
+    _decrement_author_stats(follow.author_id, 'followers_count')
+
+
+def post_added(post):
+    _change_author_stats(post.author, 1, 'posts_count')
+
+
+def post_deleted(post):
+    _decrement_author_stats(post.author_id, 'posts_count')
+
+
+def comment_added(comment):
+    Post.objects.filter(pk=comment.post_id).update(
+        comment_count=F('comment_count') + 1, updated_at=timezone.now()
+    )
+
+
+def comment_deleted(comment):
+    Post.objects.filter(pk=comment.post_id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1, updated_at=timezone.now()
+    )
@@ -1,6 +1,7 @@
 from django import forms
 
-from .models import Comment, Post
+from .models import Comment, Group, Post, User
+from .uploads import RejectedUpload
 
 
 class PostForm(forms.ModelForm):
@@ -18,6 +19,22 @@ class PostForm(forms.ModelForm):
                       ' Вы желаете разместить своё сообщение.'),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # файл, отклонённый posts.uploads.ImageUploadHandler, в поле не
+        # передаём: вместо общей ошибки ImageField покажем причину
+        self.upload_error = None
+        image = self.files.get('image')
+        if isinstance(image, RejectedUpload):
+            self.upload_error = image.error
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean_image(self):
+        if self.upload_error:
+            raise forms.ValidationError(self.upload_error)
+        return self.cleaned_data['image']
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -33,3 +50,31 @@ class CommentForm(forms.ModelForm):
             'text': ('Это поле для ввода текста Вашего комментария. '
                      'Текст будет виден на сайте как есть.'),
         }
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(
+        label='Что искать', max_length=200,
+        widget=forms.TextInput(attrs={'placeholder': 'Слова из записи'})
+    )
+    group = forms.ModelChoiceField(
+        Group.objects.all(), to_field_name='slug', required=False,
+        label='Подборка', empty_label='Все подборки'
+    )
+    author = forms.CharField(
+        label='Автор', max_length=150, required=False,
+        widget=forms.TextInput(attrs={'placeholder': 'Имя автора'})
+    )
+    sort = forms.ChoiceField(
+        label='Порядок', required=False,
+        choices=(('', 'По релевантности'), ('new', 'Сначала новые'))
+    )
+
+    def clean_author(self):
+        username = self.cleaned_data['author']
+        if not username:
+            return None
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise forms.ValidationError('Такого автора нет.')
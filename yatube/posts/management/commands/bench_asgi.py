@@ -0,0 +1,168 @@
+import asyncio
+import io
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from yatube.asgi import WsgiToAsgi, build_environ, run_wsgi
+from yatube.wsgi import application as wsgi_application
+
+from .bench_templates import DUMMY_CACHES
+from .bench_views import percentile, scenarios
+
+FEEDS = ('index', 'group', 'profile', 'follow_index')
+
+
+def make_scope(url, host, cookie):
+    parts = urlsplit(url)
+    headers = [(b'host', host.encode())]
+    if cookie:
+        headers.append((b'cookie', cookie.encode()))
+    return {
+        'type': 'http', 'http_version': '1.1', 'method': 'GET',
+        'path': parts.path, 'query_string': parts.query.encode(),
+        'headers': headers, 'server': (host, 80),
+        'client': ('127.0.0.1', 0),
+    }
+
+
+class WsgiServer:
+    """Многопоточный WSGI-сервер: поток занят запросом от приёма до ответа.
+
+    Медленный клиент (client_delay) держит поток, пока шлёт запрос.
+    """
+
+    def __init__(self, threads, client_delay):
+        self.executor = ThreadPoolExecutor(threads)
+        self.client_delay = client_delay
+
+    def handle(self, scope):
+        time.sleep(self.client_delay)
+        environ = build_environ(scope, io.BytesIO())
+        response = {}
+
+        def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+
+        run_wsgi(wsgi_application, environ, send, threading.Event())
+        return response['status']
+
+    async def request(self, scope):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.handle, scope)
+
+
+class AsgiServer:
+    """yatube.asgi: запрос принимает цикл, поток занят только Django."""
+
+    def __init__(self, threads, client_delay):
+        self.application = WsgiToAsgi(wsgi_application, threads)
+        self.executor = self.application.executor
+        self.client_delay = client_delay
+
+    async def request(self, scope):
+        response = {}
+        sent = asyncio.Event()
+
+        async def receive():
+            if sent.is_set():
+                # тело уже отправлено: клиент ждёт ответа, не отключаясь
+                await asyncio.get_running_loop().create_future()
+            sent.set()
+            await asyncio.sleep(self.client_delay)
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+
+        await self.application(scope, receive, send)
+        return response['status']
+
+
+async def load(server, scope, requests, concurrency):
+    """requests запросов от concurrency клиентов: задержки в мс и время."""
+    timings = []
+    remaining = iter(range(requests))
+
+    async def client():
+        for _ in remaining:
+            started = time.perf_counter()
+            status = await server.request(scope)
+            timings.append((time.perf_counter() - started) * 1000)
+            if status != 200:
+                raise CommandError(f'{scope["path"]}: ответ {status}')
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return timings, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ('Сравнить yatube.wsgi и yatube.asgi на лентах (index, group, '
+            'profile, follow_index) при одинаковом числе потоков Django: '
+            'запросы в секунду и p50/p99 задержки при заданном числе '
+            'одновременных клиентов. --client-delay моделирует медленную '
+            'сеть: в WSGI это время занимает поток, в ASGI - нет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument(
+            '--client-delay', type=float, default=0,
+            help='Сколько миллисекунд клиент шлёт запрос.'
+        )
+        parser.add_argument('--no-cache', action='store_true')
+
+    def handle(self, *args, **options):
+        overrides = {'DEBUG': False}
+        if options['no_cache']:
+            overrides['CACHES'] = DUMMY_CACHES
+        with override_settings(**overrides):
+            self.run(options)
+
+    def run(self, options):
+        host = next((host for host in settings.ALLOWED_HOSTS
+                     if host != '*' and not host.startswith('.')),
+                    'localhost')
+        delay = options['client_delay'] / 1000
+        self.stdout.write(
+            f'{"страница":<14} {"сервер":<6} {"запр/с":>8} '
+            f'{"p50, мс":>8} {"p99, мс":>8}'
+        )
+        for name, url, user in scenarios():
+            if name not in FEEDS:
+                continue
+            cookie = None
+            if user is not None:
+                client = Client()
+                client.force_login(user)
+                session = client.cookies[settings.SESSION_COOKIE_NAME]
+                cookie = f'{session.key}={session.value}'
+            scope = make_scope(url, host, cookie)
+            for server_name, server_class in (('wsgi', WsgiServer),
+                                              ('asgi', AsgiServer)):
+                server = server_class(options['threads'], delay)
+                cache.clear()
+                try:
+                    timings, elapsed = asyncio.run(load(
+                        server, scope, options['requests'],
+                        options['concurrency']
+                    ))
+                finally:
+                    server.executor.shutdown()
+                self.stdout.write(
+                    f'{name:<14} {server_name:<6} '
+                    f'{len(timings) / elapsed:>8.0f} '
+                    f'{statistics.median(timings):>8.2f} '
+                    f'{percentile(timings, 99):>8.2f}'
+                )
@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from yatube.cache_backends import SQLiteCache
+
+BACKENDS = ('locmem', 'sqlite')
+
+
+def make_cache(backend, location):
+    params = {'TIMEOUT': 300, 'OPTIONS': {'MAX_ENTRIES': 100000}}
+    if backend == 'sqlite':
+        return SQLiteCache(location, params)
+    return LocMemCache('bench', params)
+
+
+def run_worker(args):
+    """Смоделировать запросы одного воркера к кешу карточек.
+
+    Ключи выбираются по закону Ципфа: немногие популярные записи
+    запрашиваются часто, длинный хвост - редко. Промах дорисовывает
+    карточку и кладёт её в кеш, как posts.templatetags.post_cards.
+    """
+    backend, location, requests, keys, payload, seed = args
+    cache = make_cache(backend, location)
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, keys + 1)]
+    sample = rng.choices(range(keys), weights, k=requests)
+    value = 'x' * payload
+    hits = 0
+    latencies = []
+    for number in sample:
+        key = f'post_card:{number}'
+        started = time.perf_counter()
+        if cache.get(key) is None:
+            cache.set(key, value)
+        else:
+            hits += 1
+        latencies.append(time.perf_counter() - started)
+    return hits, latencies
+
+
+class Command(BaseCommand):
+    help = ('Сравнить долю попаданий и задержку кеша LocMemCache и '
+            'SQLiteCache при нескольких процессах-воркерах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+            help='Числа процессов, для каждого - отдельный прогон.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=5000,
+            help='Сколько обращений к кешу делает каждый воркер.'
+        )
+        parser.add_argument(
+            '--keys', type=int, default=2000,
+            help='Сколько различных ключей (записей) в выборке.'
+        )
+        parser.add_argument(
+            '--payload', type=int, default=2048,
+            help='Размер значения в байтах, порядка HTML карточки.'
+        )
+        parser.add_argument(
+            '--backend', choices=BACKENDS, nargs='+', default=BACKENDS,
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"бэкенд":<8} {"воркеры":>7} {"попадания":>10} '
+            f'{"p50, мкс":>9} {"p99, мкс":>9} {"оп/с":>9}'
+        )
+        for workers in options['workers']:
+            for backend in options['backend']:
+                self.stdout.write(self.run(backend, workers, options))
+
+    def run(self, backend, workers, options):
+        with tempfile.TemporaryDirectory() as directory:
+            location = os.path.join(directory, 'cache.sqlite3')
+            tasks = [
+                (backend, location, options['requests'], options['keys'],
+                 options['payload'], seed)
+                for seed in range(workers)
+            ]
+            # fork: воркеры наследуют настроенный Django, как у gunicorn
+            context = multiprocessing.get_context('fork')
+            started = time.perf_counter()
+            with context.Pool(workers) as pool:
+                results = pool.map(run_worker, tasks)
+            elapsed = time.perf_counter() - started
+
+        hits = sum(result[0] for result in results)
+        latencies = sorted(
+            latency for result in results for latency in result[1]
+        )
+        total = len(latencies)
+        p50 = statistics.median(latencies) * 1e6
+        p99 = latencies[int(total * 0.99) - 1] * 1e6
+        return (
+            f'{backend:<8} {workers:>7} {hits / total:>10.1%} '
+            f'{p50:>9.1f} {p99:>9.1f} {total / elapsed:>9.0f}'
+        )
@@ -0,0 +1,112 @@
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.search import match_expression
+
+VOCABULARY_SIZE = 50000
+
+
+def make_words(rng):
+    letters = 'абвгдежзиклмнопрстуфхцчшэюя'
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add(''.join(rng.choices(letters, k=rng.randint(3, 10))))
+    return sorted(words)
+
+
+def populate(db, posts, rng, words):
+    """Записи со словами по закону Ципфа, как в живом тексте."""
+    cum_weights = list(itertools.accumulate(
+        1 / rank for rank in range(1, len(words) + 1)
+    ))
+    db.execute('CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT, '
+               'pub_date REAL)')
+    db.execute("CREATE VIRTUAL TABLE post_fts USING fts5("
+               "text, tokenize = 'unicode61 remove_diacritics 2')")
+    batch = 10000
+    for start in range(0, posts, batch):
+        rows = [
+            (start + number + 1,
+             ' '.join(rng.choices(words, cum_weights=cum_weights,
+                                  k=rng.randint(10, 60))),
+             start + number)
+            for number in range(min(batch, posts - start))
+        ]
+        db.executemany('INSERT INTO post VALUES (?, ?, ?)', rows)
+    db.execute('CREATE INDEX post_pub_date ON post (pub_date)')
+    started = time.perf_counter()
+    db.execute('INSERT INTO post_fts (rowid, text) '
+               'SELECT id, text FROM post')
+    db.commit()
+    return time.perf_counter() - started
+
+
+def measure(db, sql, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        db.execute(sql, params).fetchall()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+class Command(BaseCommand):
+    help = ('Сравнить поиск по индексу FTS5 с просмотром таблицы '
+            '(text__icontains, LIKE) на синтетических записях.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько раз повторить каждый запрос, берётся медиана.'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        words = make_words(rng)
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, 'bench.sqlite3'))
+            self.stdout.write(f'Заполнение: {options["posts"]} записей...')
+            build = populate(db, options['posts'], rng, words)
+            self.stdout.write(f'Индекс FTS5 построен за {build:.1f} с')
+            self.stdout.write(
+                f'{"слово":<12} {"ранг":>8} {"LIKE, мс":>10} '
+                f'{"FTS5, мс":>10} {"новые, мс":>10}'
+            )
+            # частое, среднее и редкое слово: ранг в распределении Ципфа.
+            # LIKE быстр для частых слов - первые 10 совпадений находятся
+            # сразу, - а FTS5 для сортировки по rank оценивает все
+            for position in (0, 100, 10000):
+                word = words[position]
+                like = measure(
+                    db,
+                    "SELECT id FROM post WHERE text LIKE ? ESCAPE '\\' "
+                    'ORDER BY pub_date DESC LIMIT 10',
+                    (f'%{word}%',), options['repeat']
+                )
+                fts = measure(
+                    db,
+                    'SELECT post.id FROM post_fts JOIN post '
+                    'ON post.id = post_fts.rowid WHERE post_fts.text MATCH ? '
+                    'ORDER BY post_fts.rank LIMIT 10',
+                    (match_expression(word),), options['repeat']
+                )
+                newest = measure(
+                    db,
+                    'SELECT post.id FROM post_fts JOIN post '
+                    'ON post.id = post_fts.rowid WHERE post_fts.text MATCH ? '
+                    'ORDER BY post_fts.rowid DESC LIMIT 10',
+                    (match_expression(word),), options['repeat']
+                )
+                self.stdout.write(
+                    f'{word:<12} {position:>8} {like:>10.1f} {fts:>10.1f} '
+                    f'{newest:>10.1f}'
+                )
+            db.close()
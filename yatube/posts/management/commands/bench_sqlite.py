@@ -0,0 +1,144 @@
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections, transaction
+
+# (имя, ENGINE, CONN_MAX_AGE, OPTIONS): как было и как в settings_production
+PROFILES = (
+    ('default', 'django.db.backends.sqlite3', 0, {}),
+    ('tuned', 'yatube.sqlite_backend', 600,
+     {'BUSY_RETRIES': 5, 'TRANSACTION_MODE': 'IMMEDIATE'}),
+)
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+    'text TEXT, pub_date REAL)',
+    'CREATE INDEX post_pub_date ON post (pub_date)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, post_id INTEGER, '
+    'author_id INTEGER, text TEXT)',
+    'CREATE INDEX comment_post ON comment (post_id)',
+)
+READ = ('SELECT post.id, post.text, COUNT(comment.id) FROM post '
+        'LEFT JOIN comment ON comment.post_id = post.id '
+        'GROUP BY post.id ORDER BY post.pub_date DESC LIMIT 10')
+
+
+def read(alias, number):
+    """Страница ленты: десять последних записей с числом комментариев."""
+    with connections[alias].cursor() as cursor:
+        cursor.execute(READ)
+        cursor.fetchall()
+
+
+def write(alias, number):
+    """add_comment: проверить запись и добавить к ней комментарий."""
+    with transaction.atomic(using=alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT id FROM post WHERE id = %s',
+                           [number % 1000 + 1])
+            post = cursor.fetchone()
+            cursor.execute(
+                'INSERT INTO comment (post_id, author_id, text) '
+                'VALUES (%s, %s, %s)', [post[0], number, 'Комментарий']
+            )
+
+
+class Command(BaseCommand):
+    help = ('Сравнить пропускную способность SQLite при одновременных '
+            'чтениях ленты и записях комментариев: встроенный бэкенд с '
+            'соединением на запрос против yatube.sqlite_backend (WAL, '
+            'pragma, постоянные соединения, повтор при блокировке). '
+            'База - временный файл, рабочая не затрагивается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=6)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--seconds', type=float, default=3,
+            help='Сколько длится прогон каждого варианта.'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"вариант":<8} {"чтений/с":>9} {"записей/с":>10} '
+            f'{"p99 чтения, мс":>15} {"ошибок":>7}'
+        )
+        for name, engine, max_age, db_options in PROFILES:
+            directory = tempfile.mkdtemp()
+            alias = f'bench_{name}'
+            connections.databases[alias] = {
+                'ENGINE': engine, 'CONN_MAX_AGE': max_age,
+                'NAME': os.path.join(directory, 'bench.sqlite3'),
+                'OPTIONS': db_options,
+            }
+            connections.ensure_defaults(alias)
+            try:
+                self.prepare(alias)
+                result = self.run(alias, options)
+            finally:
+                connections[alias].close()
+                del connections.databases[alias]
+                shutil.rmtree(directory, ignore_errors=True)
+            self.stdout.write(
+                f'{name:<8} {result["reads"]:>9.0f} {result["writes"]:>10.0f} '
+                f'{result["p99"]:>15.2f} {result["errors"]:>7}'
+            )
+
+    def prepare(self, alias):
+        with transaction.atomic(using=alias):
+            with connections[alias].cursor() as cursor:
+                for statement in SCHEMA:
+                    cursor.execute(statement)
+                cursor.executemany(
+                    'INSERT INTO post (author_id, text, pub_date) '
+                    'VALUES (%s, %s, %s)',
+                    [(number % 50, f'Запись {number}', number)
+                     for number in range(1000)]
+                )
+
+    def run(self, alias, options):
+        deadline = time.perf_counter() + options['seconds']
+        lock = threading.Lock()
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        timings = []
+
+        def worker(operation, key):
+            done = errors = 0
+            latencies = []
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    operation(alias, done)
+                    done += 1
+                except DatabaseError:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+                # конец запроса: как сигнал request_finished
+                connections[alias].close_if_unusable_or_obsolete()
+            connections[alias].close()
+            with lock:
+                counts[key] += done
+                counts['errors'] += errors
+                if operation is read:
+                    timings.extend(latencies)
+
+        threads = [threading.Thread(target=worker, args=(read, 'reads'))
+                   for _ in range(options['readers'])]
+        threads += [threading.Thread(target=worker, args=(write, 'writes'))
+                    for _ in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {
+            'reads': counts['reads'] / options['seconds'],
+            'writes': counts['writes'] / options['seconds'],
+            'p99': (statistics.quantiles(timings, n=100)[98]
+                    if len(timings) > 1 else 0),
+            'errors': counts['errors'],
+        }
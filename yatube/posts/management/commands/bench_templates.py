@@ -0,0 +1,72 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from posts.views import feed_pagination
+from yatube.template_warmup import LOADERS, with_cached_loader
+
+DUMMY_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+}}
+
+
+def loader_variants():
+    """(имя, TEMPLATES): одинаковые настройки, разные загрузчики."""
+    cached = with_cached_loader(settings.TEMPLATES)
+    uncached = [dict(backend, OPTIONS=dict(backend['OPTIONS'],
+                                           loaders=LOADERS))
+                for backend in cached]
+    return (('без кеша', uncached), ('кеш загрузчика', cached))
+
+
+class Command(BaseCommand):
+    help = ('Сравнить время отрисовки posts/index.html со страницей из '
+            'PAGINATOR_DEFAULT_SIZE записей без кеширующего загрузчика '
+            'шаблонов и с ним. Записи берутся из базы заранее, кеш '
+            'карточек отключён: измеряются разбор и отрисовка шаблонов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--renders', type=int, default=500,
+            help='Сколько измеряемых отрисовок на каждый вариант.'
+        )
+        parser.add_argument('--warmup', type=int, default=20)
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get(reverse('index'))
+        request.user = AnonymousUser()
+        page = feed_pagination(request, Post.objects.for_feed())
+        page.object_list = list(page.object_list)
+        if not page.object_list:
+            raise CommandError('В базе нет записей, сначала generate_data.')
+        self.stdout.write(
+            f'{"загрузчик":<16} {"p50, мс":>8} {"среднее, мс":>12}'
+        )
+        medians = []
+        for name, templates in loader_variants():
+            with override_settings(TEMPLATES=templates,
+                                   CACHES=DUMMY_CACHES):
+                timings = self.measure(request, page, options)
+            medians.append(statistics.median(timings))
+            self.stdout.write(f'{name:<16} {medians[-1]:>8.3f} '
+                              f'{statistics.mean(timings):>12.3f}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Кеш загрузчика быстрее в {medians[0] / medians[1]:.1f} раза '
+            f'({len(page.object_list)} записей на странице).'
+        ))
+
+    def measure(self, request, page, options):
+        timings = []
+        for number in range(options['warmup'] + options['renders']):
+            started = time.perf_counter()
+            render_to_string('posts/index.html', {'page': page}, request)
+            if number >= options['warmup']:
+                timings.append((time.perf_counter() - started) * 1000)
+        return timings
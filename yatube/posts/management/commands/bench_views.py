@@ -0,0 +1,178 @@
+import json
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts.models import AuthorStats, Group, Post
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'bench_views.json')
+
+
+class QueryCounter:
+    """Обёртка execute_wrapper: считает запросы без DEBUG и их текстов."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def scenarios():
+    """Адреса для прогона: самые тяжёлые объекты синтетических данных.
+
+    (имя, адрес, пользователь или None для гостя).
+    """
+    author = AuthorStats.objects.order_by('-posts_count').first()
+    reader = AuthorStats.objects.order_by('-following_count').first()
+    post = Post.objects.order_by('-comment_count', '-pk').first()
+    group = Group.objects.order_by('pk').first()
+    if author is None or post is None:
+        raise CommandError('В базе нет записей, сначала generate_data.')
+    result = [
+        ('index', reverse('index'), None),
+        ('index_page_100', reverse('index') + '?page=100', None),
+        ('profile', reverse('profile', args=(author.user.username,)), None),
+        ('post', reverse('post', args=(post.author.username, post.pk)),
+         None),
+        ('follow_index', reverse('follow_index'), reader.user),
+        ('search', reverse('search') + '?q=' + post.text.split()[0], None),
+    ]
+    if group is not None:
+        result.append(('group', reverse('group', args=(group.slug,)), None))
+    return result
+
+
+def percentile(timings, rank):
+    return statistics.quantiles(timings, n=100)[rank - 1]
+
+
+def measure(client, url, requests):
+    """Задержки (мс) и запросы на каждый из requests запросов к url."""
+    counter = QueryCounter()
+    timings = []
+    started = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        for _ in range(requests):
+            request_started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - request_started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: ответ {response.status_code}')
+    elapsed = time.perf_counter() - started
+    return {
+        'p50': statistics.median(timings),
+        'p99': percentile(timings, 99),
+        'queries': counter.count / requests,
+        'rps': requests / elapsed,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Прогнать основные страницы (index, profile, post, follow, '
+            'group, search) через тестовый клиент и показать p50/p99 '
+            'задержки, запросы к базе на страницу и пропускную способность. '
+            'Результаты сравниваются с сохранённым эталоном: больше '
+            'запросов или рост p99 сверх допуска - ошибка.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Сколько измеряемых запросов на каждую страницу.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=20,
+            help='Сколько запросов до измерений: соединение, шаблоны, кеш.'
+        )
+        parser.add_argument(
+            '--no-cache', action='store_true',
+            help='Без кеша (DummyCache): измерять саму отрисовку страниц.'
+        )
+        parser.add_argument(
+            '--only', nargs='+', metavar='NAME',
+            help='Прогнать только эти страницы.'
+        )
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Записать результаты как новый эталон вместо сравнения.'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимый рост p99 относительно эталона, доля.'
+        )
+
+    def handle(self, *args, **options):
+        overrides = {'DEBUG': False}
+        if options['no_cache']:
+            overrides['CACHES'] = {'default': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+            }}
+        with override_settings(**overrides):
+            results = self.run(options)
+        if options['save_baseline']:
+            with open(options['baseline'], 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(
+                f'Эталон записан в {options["baseline"]}'
+            ))
+            return
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(self.style.WARNING(
+                'Эталона нет, сравнивать не с чем (--save-baseline).'
+            ))
+            return
+        with open(options['baseline']) as file:
+            baseline = json.load(file)
+        regressions = list(self.compare(
+            results, baseline, options['tolerance']
+        ))
+        if regressions:
+            raise CommandError('Хуже эталона: ' + '; '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Не хуже эталона.'))
+
+    def run(self, options):
+        host = next((host for host in settings.ALLOWED_HOSTS
+                     if host != '*' and not host.startswith('.')),
+                    'localhost')
+        self.stdout.write(
+            f'{"страница":<16} {"p50, мс":>8} {"p99, мс":>8} '
+            f'{"запросов":>8} {"запр/с":>8}'
+        )
+        results = {}
+        for name, url, user in scenarios():
+            if options['only'] and name not in options['only']:
+                continue
+            client = Client(SERVER_NAME=host)
+            if user is not None:
+                client.force_login(user)
+            cache.clear()
+            for _ in range(options['warmup']):
+                client.get(url)
+            result = measure(client, url, options['requests'])
+            results[name] = result
+            self.stdout.write(
+                f'{name:<16} {result["p50"]:>8.2f} {result["p99"]:>8.2f} '
+                f'{result["queries"]:>8.1f} {result["rps"]:>8.0f}'
+            )
+        return results
+
+    def compare(self, results, baseline, tolerance):
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            base = baseline[name]
+            if result['queries'] > base['queries']:
+                yield (f'{name}: запросов {result["queries"]:.1f} '
+                       f'вместо {base["queries"]:.1f}')
+            if result['p99'] > base['p99'] * (1 + tolerance):
+                yield (f'{name}: p99 {result["p99"]:.2f} мс '
+                       f'вместо {base["p99"]:.2f} мс')
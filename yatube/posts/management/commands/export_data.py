@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import FORMATS, TABLES, write_rows
+
+
+class Command(BaseCommand):
+    help = ('Выгрузить подборки, записи, комментарии или подписки в JSONL '
+            'или CSV. Таблица читается порциями через iterator(), память '
+            'не растёт с её размером.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=tuple(TABLES))
+        parser.add_argument(
+            '--output', '-o', default='-',
+            help='Файл для выгрузки, по умолчанию - стандартный вывод.'
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат; по умолчанию - по расширению файла, иначе jsonl.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз.'
+        )
+
+    def handle(self, *args, **options):
+        data_format = options['format'] or guess_format(options['output'])
+        table = TABLES[options['table']]()
+        rows = table.export(options['batch_size'])
+        if options['output'] == '-':
+            count = write_rows(sys.stdout, data_format, table.columns, rows)
+        else:
+            with open(options['output'], 'w', encoding='utf-8',
+                      newline='') as file:
+                count = write_rows(file, data_format, table.columns, rows)
+        # стандартный вывод может быть занят самими данными
+        self.stderr.write(f'Выгружено строк: {count}', self.style.SUCCESS)
+
+
+def guess_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
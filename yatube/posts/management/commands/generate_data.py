@@ -0,0 +1,160 @@
+import math
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from posts.models import Post, User
+from posts.transfer import TABLES, import_rows
+
+from .bench_search import make_words
+
+USERNAME = 'user{}'
+GROUP_SLUG = 'group-{}'
+# записи публикуются равномерно за этот срок, новые - с большими id
+PERIOD = timedelta(days=365)
+
+
+def power_law(rng, size):
+    """Ранг 0..size-1 с вероятностью примерно 1/(ранг+1), закон Ципфа.
+
+    Обратная функция распределения непрерывного приближения: без
+    таблицы весов, память не зависит от size.
+    """
+    return min(int((size + 1) ** rng.random()) - 1, size - 1)
+
+
+def shuffler(size, seed):
+    """Перестановка 0..size-1: ранг популярности -> номер объекта.
+
+    Разные перестановки для подписчиков, записей и комментариев, чтобы
+    самые читаемые авторы не были заодно и самыми плодовитыми.
+    """
+    rng = random.Random(seed)
+    step = rng.randrange(size // 3, size) if size > 3 else 1
+    while math.gcd(step, size) != 1:
+        step += 1
+    offset = rng.randrange(size) if size else 0
+    return lambda rank: (rank * step + offset) % size
+
+
+class Command(BaseCommand):
+    help = ('Заполнить базу синтетическими пользователями, подборками, '
+            'подписками, записями и комментариями. Популярность авторов, '
+            'число их записей и комментарии к записям распределены по '
+            'степенному закону; при одном --seed данные одинаковы. '
+            'Данные грузятся так же, как import_data, с лентами подписок, '
+            'поисковым индексом и счётчиками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--follows', type=int, default=100000)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=300000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Сколько строк вставлять одним запросом и транзакцией.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.users = options['users']
+        self.create_users()
+        self.load('groups', (
+            {'title': f'Подборка {number}', 'slug': GROUP_SLUG.format(number),
+             'description': f'Синтетическая подборка {number}'}
+            for number in range(options['groups'])
+        ))
+        self.load('follows', self.follows())
+        # авторы с множеством подписчиков не раскладываются по лентам,
+        # для этого счётчики должны быть посчитаны до записей
+        call_command('recount_stats', batch_size=options['batch_size'],
+                     stdout=self.stdout)
+        self.first_post = (Post.objects.aggregate(Max('id'))['id__max']
+                           or 0) + 1
+        self.started = timezone.now() - PERIOD
+        self.load('posts', self.posts())
+        self.load('comments', self.comments())
+        call_command('recount_stats', batch_size=options['batch_size'],
+                     stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Данные созданы.'))
+
+    def load(self, table, rows):
+        accepted, skipped = import_rows(
+            TABLES[table](), rows, self.options['batch_size']
+        )
+        self.stdout.write(f'{table}: {accepted} строк, пропущено {skipped}')
+
+    def create_users(self):
+        password = make_password(None)
+        batch_size = self.options['batch_size']
+        for start in range(0, self.users, batch_size):
+            User.objects.bulk_create(
+                [User(username=USERNAME.format(number), password=password)
+                 for number in range(start,
+                                     min(start + batch_size, self.users))],
+                ignore_conflicts=True
+            )
+        self.stdout.write(f'users: {self.users}')
+
+    def follows(self):
+        """Подписки: на кого подписаны - по популярности, кто - равномерно."""
+        popular = shuffler(self.users, 1)
+        seen = set()
+        while len(seen) < min(self.options['follows'],
+                              self.users * (self.users - 1)):
+            pair = (self.rng.randrange(self.users),
+                    popular(power_law(self.rng, self.users)))
+            if pair[0] == pair[1] or pair in seen:
+                continue
+            seen.add(pair)
+            yield {'user': USERNAME.format(pair[0]),
+                   'author': USERNAME.format(pair[1])}
+
+    def pub_date(self, number):
+        return self.started + PERIOD * number / self.options['posts']
+
+    def posts(self):
+        words = make_words(self.rng)
+        prolific = shuffler(self.users, 2)
+        groups = self.options['groups']
+        for number in range(self.options['posts']):
+            group = None
+            if groups and self.rng.random() < 0.5:
+                group = GROUP_SLUG.format(power_law(self.rng, groups))
+            yield {
+                'id': self.first_post + number,
+                'author': USERNAME.format(
+                    prolific(power_law(self.rng, self.users))
+                ),
+                'group': group,
+                'text': ' '.join(
+                    words[power_law(self.rng, len(words))]
+                    for _ in range(self.rng.randint(5, 60))
+                ),
+                'pub_date': self.pub_date(number),
+            }
+
+    def comments(self):
+        """Комментарии: к немногим записям - много, к большинству - нет."""
+        posts = self.options['posts']
+        if not posts:
+            return
+        discussed = shuffler(posts, 3)
+        for _ in range(self.options['comments']):
+            number = discussed(power_law(self.rng, posts))
+            delay = timedelta(minutes=self.rng.expovariate(1 / 60))
+            yield {
+                'post': self.first_post + number,
+                'author': USERNAME.format(self.rng.randrange(self.users)),
+                'text': 'Синтетический комментарий',
+                'created': min(self.pub_date(number) + delay,
+                               timezone.now()),
+            }
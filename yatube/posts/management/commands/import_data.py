@@ -0,0 +1,63 @@
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.cache import bump_feed_generation
+from posts.transfer import FORMATS, TABLES, import_rows, read_rows
+
+from .export_data import guess_format
+
+
+class Command(BaseCommand):
+    help = ('Загрузить подборки, записи, комментарии или подписки из JSONL '
+            'или CSV, выгруженных export_data. Строки вставляются пачками '
+            'через bulk_create, уже существующие пропускаются; после '
+            'загрузки записей, комментариев и подписок пересчитываются '
+            'счётчики (recount_stats).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=tuple(TABLES))
+        parser.add_argument(
+            'input', help='Файл с данными, "-" - стандартный ввод.'
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат; по умолчанию - по расширению файла, иначе jsonl.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк вставлять одним запросом и транзакцией.'
+        )
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать незнакомых пользователей (без пароля), а не '
+                 'пропускать их строки.'
+        )
+
+    def handle(self, *args, **options):
+        data_format = options['format'] or guess_format(options['input'])
+        table = TABLES[options['table']](options['create_users'])
+        if options['input'] == '-':
+            accepted, skipped = self.load(table, sys.stdin, data_format,
+                                          options['batch_size'])
+        else:
+            with open(options['input'], encoding='utf-8',
+                      newline='') as file:
+                accepted, skipped = self.load(table, file, data_format,
+                                              options['batch_size'])
+        if options['table'] != 'groups':
+            call_command('recount_stats', batch_size=options['batch_size'],
+                         stdout=self.stdout)
+        bump_feed_generation()
+        self.stdout.write(f'Принято строк: {accepted}, пропущено из-за '
+                          f'ссылок на несуществующие объекты: {skipped}')
+        self.stdout.write(self.style.SUCCESS('Загрузка закончена.'))
+
+    def load(self, table, file, data_format, batch_size):
+        try:
+            return import_rows(table, read_rows(file, data_format),
+                               batch_size)
+        except (KeyError, TypeError, ValueError, ValidationError) as error:
+            raise CommandError(f'Ошибка в данных: {error!r}') from error
@@ -0,0 +1,104 @@
+import io
+import multiprocessing
+import resource
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.client import (BOUNDARY, MULTIPART_CONTENT, RequestFactory,
+                                encode_multipart)
+from PIL import Image
+
+from posts.forms import PostForm
+
+HANDLERS = {
+    'default': [
+        'django.core.files.uploadhandler.MemoryFileUploadHandler',
+        'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+    ],
+    'streaming': ['posts.uploads.ImageUploadHandler'],
+}
+
+
+def make_body(image_format, size):
+    """Тело multipart-запроса new_post с шумным, плохо сжимаемым фото."""
+    image = Image.effect_noise(size, 64).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, image_format)
+    buffer.seek(0)
+    buffer.name = f'photo.{image_format.lower()}'
+    return encode_multipart(BOUNDARY, {'text': 'load', 'image': buffer})
+
+
+def upload(body, results):
+    """Принять и проверить файл, затем декодировать его для миниатюр."""
+    request = RequestFactory().generic(
+        'POST', '/new/', body, MULTIPART_CONTENT
+    )
+    started = time.perf_counter()
+    form = PostForm(request.POST, request.FILES)
+    if form.is_valid():
+        with Image.open(form.cleaned_data['image']) as image:
+            image.convert('RGB')
+    results.append((form.is_valid(), time.perf_counter() - started))
+
+
+def run_scenario(handlers, body, concurrency):
+    """Прогон в отдельном процессе: пик RSS не наследуется от прошлых."""
+    settings.FILE_UPLOAD_HANDLERS = handlers
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results = []
+    threads = [threading.Thread(target=upload, args=(body, results))
+               for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    accepted = sum(valid for valid, _ in results)
+    slowest = max(elapsed for _, elapsed in results)
+    return (peak - baseline) / 1024, accepted, slowest
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон приёма изображений в PostForm: пик '
+            'памяти (RSS) на одну одновременную загрузку для стандартных '
+            'обработчиков Django и posts.uploads.ImageUploadHandler.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 4, 16],
+            help='Числа одновременных загрузок, для каждого - свой прогон.'
+        )
+        parser.add_argument(
+            '--format', choices=('JPEG', 'PNG'), default='JPEG',
+        )
+        parser.add_argument(
+            '--size', type=int, nargs=2, default=(4000, 3000),
+            metavar=('WIDTH', 'HEIGHT'),
+        )
+
+    def handle(self, *args, **options):
+        body = make_body(options['format'], tuple(options['size']))
+        self.stdout.write(
+            f'Тело запроса: {len(body) / 1024 / 1024:.1f} МБ, '
+            f'{options["format"]} {options["size"][0]}x{options["size"][1]}'
+        )
+        self.stdout.write(
+            f'{"обработчик":<10} {"потоки":>6} {"принято":>7} '
+            f'{"пик RSS, МБ":>11} {"на загрузку":>11} {"время, с":>8}'
+        )
+        # fork: процессы получают готовое тело запроса без копирования
+        context = multiprocessing.get_context('fork')
+        for concurrency in options['concurrency']:
+            for name, handlers in HANDLERS.items():
+                with context.Pool(1) as pool:
+                    rss, accepted, slowest = pool.apply(
+                        run_scenario, (handlers, body, concurrency)
+                    )
+                self.stdout.write(
+                    f'{name:<10} {concurrency:>6} {accepted:>7} '
+                    f'{rss:>11.1f} {rss / concurrency:>11.1f} '
+                    f'{slowest:>8.2f}'
+                )
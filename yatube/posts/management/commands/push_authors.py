@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = ('Снова раскладывать по лентам подписок записи авторов, у '
+            'которых после отписок подписчиков не больше '
+            'TIMELINE_PUSH_MAX_FOLLOWERS: их последние записи добавляются '
+            'в ленты всех подписчиков. Запускать по расписанию.')
+
+    def handle(self, *args, **options):
+        pushed = timeline.push_authors()
+        self.stdout.write(self.style.SUCCESS(
+            f'Раскладка возвращена авторам: {pushed}'
+        ))
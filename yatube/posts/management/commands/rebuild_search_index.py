@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = ('Построить полнотекстовый индекс записей заново, например '
+            'после bulk_create или update() мимо сигналов.')
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stdout.write(self.style.WARNING(
+                'Индекс FTS5 есть только в SQLite, здесь поиск - icontains.'
+            ))
+            return
+        with transaction.atomic():
+            indexed = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в индексе: {indexed}'
+        ))
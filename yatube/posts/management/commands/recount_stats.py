@@ -0,0 +1,102 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from posts.cache import bump_feed_generation, invalidate_post_cards
+from posts.models import (AuthorStats, Comment, Post, User,
+                          count_subquery)
+
+STATS_FIELDS = ('followers_count', 'following_count', 'posts_count')
+
+
+class Command(BaseCommand):
+    help = ('Пересчитать счётчики AuthorStats и Post.comment_count '
+            'по таблицам Follow, Post и Comment и исправить расхождения. '
+            'Карточки исправленных записей сбрасываются из кеша.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк читать и записывать за раз.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать число расхождений, ничего не менять.'
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        created, updated = self.repair_author_stats()
+        self.stdout.write(
+            f'AuthorStats: создано {created}, исправлено {updated}'
+        )
+        posts = self.repair_comment_counts()
+        self.stdout.write(f'Post.comment_count: исправлено {posts}')
+        if posts and not self.dry_run:
+            # страницы анонимов тоже показывают число комментариев
+            bump_feed_generation()
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING('Изменения не записаны.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
+
+    def flush(self, model, to_create, to_update, fields):
+        if self.dry_run:
+            return
+        with transaction.atomic():
+            if to_create:
+                # размер пачки INSERT выбирает сам Django: в SQLite у
+                # составного SELECT не больше 500 частей
+                model.objects.bulk_create(to_create)
+            if to_update:
+                model.objects.bulk_update(to_update, fields, self.batch_size)
+
+    def repair_author_stats(self):
+        users = AuthorStats.objects.actual_counts(
+            User.objects.select_related('stats').order_by('pk')
+        )
+        created = updated = 0
+        to_create, to_update = [], []
+        for user in users.iterator(chunk_size=self.batch_size):
+            actual = {field: getattr(user, field) for field in STATS_FIELDS}
+            try:
+                stats = user.stats
+            except AuthorStats.DoesNotExist:
+                to_create.append(AuthorStats(user=user, **actual))
+            else:
+                if any(getattr(stats, field) != value
+                       for field, value in actual.items()):
+                    for field, value in actual.items():
+                        setattr(stats, field, value)
+                    to_update.append(stats)
+            if len(to_create) + len(to_update) >= self.batch_size:
+                created += len(to_create)
+                updated += len(to_update)
+                self.flush(AuthorStats, to_create, to_update, STATS_FIELDS)
+                to_create, to_update = [], []
+        self.flush(AuthorStats, to_create, to_update, STATS_FIELDS)
+        return created + len(to_create), updated + len(to_update)
+
+    def flush_comment_counts(self, to_update):
+        self.flush(Post, [], to_update, ('comment_count',))
+        # bulk_update идёт мимо сигналов, сбрасывающих карточки
+        if not self.dry_run:
+            invalidate_post_cards([post.pk for post in to_update])
+
+    def repair_comment_counts(self):
+        drifted = Post.objects.annotate(
+            actual=count_subquery(Comment, 'post')
+        ).exclude(comment_count=F('actual')).only('pk', 'comment_count')
+        updated = 0
+        to_update = []
+        for post in drifted.order_by('pk').iterator(
+                chunk_size=self.batch_size):
+            post.comment_count = post.actual
+            to_update.append(post)
+            if len(to_update) >= self.batch_size:
+                updated += len(to_update)
+                self.flush_comment_counts(to_update)
+                to_update = []
+        self.flush_comment_counts(to_update)
+        return updated + len(to_update)
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from yatube import replicas
+
+
+class Command(BaseCommand):
+    help = ('Скопировать основную базу в реплики SQLite из '
+            'DATABASE_REPLICAS - подмена репликации для разработки. '
+            'С --interval копирует снова через заданное число секунд, '
+            'пока команду не прервут.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0)
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплик нет, задайте YATUBE_DB_REPLICAS.')
+        while True:
+            replicas.sync()
+            self.stdout.write(
+                f'Реплики обновлены: {", ".join(settings.DATABASE_REPLICAS)}'
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,75 @@
+import multiprocessing
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+
+from posts import thumbnails
+from posts.cache import bump_feed_generation, invalidate_post_cards
+from posts.models import Post
+
+
+def generate(task):
+    post_id, image_name = task
+    try:
+        return post_id, image_name, thumbnails.generate(image_name), None
+    except Exception as error:
+        return post_id, image_name, None, error
+
+
+class Command(BaseCommand):
+    help = ('Построить миниатюры и варианты изображений записей заранее, '
+            'параллельно на нескольких ядрах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jobs', type=int, default=os.cpu_count(),
+            help='Сколько процессов строят миниатюры, 1 - в этом же.'
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перестроить и уже готовые миниатюры.'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            posts = posts.filter(Q(thumbnail='') | Q(image_variants=''))
+        tasks = list(posts.order_by('pk').values_list('pk', 'image'))
+        if not tasks:
+            self.stdout.write('Все миниатюры уже построены.')
+            return
+
+        if options['jobs'] > 1:
+            stored, failed = self.run_pool(tasks, options['jobs'])
+        else:
+            stored, failed = self.collect(map(generate, tasks))
+
+        if stored:
+            invalidate_post_cards(stored)
+            bump_feed_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюр построено: {len(stored)}, с ошибкой: {failed}'
+        ))
+
+    def run_pool(self, tasks, jobs):
+        # процессы наследуют открытые соединения с базой - закрыть их
+        # до fork, каждый процесс откроет своё
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(jobs) as pool:
+            return self.collect(
+                pool.imap_unordered(generate, tasks, chunksize=16)
+            )
+
+    def collect(self, results):
+        """Записать готовые миниатюры, вернуть (id записей, число ошибок)."""
+        stored, failed = [], 0
+        for post_id, image_name, built, error in results:
+            if error is not None:
+                failed += 1
+                self.stderr.write(f'Запись {post_id}: {error}')
+            elif thumbnails.store(post_id, image_name, *built):
+                stored.append(post_id)
+        return stored, failed
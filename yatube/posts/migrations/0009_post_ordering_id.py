@@ -0,0 +1,17 @@
+# Generated by Django 2.2.6 on 2026-10-18 04:34
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_auto_20210603_1205'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='post',
+            options={'ordering': ('-pub_date', '-id'), 'verbose_name': 'Запись', 'verbose_name_plural': 'Записи'},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='Миниатюра изображения'),
+        ),
+    ]
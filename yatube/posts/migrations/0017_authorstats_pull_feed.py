@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 06:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='pull_feed',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Без раскладки'),
+        ),
+    ]
@@ -1,5 +1,10 @@
+import json
+
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 User = get_user_model()
 
@@ -23,6 +28,12 @@ class Group(models.Model):
                    'подборку, тематика и основные правила поведения'),
         verbose_name='Описание подборки'
     )
+    # название и адрес подборки выводятся на страницах записей и
+    # профилей, их условный GET сверяет и эту дату
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
 
     class Meta:
         verbose_name = 'Подборка записей'
@@ -33,6 +44,17 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Записи для вывода карточками includes/post_item.html.
+
+        Автор и подборка подтягиваются в том же запросе, а число
+        комментариев хранится в самой записи (comment_count), чтобы
+        карточка не делала своих запросов.
+        """
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст записи'
@@ -41,6 +63,10 @@ class Post(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
     author = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='posts', verbose_name='Автор'
@@ -52,15 +78,69 @@ class Post(models.Model):
     image = models.ImageField(
         upload_to='posts/', blank=True, null=True
     )
+    # заполняется posts.thumbnails после построения миниатюры,
+    # до этого карточка показывает заглушку
+    thumbnail = models.CharField(
+        verbose_name='Миниатюра изображения',
+        max_length=255, blank=True, default='', editable=False
+    )
+    # JSON с файлами вариантов разной ширины и формата, см. posts.thumbnails
+    image_variants = models.TextField(
+        verbose_name='Варианты изображения',
+        blank=True, default='', editable=False
+    )
+    comment_count = models.PositiveIntegerField(
+        verbose_name='Число комментариев',
+        default=0, editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Запись'
         verbose_name_plural = 'Записи'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'), name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-updated_at'),
+                name='post_author_updated_at_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def thumbnail_url(self):
+        return default_storage.url(self.thumbnail) if self.thumbnail else ''
+
+    @property
+    def picture_sources(self):
+        """Типы и srcset для <source> элемента <picture>.
+
+        Всё берётся из image_variants, без обращений к хранилищу.
+        """
+        if not self.image_variants:
+            return []
+        variants = json.loads(self.image_variants)
+        return [
+            {'type': mime,
+             'srcset': ', '.join(f'{default_storage.url(name)} {width}w'
+                                 for name, width in files)}
+            for mime, files in variants['sources']
+        ]
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -83,6 +163,12 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.author.username[:15]} {self.text[:20]}'
@@ -102,7 +188,160 @@ class Follow(models.Model):
         ordering = ('author',)
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='unique_follow'
+            ),
+        )
 
     """def __str__(self):
         return (f'Подписчик {self.follower.username[:15]}'
                 f' на автора {self.author.username[:15]}')"""
+
+
+def count_subquery(model, field):
+    """Подзапрос COUNT(*) строк model, у которых field - внешняя строка."""
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by()
+    return Coalesce(
+        Subquery(
+            rows.values(field).annotate(n=Count('pk')).values('n'),
+            output_field=models.IntegerField()
+        ),
+        0
+    )
+
+
+class AuthorStatsManager(models.Manager):
+    def actual_counts(self, users):
+        """Пересчитать счётчики по таблицам Post и Follow.
+
+        Возвращает QuerySet пользователей users с аннотациями
+        followers_count, following_count и posts_count.
+        """
+        return users.annotate(
+            followers_count=count_subquery(Follow, 'author'),
+            following_count=count_subquery(Follow, 'user'),
+            posts_count=count_subquery(Post, 'author'),
+        )
+
+    def for_user(self, user):
+        """Счётчики автора; если строки ещё нет - посчитать и создать."""
+        try:
+            return user.stats
+        except AuthorStats.DoesNotExist:
+            pass
+        counts = self.actual_counts(User.objects.filter(pk=user.pk)).values(
+            'followers_count', 'following_count', 'posts_count'
+        ).get()
+        stats, _ = self.get_or_create(user=user, defaults=counts)
+        return stats
+
+
+class AuthorStats(models.Model):
+    """Поддерживаемые счётчики автора для профиля и страницы записи.
+
+    Меняются сигналами при создании и удалении подписок и записей
+    (posts.counters), расхождения чинит manage.py recount_stats.
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True,
+        related_name='stats', verbose_name='Автор'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписан'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Записей'
+    )
+    # записи автора читаются при выводе ленты, хотя подписчиков уже не
+    # больше порога раскладки; раскладку возвращает push_authors
+    pull_feed = models.BooleanField(
+        default=False, editable=False, verbose_name='Без раскладки'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True, verbose_name='Дата изменения'
+    )
+
+    objects = AuthorStatsManager()
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return f'Счётчики автора {self.user_id}'
+
+
+class TimelineEntry(models.Model):
+    """Запись автора в материализованной ленте подписок читателя.
+
+    Строки раскладываются при публикации (fan-out on write) и при
+    подписке, см. posts.timeline. Дата публикации скопирована из записи,
+    чтобы порцию ленты читать одним проходом по индексу (user, pub_date).
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='timeline', verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE,
+        related_name='timeline_entries', verbose_name='Запись'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-id')
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи лент подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='unique_timeline_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-id'),
+                name='timeline_user_pub_date_idx'
+            ),
+        )
+
+
+class SearchField(models.TextField):
+    """Колонка полнотекстового индекса, поддерживает lookup match."""
+
+
+@SearchField.register_lookup
+class Match(models.Lookup):
+    """Условие FTS5: колонка MATCH выражение запроса."""
+
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class PostSearch(models.Model):
+    """Строка полнотекстового индекса записей.
+
+    Виртуальная таблица SQLite FTS5 создаётся миграцией и наполняется
+    сигналами (см. posts.search); rowid строки равен id записи.
+    """
+
+    post = models.OneToOneField(
+        Post, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', related_name='search'
+    )
+    text = SearchField()
+    # оценка bm25 текущего запроса, чем меньше - тем релевантнее
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_fts'
@@ -0,0 +1,177 @@
+"""Постраничный вывод лент по курсору (keyset pagination).
+
+В отличие от Paginator из Django, здесь нет ни COUNT(*), ни OFFSET:
+очередная порция выбирается условием по паре (дата, id) последнего
+показанного объекта, поэтому глубокие страницы стоят столько же,
+сколько первая. Вместо даты ключом может быть и число, например
+релевантность в результатах поиска.
+"""
+import base64
+import binascii
+from collections.abc import Sequence
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk, direction):
+    if isinstance(value, datetime):
+        kind, value = 'd', value.isoformat()
+    else:
+        kind, value = 'f', repr(float(value))
+    raw = f'{direction}|{kind}|{value}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разобрать токен курсора в кортеж (направление, дата или число, id).
+
+    Токен непрозрачен для клиента, любая порча токена -> InvalidCursor.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, kind, value, pk = raw.split('|')
+        value = parse_datetime(value) if kind == 'd' else float(value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError) as error:
+        raise InvalidCursor(token) from error
+    if value is None or direction not in (FORWARD, BACKWARD):
+        raise InvalidCursor(token)
+    return direction, value, pk
+
+
+class CursorPage(Sequence):
+    """Порция объектов ленты со ссылками на соседние порции.
+
+    Повторяет ту часть интерфейса django.core.paginator.Page, которая
+    нужна шаблонам, но без номеров страниц и общего количества.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator,
+                 next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Разбивка ленты, упорядоченной от новых к старым по (date_field, id).
+
+    аргументы:
+    object_list - QuerySet объектов ленты
+    per_page - размер порции
+    date_field - поле даты (или числовая аннотация), первая часть ключа
+                 сортировки по убыванию
+    unique_key - значения date_field уникальны, id в ключе не нужен;
+                 ORDER BY по одной колонке дешевле, например для
+                 rowid индекса FTS5
+    """
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 unique_key=False):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.date_field = date_field
+        self.unique_key = unique_key
+
+    def _key(self, obj):
+        return getattr(obj, self.date_field), obj.pk
+
+    def _keyed_by_date(self):
+        """Ключ - поле даты модели, иначе числовая аннотация."""
+        try:
+            field = self.object_list.model._meta.get_field(self.date_field)
+        except FieldDoesNotExist:
+            return False
+        return isinstance(field, models.DateField)
+
+    def page(self, cursor=None):
+        """Вернуть порцию для токена cursor, None - первая порция.
+
+        Испорченный токен -> InvalidCursor.
+        """
+        field = self.date_field
+        order = (field,) if self.unique_key else (field, 'pk')
+        queryset = self.object_list
+        if cursor is None:
+            direction = FORWARD
+            queryset = queryset.order_by(*(f'-{key}' for key in order))
+        else:
+            direction, date, pk = decode_cursor(cursor)
+            if isinstance(date, datetime) != self._keyed_by_date():
+                raise InvalidCursor(cursor)
+            if direction == FORWARD:
+                condition = Q(**{f'{field}__lt': date})
+                if not self.unique_key:
+                    condition |= Q(**{field: date, 'pk__lt': pk})
+                queryset = queryset.filter(condition).order_by(
+                    *(f'-{key}' for key in order)
+                )
+            else:
+                condition = Q(**{f'{field}__gt': date})
+                if not self.unique_key:
+                    condition |= Q(**{field: date, 'pk__gt': pk})
+                queryset = queryset.filter(condition).order_by(*order)
+
+        # один лишний объект показывает, есть ли что-то дальше
+        objects = list(queryset[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+
+        if direction == FORWARD:
+            has_next, has_previous = has_more, cursor is not None
+        elif not objects:
+            # новее курсора ничего не осталось - показать начало ленты
+            return self.page()
+        else:
+            objects.reverse()
+            has_next, has_previous = True, has_more
+
+        next_cursor = previous_cursor = None
+        if objects and has_next:
+            next_cursor = encode_cursor(*self._key(objects[-1]), FORWARD)
+        if objects and has_previous:
+            previous_cursor = encode_cursor(*self._key(objects[0]), BACKWARD)
+        return CursorPage(objects, self, next_cursor, previous_cursor)
+
+    def get_page(self, cursor=None):
+        """Как page(), но испорченный токен даёт первую порцию.
+
+        Поведение совпадает с Paginator.get_page для неверного номера.
+        """
+        try:
+            return self.page(cursor or None)
+        except InvalidCursor:
+            return self.page()
@@ -0,0 +1,127 @@
+"""Полнотекстовый поиск по записям.
+
+Текст записей дублируется в виртуальную таблицу SQLite FTS5
+posts_post_fts (модель PostSearch), rowid строки - id записи. Индекс
+обновляется сигналами на Post (posts.signals), массовые изменения мимо
+сигналов (bulk_create, update) исправляет команда rebuild_search_index,
+import_data индексирует записи сама, пачками.
+
+Результаты сортируются по bm25 - чем меньше rank, тем релевантнее, -
+и листаются курсором по паре (score, id), где score = -rank; или,
+по выбору, от новых к старым по rowid индекса.
+
+На других базах таблицы нет, и поиск сводится к text__icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import F, FloatField, Value
+
+from .models import Post
+from .paginators import CursorPaginator
+
+TABLE = 'posts_post_fts'
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Безопасное выражение FTS5 из строки пользователя.
+
+    Каждое слово берётся в кавычки, чтобы операторы FTS5 (AND, NEAR, *,
+    двоеточие) в запросе не работали; последнее слово ищется как
+    префикс, чтобы находить и недописанные слова. Нет слов -> None.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def index_post(post_id, text):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', (post_id,))
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)',
+            (post_id, text)
+        )
+
+
+def unindex_post(post_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', (post_id,))
+
+
+def index_posts(post_ids):
+    """Проиндексировать пачку записей, созданных мимо сигналов.
+
+    id передаются параметрами запроса: не больше transfer.SQL_CHUNK.
+    """
+    if not is_available() or not post_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders})', post_ids
+        )
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) SELECT id, text FROM '
+            f'{Post._meta.db_table} WHERE id IN ({placeholders})', post_ids
+        )
+
+
+def rebuild():
+    """Построить индекс заново по таблице записей, вернуть число строк."""
+    if not is_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) SELECT id, text FROM '
+            f'{Post._meta.db_table}'
+        )
+        return cursor.rowcount
+
+
+def search_posts(query, group=None, author=None, newest=False):
+    """Записи по запросу query, самые релевантные первыми.
+
+    newest - сначала новые: порядок по rowid индекса FTS5 отдаётся
+    первые совпадения сразу, без оценки всех найденных записей, что
+    намного быстрее для частых слов.
+
+    Листать - через paginator(): с индексом ключ сортировки -
+    аннотация score, без него - дата публикации, как в лентах.
+    """
+    posts = Post.objects.for_feed()
+    if group is not None:
+        posts = posts.filter(group=group)
+    if author is not None:
+        posts = posts.filter(author=author)
+    if not is_available():
+        return posts.filter(text__icontains=query)
+    expression = match_expression(query)
+    if expression is None:
+        # score нужен paginator() и для пустого результата
+        return posts.none().annotate(score=Value(0.0, FloatField()))
+    score = F('search__post') if newest else -F('search__rank')
+    return posts.filter(search__text__match=expression).annotate(
+        score=score
+    )
+
+
+def paginator(posts, per_page, newest=False):
+    if not is_available():
+        return CursorPaginator(posts, per_page)
+    # rowid уникален, второй ключ сортировки помешал бы FTS5
+    # отдавать записи сразу в нужном порядке
+    return CursorPaginator(posts, per_page, date_field='score',
+                           unique_key=newest)
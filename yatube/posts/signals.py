@@ -0,0 +1,94 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import counters, search, timeline
+from .cache import bump_feed_generation, invalidate_post_cards
+from .models import Comment, Follow, Group, Post
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, raw=False, **kwargs):
+    """Новая запись любым путём (view, админка, ORM) попадает в ленты."""
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_post_text(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'text' in update_fields:
+        search.index_post(instance.pk, instance.text)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post_text(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    """Запись, комментарий и подписка любым путём меняют счётчики."""
+    if created and not raw:
+        counters.post_added(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.post_deleted(instance)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.comment_added(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.comment_deleted(instance)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.follow_added(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.follow_deleted(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def drop_post_card(sender, instance, **kwargs):
+    invalidate_post_cards((instance.pk,))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def drop_commented_post_card(sender, instance, **kwargs):
+    invalidate_post_cards((instance.post_id,))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def drop_group_post_cards(sender, instance, **kwargs):
+    """Карточки всех записей подборки: в них название и адрес подборки.
+
+    При удалении - до него, пока у записей ещё стоит ссылка на подборку.
+    """
+    if instance.pk is not None:
+        invalidate_post_cards(
+            instance.posts.values_list('pk', flat=True).iterator()
+        )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def start_feed_generation(sender, **kwargs):
+    """Закешированные страницы лент для анонимов больше не выдаются."""
+    bump_feed_generation()
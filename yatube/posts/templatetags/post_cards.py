@@ -0,0 +1,34 @@
+from django import template
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.cache import get_post_cards, post_card_key, set_post_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Карточки includes/post_item.html для записей posts.
+
+    Готовые карточки берутся из кеша одним get_many, отсутствующие
+    рендерятся и кладутся в кеш одним set_many.
+    """
+    user = context.get('user')
+    user_id = user.pk if user is not None else None
+    keys = [post_card_key(post.pk, post.author_id == user_id)
+            for post in posts]
+    cached = get_post_cards(keys)
+
+    cards, rendered = [], {}
+    for post, key in zip(posts, keys):
+        card = cached.get(key)
+        if card is None:
+            card = render_to_string(
+                'includes/post_item.html', {'post': post, 'user': user}
+            )
+            rendered[key] = card
+        cards.append(card)
+    if rendered:
+        set_post_cards(rendered)
+    return mark_safe(''.join(cards))
@@ -0,0 +1,98 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.admin import EstimatedCountPaginator
+from posts.models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+class AdminChangelistTests(TestCase):
+    """Списки объектов в админке: число запросов не зависит от числа строк
+
+    На страницу списка уходят: сессия, пользователь, оценка числа строк
+    (без фильтров), подсчёт с LIMIT, сама страница объектов вместе со
+    связанными через list_select_related и, если фильтр выбран, его
+    значение для поля автодополнения.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.authors = [
+            User.objects.create(username=f'author{number}')
+            for number in range(5)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.admin, author=author)
+            post = Post.objects.create(author=author, text='Текст записи')
+            Comment.objects.create(
+                post=post, author=cls.admin, text='Комментарий'
+            )
+
+    def setUp(self):
+        self.client.force_login(AdminChangelistTests.admin)
+
+    def test_changelists_query_budget(self):
+        """Списки записей, комментариев и подписок укладываются в бюджет"""
+        admin_id = AdminChangelistTests.admin.pk
+        author_id = AdminChangelistTests.authors[0].pk
+        cases = (
+            ('admin:posts_post_changelist', {}, 5),
+            ('admin:posts_post_changelist', {'q': 'author1'}, 4),
+            ('admin:posts_post_changelist',
+             {'author__id__exact': author_id}, 5),
+            ('admin:posts_comment_changelist', {}, 5),
+            ('admin:posts_comment_changelist', {'q': 'admin'}, 4),
+            ('admin:posts_follow_changelist', {}, 5),
+            ('admin:posts_follow_changelist',
+             {'user__id__exact': admin_id}, 5),
+        )
+        for name, params, budget in cases:
+            with self.subTest(name=name, params=params):
+                with self.assertNumQueries(budget):
+                    response = self.client.get(reverse(name), params)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_search_by_author_username(self):
+        """Поиск по имени автора находит только его записи"""
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'author1'}
+        )
+        result = response.context['cl'].result_list
+        self.assertEqual(
+            [post.author.username for post in result], ['author1']
+        )
+
+    def test_autocomplete_filter(self):
+        """Фильтр по подписчику - поле автодополнения, а не список"""
+        author = AdminChangelistTests.authors[2]
+        response = self.client.get(
+            reverse('admin:posts_follow_changelist'),
+            {'author__id__exact': author.pk}
+        )
+        self.assertEqual(
+            [follow.author for follow in response.context['cl'].result_list],
+            [author]
+        )
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertContains(
+            response, reverse('admin:auth_user_autocomplete')
+        )
+        self.assertNotContains(response, '?user__id__exact=')
+
+    def test_estimated_count(self):
+        """Большая таблица без фильтров не считается COUNT(*)"""
+        paginator = EstimatedCountPaginator(Post.objects.all(), 2)
+        paginator.COUNT_LIMIT = 2
+        pks = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+        # оценка по крайним id не замечает дыру от удалённой записи
+        Post.objects.filter(pk__in=(pks[0], pks[2])).delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, pks[-1] - pks[1] + 1)
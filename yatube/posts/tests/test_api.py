@@ -0,0 +1,142 @@
+import gzip
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def content(response):
+    return json.loads(b''.join(response.streaming_content))
+
+
+class ApiTests(TestCase):
+    """Проверка JSON API лент
+
+    - лента листается курсором из ссылки next
+    - fields ограничивает ключи ответа и колонки запроса
+    - ошибки параметров - 400 с полем detail
+    - ETag и 304, ответ сжимается gzip
+    - подписки, профиль и страница записи
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='writer')
+        cls.reader = User.objects.create(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        for number in range(5):
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text=f'Запись {number}')
+        cls.post = Post.objects.latest('pub_date')
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_cursor_paging(self):
+        """Порции по limit без повторов, до последней записи."""
+        url = reverse('api:index') + '?limit=2'
+        seen = []
+        while url:
+            data = content(self.client.get(url))
+            seen.extend(post['id'] for post in data['results'])
+            url = data['next']
+        self.assertEqual(
+            seen,
+            list(Post.objects.order_by('-pub_date', '-pk')
+                 .values_list('pk', flat=True))
+        )
+
+    def test_sparse_fields(self):
+        """fields=id,text: только эти ключи и без соединения с автором."""
+        with CaptureQueriesContext(connection) as queries:
+            data = content(self.client.get(reverse('api:index'),
+                                           {'fields': 'id,text'}))
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        for query in queries:
+            self.assertNotIn('auth_user', query['sql'])
+
+    def test_bad_parameters(self):
+        """Неизвестное поле, limit и cursor - 400 с описанием."""
+        for params in ({'fields': 'id,secret'}, {'limit': '0'},
+                       {'cursor': 'мусор'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('api:index'), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('detail', json.loads(response.content))
+
+    def test_etag(self):
+        """Повтор с If-None-Match - 304, новая запись меняет ETag."""
+        url = reverse('api:index')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=self.author, text='Новая запись')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_follows_meta(self):
+        """Подписка меняет ETag профиля, хотя записи те же."""
+        stranger = User.objects.create(username='stranger')
+        self.client.force_login(stranger)
+        url = reverse('api:profile', args=('writer',))
+        etag = self.client.get(url)['ETag']
+        self.client.get(reverse('profile_follow', args=('writer',)))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(content(response)['user']['following'])
+
+    def test_gzip(self):
+        """Клиенту, принимающему gzip, ответ отдаётся сжатым."""
+        response = self.client.get(reverse('api:index'),
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(
+            b''.join(response.streaming_content)
+        ))
+        self.assertEqual(len(data['results']), 5)
+
+    def test_follow_index(self):
+        """Подписки - только авторизованному и с записями автора."""
+        response = self.client.get(reverse('api:follow_index'))
+        self.assertEqual(response.status_code, 401)
+        self.client.force_login(self.reader)
+        data = content(self.client.get(reverse('api:follow_index')))
+        self.assertEqual({post['author'] for post in data['results']},
+                         {'writer'})
+        self.assertEqual(len(data['results']), 5)
+
+    def test_profile_and_post(self):
+        """Профиль с данными автора, запись - с комментариями."""
+        self.client.force_login(self.reader)
+        data = content(self.client.get(
+            reverse('api:profile', args=('writer',))
+        ))
+        self.assertEqual(data['user']['username'], 'writer')
+        self.assertEqual(data['user']['posts_count'], 5)
+        self.assertTrue(data['user']['following'])
+
+        data = content(self.client.get(
+            reverse('api:post', args=('writer', self.post.pk))
+        ))
+        self.assertEqual(data['post']['id'], self.post.pk)
+        self.assertEqual(data['post']['comment_count'], 1)
+        self.assertEqual([comment['text'] for comment in data['results']],
+                         ['Комментарий'])
+        response = self.client.get(reverse('api:post', args=('writer', 0)))
+        self.assertEqual(response.status_code, 404)
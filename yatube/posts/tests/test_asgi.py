@@ -0,0 +1,138 @@
+import asyncio
+import json
+import time
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from yatube.asgi import WsgiToAsgi, application
+
+
+def echo(environ, start_response):
+    """WSGI-приложение, которое отвечает своим окружением и телом."""
+    body = environ['wsgi.input'].read()
+    start_response('201 Created', [('Content-Type', 'application/json')])
+    keys = ('REQUEST_METHOD', 'PATH_INFO', 'QUERY_STRING', 'CONTENT_TYPE',
+            'HTTP_ACCEPT', 'REMOTE_ADDR')
+    return [json.dumps({
+        'environ': {key: environ.get(key) for key in keys},
+        'body': body.decode(),
+    }).encode()]
+
+
+def stream(environ, start_response):
+    """WSGI-приложение, которое отдаёт тело по частям."""
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return iter([b'first ', b'', b'second ', b'third'])
+
+
+class Endless:
+    """Бесконечный ответ, который помнит, что его закрыли."""
+
+    def __init__(self):
+        self.closed = False
+        self.chunks = 0
+
+    def __call__(self, environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return self
+
+    def __iter__(self):
+        while self.chunks < 1000:
+            self.chunks += 1
+            time.sleep(0.001)
+            yield b'chunk '
+
+    def close(self):
+        self.closed = True
+
+
+def call(app, scope, chunks=(b'',), disconnect_after=None, sent=None):
+    """Отправить приложению ASGI запрос, вернуть (код, заголовки, тело).
+
+    После тела запроса receive ждёт, как сервер, до отключения клиента
+    через disconnect_after секунд или бесконечно. Все отправленные
+    приложением сообщения попадают в список sent.
+    """
+    messages = [{'type': 'http.request', 'body': chunk,
+                 'more_body': number < len(chunks) - 1}
+                for number, chunk in enumerate(chunks)]
+    sent = [] if sent is None else sent
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        if disconnect_after is None:
+            await asyncio.get_running_loop().create_future()
+        await asyncio.sleep(disconnect_after)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app({'type': 'http', 'http_version': '1.1',
+                     'query_string': b'', 'headers': [],
+                     'client': ('127.0.0.1', 5000), **scope},
+                    receive, send))
+    return (sent[0]['status'], dict(sent[0]['headers']),
+            b''.join(message.get('body', b'') for message in sent[1:]))
+
+
+class AsgiTests(SimpleTestCase):
+    """Проверка ASGI-обёртки над WSGI-приложением
+
+    - окружение WSGI собирается из scope, тело - из всех частей
+    - тело ответа уходит по частям, после отключения клиента не читается
+    - yatube.asgi отдаёт страницы проекта
+    """
+
+    def test_environ_and_body(self):
+        """Метод, путь, заголовки и тело из нескольких частей доходят."""
+        status, headers, body = call(WsgiToAsgi(echo, 1), {
+            'method': 'POST', 'path': '/поиск/', 'query_string': b'q=1',
+            'headers': [(b'content-type', b'text/plain'),
+                        (b'accept', b'text/html'), (b'accept', b'*/*')],
+        }, chunks=(b'first ', b'second'))
+        self.assertEqual(status, 201)
+        self.assertEqual(headers[b'content-type'], b'application/json')
+        data = json.loads(body)
+        self.assertEqual(data['body'], 'first second')
+        self.assertEqual(data['environ'], {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/поиск/'.encode().decode('latin1'),
+            'QUERY_STRING': 'q=1',
+            'CONTENT_TYPE': 'text/plain',
+            'HTTP_ACCEPT': 'text/html,*/*',
+            'REMOTE_ADDR': '127.0.0.1',
+        })
+
+    def test_response_streamed(self):
+        """Каждая непустая часть ответа - своё сообщение more_body."""
+        sent = []
+        status, _, body = call(WsgiToAsgi(stream, 1),
+                               {'method': 'GET', 'path': '/'}, sent=sent)
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'first second third')
+        self.assertEqual(
+            [(message['body'], message.get('more_body', False))
+             for message in sent[1:]],
+            [(b'first ', True), (b'second ', True), (b'third', True),
+             (b'', False)]
+        )
+
+    def test_disconnect_stops_response(self):
+        """После отключения клиента ответ закрывается недочитанным."""
+        app = Endless()
+        call(WsgiToAsgi(app, 1), {'method': 'GET', 'path': '/'},
+             disconnect_after=0.05)
+        self.assertTrue(app.closed)
+        self.assertLess(app.chunks, 1000)
+
+    def test_project_page(self):
+        """Страница проекта через yatube.asgi."""
+        status, _, body = call(application, {
+            'method': 'GET', 'path': reverse('about:tech'),
+            'headers': [(b'host', b'localhost')],
+        })
+        self.assertEqual(status, 200)
+        self.assertIn('</html>', body.decode())
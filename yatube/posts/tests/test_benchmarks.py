@@ -0,0 +1,67 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts.models import AuthorStats, Comment, Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class LoadBenchmarkTests(TestCase):
+    """Проверка генератора данных и прогона страниц с эталоном.
+
+    - generate_data создаёт заданные объёмы со степенным распределением
+    - bench_views записывает эталон и падает, если запросов стало больше
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'generate_data', users=30, groups=2, follows=200, posts=300,
+            comments=200, stdout=io.StringIO()
+        )
+        cls.tmp_dir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_generated_data(self):
+        """Проверка объёмов и перекоса: у немногих авторов много читателей."""
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Follow.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 200)
+        followers = sorted(
+            AuthorStats.objects.values_list('followers_count', flat=True),
+            reverse=True
+        )
+        self.assertGreater(followers[0], 3 * followers[len(followers) // 2])
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_baseline_regression(self):
+        """Проверка, что рост числа запросов относительно эталона - ошибка."""
+        baseline = os.path.join(LoadBenchmarkTests.tmp_dir, 'baseline.json')
+        options = {'requests': 3, 'warmup': 1, 'baseline': baseline,
+                   'only': ['index', 'post'], 'stdout': io.StringIO()}
+        call_command('bench_views', save_baseline=True, **options)
+        with open(baseline) as file:
+            results = json.load(file)
+        self.assertEqual(set(results), {'index', 'post'})
+
+        call_command('bench_views', tolerance=100, **options)
+
+        results['post']['queries'] -= 1
+        with open(baseline, 'w') as file:
+            json.dump(results, file)
+        with self.assertRaisesMessage(CommandError, 'post: запросов'):
+            call_command('bench_views', tolerance=100, **options)
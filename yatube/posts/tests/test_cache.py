@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from yatube.cache_backends import SQLiteCache
+
+
+def increment_many(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('generation')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    """Проверка общего кеша в SQLite
+
+    - обычные операции ведут себя как у встроенных бэкендов
+    - incr атомарен между процессами
+    - при переполнении вытесняются давно не читанные записи
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.location = os.path.join(self.directory.name, 'cache.sqlite3')
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        """get/set/add/delete/get_many/touch как у LocMemCache."""
+        cache = self.make_cache()
+        cache.set('card', {'html': '<p>пост</p>'})
+        self.assertEqual(cache.get('card'), {'html': '<p>пост</p>'})
+        self.assertIsNone(cache.get('missing'))
+        self.assertFalse(cache.add('card', 'другое'))
+        self.assertTrue(cache.add('new', 'значение'))
+        self.assertEqual(
+            cache.get_many(['card', 'new', 'missing']),
+            {'card': {'html': '<p>пост</p>'}, 'new': 'значение'}
+        )
+        cache.delete('card')
+        self.assertFalse(cache.has_key('card'))
+        self.assertTrue(cache.touch('new', None))
+        self.assertFalse(cache.touch('card'))
+
+    def test_expired_values_are_missing(self):
+        """Истёкшие записи не возвращаются и освобождают ключ для add."""
+        cache = self.make_cache()
+        cache.set('short', 'значение', timeout=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('short'))
+        self.assertTrue(cache.add('short', 'новое'))
+        self.assertEqual(cache.get('short'), 'новое')
+
+    def test_values_are_shared_between_instances(self):
+        """Запись, сделанная одним экземпляром, видна другому."""
+        self.make_cache().set('generation', 5)
+        other = self.make_cache()
+        self.assertEqual(other.get('generation'), 5)
+        other.delete('generation')
+        self.assertIsNone(self.make_cache().get('generation'))
+
+    def test_incr_is_atomic_between_processes(self):
+        """Одновременные incr из нескольких процессов не теряются."""
+        cache = self.make_cache()
+        cache.set('generation', 0, timeout=None)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment_many, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(cache.get('generation'), 200)
+        self.assertEqual(cache.decr('generation', 10), 190)
+
+    def test_incr_missing_or_not_integer(self):
+        """incr отсутствующего или нецелого значения -> ValueError."""
+        cache = self.make_cache()
+        cache.set('text', 'строка')
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        with self.assertRaises(ValueError):
+            cache.incr('text')
+
+    def test_lru_eviction_by_entries(self):
+        """Сверх MAX_ENTRIES вытесняются давно не читанные записи."""
+        cache = self.make_cache(MAX_ENTRIES=4, CULL_FREQUENCY=4)
+        for number in range(4):
+            cache.set(f'key{number}', number)
+        connection = cache._connection()
+        connection.execute('UPDATE cache SET accessed = 0')
+        # недавнее чтение защищает ключ от вытеснения
+        cache.get('key0')
+        cache.set('key4', 4)
+        self.assertIsNone(cache.get('key1'))
+        for key in ('key0', 'key2', 'key3', 'key4'):
+            self.assertIsNotNone(cache.get(key), key)
+
+    def test_eviction_by_size(self):
+        """Суммарный размер значений не превышает MAX_SIZE."""
+        cache = self.make_cache(MAX_SIZE=10000)
+        for number in range(20):
+            cache.set(f'page{number}', 'x' * 1000)
+            # перезапись не должна удваивать учтённый размер
+            cache.set(f'page{number}', 'y' * 1000)
+        entries, size = cache._connection().execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        self.assertLessEqual(size, 10000)
+        self.assertEqual(
+            (entries, size),
+            cache._connection().execute(
+                'SELECT COUNT(*), SUM(size) FROM cache'
+            ).fetchone()
+        )
+        self.assertIsNotNone(cache.get('page19'))
+        cache.clear()
+        self.assertEqual(
+            cache._connection().execute(
+                'SELECT entries, size FROM cache_stats'
+            ).fetchone(),
+            (0, 0)
+        )
@@ -1,13 +1,17 @@
+import io
 import shutil
 import tempfile
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.template.defaultfilters import filesizeformat
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.models import Group, Post
+from posts.uploads import open_image
 
 User = get_user_model()
 
@@ -219,3 +223,115 @@ class TestCreateEditPostForm(TestCase):
             edited_post.author, TestCreateEditPostForm.user_author
         )
         self.assertEqual(edited_post.image, form_data['image'])
+
+
+class StreamingImageUploadTests(TestCase):
+    """Проверка потокового приёма изображений в PostForm.
+
+    Методика проверки:
+    - не изображение, слишком большой файл и слишком большое по числу
+      пикселей изображение отклоняются с понятной ошибкой у поля image;
+    - большое изображение уменьшается, метаданные удаляются.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create(
+            username='test_user_author',
+        )
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.authorized_author = Client()
+        self.authorized_author.force_login(
+            StreamingImageUploadTests.user_author
+        )
+
+    @staticmethod
+    def jpeg(size, exif=None):
+        buffer = io.BytesIO()
+        options = {'exif': exif} if exif else {}
+        Image.new('RGB', size, (200, 30, 30)).save(buffer, 'JPEG', **options)
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(),
+                                  content_type='image/jpeg')
+
+    def post_image(self, image):
+        return self.authorized_author.post(
+            reverse('new_post'),
+            {'text': 'Тестовый пост с картинкой', 'image': image}
+        )
+
+    def assert_rejected(self, image, message):
+        response = self.post_image(image)
+        self.assertFormError(response, 'form', 'image', message)
+        self.assertFalse(Post.objects.exists())
+
+    def test_not_image_rejected(self):
+        """Файл с чужой сигнатурой отклоняется."""
+        self.assert_rejected(
+            SimpleUploadedFile('fake.gif', b'<html>not an image</html>',
+                               content_type='image/gif'),
+            'Поддерживаются изображения JPEG, PNG, GIF и WebP.'
+        )
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024)
+    def test_oversize_file_rejected(self):
+        """Файл больше IMAGE_UPLOAD_MAX_SIZE отклоняется."""
+        self.assert_rejected(
+            SimpleUploadedFile('big.gif', b'GIF89a' + b'\x00' * 2048,
+                               content_type='image/gif'),
+            f'Файл больше {filesizeformat(1024)}.'
+        )
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels_rejected(self):
+        """Размеры берутся из заголовка и проверяются до приёма файла."""
+        self.assert_rejected(
+            self.jpeg((200, 100)),
+            'Изображение слишком большое: 200x100 пикселей.'
+        )
+
+    def test_format_checked_after_open(self):
+        """Изображение другого формата, чем по сигнатуре, не открывается."""
+        content = self.jpeg((10, 10)).read()
+        with open_image(io.BytesIO(content), 'JPEG') as image:
+            self.assertEqual(image.size, (10, 10))
+        with self.assertRaises(OSError):
+            open_image(io.BytesIO(content), 'PNG')
+
+    @override_settings(IMAGE_UPLOAD_MAX_DIMENSION=100)
+    def test_truncated_image_rejected(self):
+        """Обрезанный файл с целым заголовком отклоняется при декодировании."""
+        exif = Image.Exif()
+        exif[0x010f] = 'Test camera'
+        for image in (self.jpeg((400, 200)),
+                      self.jpeg((50, 50), exif=exif.tobytes())):
+            content = image.read()
+            with self.subTest(size=len(content)):
+                self.assert_rejected(
+                    # заголовок цел, обрезаны данные кадра
+                    SimpleUploadedFile('cut.jpg', content[:-40],
+                                       content_type='image/jpeg'),
+                    'Не удалось прочитать изображение.'
+                )
+
+    @override_settings(IMAGE_UPLOAD_MAX_DIMENSION=100)
+    def test_large_image_downscaled_without_metadata(self):
+        """Большое изображение уменьшено, EXIF удалён."""
+        exif = Image.Exif()
+        exif[0x010f] = 'Test camera'
+        self.post_image(self.jpeg((400, 200), exif=exif.tobytes()))
+
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertNotIn('exif', image.info)
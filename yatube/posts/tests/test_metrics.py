@@ -0,0 +1,103 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from yatube.metrics import RequestStats, registry
+
+User = get_user_model()
+
+
+class MetricsMiddlewareTests(TestCase):
+    """Проверка замеров запросов
+
+    - в лог пишется строка JSON с view, запросами к базе, шаблонами, кешем
+    - /metrics отдаёт суммы по view в формате Prometheus
+    - большие суммы выводятся без округления
+    - /metrics недоступен без токена и с чужих адресов
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='writer')
+        Post.objects.create(author=cls.author, text='Запись для замеров')
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.client = Client()
+
+    @override_settings(METRICS_LOG_SAMPLE_RATE=1)
+    def test_request_is_logged_as_json(self):
+        """Строка лога содержит замеры страницы профиля."""
+        with self.assertLogs('yatube.requests', 'INFO') as logs:
+            self.client.get(
+                reverse('profile', args=(MetricsMiddlewareTests.author,))
+            )
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'profile')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['db_queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertGreater(record['cache_misses'], 0)
+        self.assertGreaterEqual(record['duration_ms'], record['db_ms'])
+
+    @override_settings(METRICS_LOG_SAMPLE_RATE=1)
+    def test_cache_hits_are_counted(self):
+        """Повторная страница для анонима берётся из кеша."""
+        with self.assertLogs('yatube.requests', 'INFO') as logs:
+            self.client.get(reverse('index'))
+            self.client.get(reverse('index'))
+        second = json.loads(logs.records[1].getMessage())
+        self.assertGreater(second['cache_hits'], 0)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint(self):
+        """/metrics показывает запросы, время и запросы к базе по view."""
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_requests_total{view="index",method="GET",status="2xx"} 1',
+            text
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="index"} 1', text
+        )
+        self.assertIn('yatube_db_queries_total{view="index"}', text)
+
+    def test_large_sums_keep_precision(self):
+        """Суммы больше миллиона не переходят в округлённую запись."""
+        stats = RequestStats()
+        stats.queries = 1234567
+        stats.db_time = 1234567.125
+        registry.add('index', 'GET', 200, 0.01, stats)
+        stats.queries = 1
+        registry.add('index', 'GET', 200, 0.01, stats)
+        text = registry.render()
+        self.assertIn('yatube_db_queries_total{view="index"} 1234568\n',
+                      text)
+        self.assertIn(
+            'yatube_db_query_seconds_total{view="index"} 2469134.25\n', text
+        )
+
+    def test_metrics_endpoint_restricted(self):
+        """Без токена, с чужим токеном или адресом /metrics не найден."""
+        for token, header, addresses in (
+                ('', 'Bearer ', []),
+                ('secret', '', []),
+                ('secret', 'Bearer wrong', []),
+                ('secret', 'Bearer secret', ['10.0.0.1'])):
+            with self.subTest(header=header, addresses=addresses):
+                with override_settings(METRICS_TOKEN=token,
+                                       METRICS_ALLOWED_IPS=addresses):
+                    response = self.client.get(reverse('metrics'),
+                                               HTTP_AUTHORIZATION=header)
+                self.assertEqual(response.status_code, 404)
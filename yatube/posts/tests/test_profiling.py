@@ -0,0 +1,89 @@
+import os
+import pstats
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from yatube.profiling import StackSampler
+
+User = get_user_model()
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """Проверка профилирования запросов
+
+    - медленнее порога - профиль сохраняется с именем маршрута
+    - быстрее порога или не каждый N-й - не сохраняется
+    - cProfile пишет файлы, которые читает pstats
+    - старые профили удаляются
+    - после unwatch() счётчик запроса больше не меняется
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='writer')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Запись для профиля'
+        )
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def request_post(self, times=1, **overrides):
+        """Запросить страницу записи новым клиентом с настройками."""
+        overrides = {'PROFILER': 'sampler', 'PROFILER_SLOW_MS': 0,
+                     'PROFILER_EVERY': 1, 'PROFILER_INTERVAL_MS': 1,
+                     'PROFILER_DIR': self.directory, **overrides}
+        url = reverse('post', args=(ProfilingMiddlewareTests.author,
+                                    ProfilingMiddlewareTests.post.pk))
+        with override_settings(**overrides):
+            client = Client()
+            for _ in range(times):
+                self.assertEqual(client.get(url).status_code, 200)
+        return sorted(os.listdir(self.directory))
+
+    def test_sampler_saves_slow_request(self):
+        """Профиль семплера - свёрнутые стеки, в имени файла маршрут."""
+        files = self.request_post()
+        self.assertEqual(len(files), 1)
+        self.assertIn('-post-', files[0])
+        self.assertTrue(files[0].endswith('.collapsed'))
+        with open(os.path.join(self.directory, files[0])) as file:
+            for line in file:
+                stack, samples = line.rsplit(' ', 1)
+                self.assertGreater(int(samples), 0)
+
+    def test_fast_requests_are_not_saved(self):
+        """Запросы быстрее порога и не попавшие в выборку не пишутся."""
+        self.assertEqual(self.request_post(PROFILER_SLOW_MS=60000), [])
+        self.assertEqual(len(self.request_post(3, PROFILER_EVERY=2)), 1)
+
+    def test_cprofile_writes_pstats(self):
+        """Профиль cProfile читается pstats."""
+        files = self.request_post(PROFILER='cprofile')
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith('.prof'))
+        stats = pstats.Stats(os.path.join(self.directory, files[0]))
+        self.assertGreater(stats.total_calls, 0)
+
+    def test_old_profiles_are_rotated(self):
+        """Остаются только PROFILER_KEEP последних профилей."""
+        self.assertEqual(len(self.request_post(3, PROFILER_KEEP=2)), 2)
+
+    def test_sampler_stops_counting_after_unwatch(self):
+        """Снятые после unwatch() стеки не попадают в профиль запроса."""
+        sampler = StackSampler(interval=0)
+        stacks = sampler.watch()
+        sampler.sample()
+        self.assertEqual(sum(stacks.values()), 1)
+        sampler.unwatch()
+        sampler.sample()
+        self.assertEqual(sum(stacks.values()), 1)
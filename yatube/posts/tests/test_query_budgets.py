@@ -0,0 +1,167 @@
+import io
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from about.urls import app_name as about_namespace
+from about.urls import urlpatterns as about_urlpatterns
+from posts.api_urls import app_name as api_namespace
+from posts.api_urls import urlpatterns as api_urlpatterns
+from posts.models import Comment, Follow, Group, Post
+from posts.urls import urlpatterns as posts_urlpatterns
+from users.urls import urlpatterns as users_urlpatterns
+
+User = get_user_model()
+
+# запросов к базе на один GET; страница ленты длиннее, чем
+# PAGINATOR_DEFAULT_SIZE, так что запрос на каждую запись не пройдёт
+QUERY_BUDGETS = {
+    'index': 4,
+    'group_index': 4,
+    'group': 5,
+    'new_post': 3,
+    'follow_index': 6,
+    'search': 4,
+    'profile': 7,
+    'post': 5,
+    'post_edit': 5,
+    'add_comment': 4,
+    'post_comments': 5,
+    'profile_follow': 14,
+    'profile_unfollow': 11,
+    'about:author': 2,
+    'about:tech': 2,
+    'signup': 2,
+    'api:index': 3,
+    'api:group': 4,
+    'api:follow_index': 5,
+    'api:profile': 5,
+    'api:post': 4,
+}
+
+# от чьего имени проверять маршрут, по умолчанию - подписчика автора:
+# правка - от автора, подписка - от того, кто ещё не подписан
+ROUTE_ROLES = {'post_edit': 'author', 'profile_follow': 'stranger'}
+
+
+def route_names():
+    for namespace, patterns in ((None, posts_urlpatterns),
+                                (about_namespace, about_urlpatterns),
+                                (None, users_urlpatterns),
+                                (api_namespace, api_urlpatterns)):
+        for pattern in patterns:
+            if pattern.name is not None:
+                yield (f'{namespace}:{pattern.name}' if namespace
+                       else pattern.name), pattern
+
+
+def normalize(sql):
+    """SQL без значений: одинаковые по сути запросы совпадают."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    return re.sub(r'IN \((?:\?, )*\?\)', 'IN (...)', sql)
+
+
+def budget_report(name, budget, queries):
+    """Сообщение о превышении: повторы запросов, затем все по порядку."""
+    counts = Counter(normalize(query['sql']) for query in queries)
+    lines = [f'{name}: {len(queries)} запросов при бюджете {budget}.']
+    repeated = [(count, sql) for sql, count in counts.most_common()
+                if count > 1]
+    if repeated:
+        lines.append('Повторяются:')
+        lines.extend(f'  {count} x {sql}' for count, sql in repeated)
+    lines.append('Все запросы:')
+    lines.extend(f'  {number}. {query["sql"]}'
+                 for number, query in enumerate(queries, 1))
+    return '\n'.join(lines)
+
+
+class QueryBudgetTests(TestCase):
+    """Проверка числа запросов к базе на каждом маршруте.
+
+    Маршруты posts.urls, posts.api_urls, about.urls и users.urls
+    перечисляются из самих urlpatterns: у нового маршрута бюджет должен
+    быть объявлен в QUERY_BUDGETS. Каждый GET - с пустым кешем и в своей точке
+    сохранения, откатываемой после запроса, чтобы подписка или
+    комментарий одного маршрута не меняли число запросов другого.
+    При превышении тест показывает повторяющиеся запросы - обычно это
+    запрос на каждый объект страницы.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='writer')
+        cls.reader = User.objects.create(username='reader')
+        cls.stranger = User.objects.create(username='stranger')
+        cls.group = Group.objects.create(
+            title='test_group_title', slug='test-slug',
+            description='test_description'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(settings.PAGINATOR_DEFAULT_SIZE + 3):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group,
+                text=f'Запись номер {number}'
+            )
+            for commentator in (cls.author, cls.reader):
+                Comment.objects.create(
+                    post=post, author=commentator, text='Комментарий'
+                )
+        cls.post = post
+        # счётчики авторов, как в работающей базе, уже посчитаны
+        call_command('recount_stats', stdout=io.StringIO())
+
+    def setUp(self):
+        self.clients = {}
+        for role, user in (('author', QueryBudgetTests.author),
+                           ('reader', QueryBudgetTests.reader),
+                           ('stranger', QueryBudgetTests.stranger)):
+            self.clients[role] = Client()
+            self.clients[role].force_login(user)
+
+    def url_for(self, name, pattern):
+        values = {
+            'username': QueryBudgetTests.author.username,
+            'post_id': QueryBudgetTests.post.pk,
+            'slug': QueryBudgetTests.group.slug,
+        }
+        url = reverse(name, kwargs={
+            key: values[key] for key in pattern.pattern.converters
+        })
+        return url + '?q=Запись' if name == 'search' else url
+
+    def test_every_route_has_budget(self):
+        """Проверка, что бюджет объявлен ровно для существующих маршрутов"""
+        self.assertEqual(
+            sorted(name for name, _ in route_names()), sorted(QUERY_BUDGETS)
+        )
+
+    def test_routes_within_budget(self):
+        """Проверка, что ни один маршрут не превышает бюджет запросов"""
+        for name, pattern in route_names():
+            if name not in QUERY_BUDGETS:
+                continue
+            with self.subTest(route=name):
+                role = ROUTE_ROLES.get(name, 'reader')
+                url = self.url_for(name, pattern)
+                cache.clear()
+                savepoint = transaction.savepoint()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.clients[role].get(url)
+                transaction.savepoint_rollback(savepoint)
+                self.assertLess(response.status_code, 400)
+                budget = QUERY_BUDGETS[name]
+                if len(queries) > budget:
+                    self.fail(budget_report(
+                        name, budget, queries.captured_queries
+                    ))
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.cache import post_card_key
+from posts.models import Post
+from yatube import replicas
+
+User = get_user_model()
+
+REPLICA = 'replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(TestCase):
+    """Проверка чтения с реплики.
+
+    Реплика - отдельный файл SQLite, в который sync() копирует тестовую
+    базу до начала транзакций теста. Одна и та же запись в default и в
+    реплике отличается текстом, так что по странице видно, откуда она.
+
+    - ленты и страница записи без записей читают реплику
+    - страницы без replica_reads читают default
+    - после POST запросы читают default, пока жива кука
+    - в общий кеш не попадает прочитанное с реплики
+    """
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases[REPLICA] = {
+            'ENGINE': 'yatube.sqlite_backend',
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        connections.ensure_defaults(REPLICA)
+        connections.prepare_test_settings(REPLICA)
+        replicas.sync([REPLICA])
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        for using, text in (('default', 'Текст из основной базы'),
+                            (REPLICA, 'Текст из реплики')):
+            author = User.objects.db_manager(using).create(
+                pk=1000, username='writer'
+            )
+            Post.objects.using(using).create(pk=1000, author=author,
+                                             text=text)
+        cls.author = User.objects.get(pk=1000)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(ReplicaRoutingTests.author)
+        self.post_url = reverse('post', args=('writer', 1000))
+
+    def test_feeds_read_replica(self):
+        """Лента и страница записи показывают текст из реплики."""
+        for url in (reverse('index'), reverse('profile', args=('writer',)),
+                    self.post_url):
+            with self.subTest(url=url):
+                # у каждого свой клиент: кука PIN_COOKIE не переходит
+                client = Client()
+                client.force_login(ReplicaRoutingTests.author)
+                response = client.get(url)
+                self.assertContains(response, 'Текст из реплики')
+                self.assertNotContains(response, 'Текст из основной базы')
+
+    def test_other_views_read_default(self):
+        """Правка записи не помечена replica_reads и читает default."""
+        response = self.client.get(
+            reverse('post_edit', args=('writer', 1000))
+        )
+        self.assertContains(response, 'Текст из основной базы')
+
+    def test_read_after_write(self):
+        """После комментария страница записи читается из default."""
+        response = self.client.post(
+            reverse('add_comment', args=('writer', 1000)),
+            {'text': 'Свежий комментарий'}, follow=True
+        )
+        self.assertIn(replicas.PIN_COOKIE, self.client.cookies)
+        self.assertContains(response, 'Текст из основной базы')
+        self.assertContains(response, 'Свежий комментарий')
+
+        response = Client().get(self.post_url)
+        self.assertContains(response, 'Текст из реплики')
+        self.assertNotContains(response, 'Свежий комментарий')
+
+    def test_shared_caches_not_filled_from_replica(self):
+        """Карточки с реплики не кешируются, страница анонима - по default."""
+        self.client.get(reverse('index'))
+        self.assertIsNone(cache.get(post_card_key(1000, True)))
+
+        for _ in range(2):
+            response = Client().get(reverse('index'))
+            self.assertContains(response, 'Текст из основной базы')
+            self.assertNotContains(response, 'Текст из реплики')
+        self.assertIsNotNone(cache.get(post_card_key(1000, False)))
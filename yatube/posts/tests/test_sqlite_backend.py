@@ -0,0 +1,105 @@
+import io
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.db.utils import OperationalError
+from django.test import SimpleTestCase
+
+from yatube.sqlite_backend.base import DatabaseWrapper
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    """Проверка бэкенда SQLite для одновременной работы
+
+    - при соединении включаются WAL и остальные pragma
+    - свои ключи OPTIONS не передаются sqlite3.connect
+    - запрос при занятой базе повторяется, пока блокировка не снята
+    - в отложенной транзакции SQLITE_BUSY сразу отдаётся как ошибка
+    - bench_sqlite сравнивает оба варианта
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.name = os.path.join(directory.name, 'db.sqlite3')
+
+    def make_wrapper(self, **options):
+        wrapper = DatabaseWrapper({
+            'NAME': self.name, 'OPTIONS': options, 'CONN_MAX_AGE': 0,
+            'AUTOCOMMIT': True, 'TIME_ZONE': None,
+        })
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        """WAL, synchronous=NORMAL и заданный mmap_size."""
+        wrapper = self.make_wrapper(PRAGMAS={'mmap_size': 1024 * 1024},
+                                    BUSY_RETRIES=1)
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        # NORMAL = 1
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'mmap_size'), 1024 * 1024)
+        self.assertNotIn('PRAGMAS', wrapper.get_connection_params())
+
+    def test_busy_retry(self):
+        """Запись ждёт снятия чужой блокировки, без повторов - ошибка."""
+        holder = self.make_wrapper()
+        with holder.cursor() as cursor:
+            cursor.execute('CREATE TABLE note (text TEXT)')
+        holder.cursor().execute('BEGIN IMMEDIATE')
+        release = threading.Timer(0.05, holder.connection.commit)
+        release.start()
+        self.addCleanup(release.cancel)
+
+        impatient = self.make_wrapper(timeout=0, BUSY_RETRIES=0)
+        with self.assertRaisesMessage(OperationalError, 'locked'):
+            impatient.cursor().execute("INSERT INTO note VALUES ('нет')")
+
+        patient = self.make_wrapper(timeout=0, BUSY_RETRIES=8)
+        patient.cursor().execute("INSERT INTO note VALUES ('да')")
+        with patient.cursor() as cursor:
+            cursor.execute('SELECT text FROM note')
+            self.assertEqual(cursor.fetchall(), [('да',)])
+
+    def test_no_retry_in_deferred_transaction(self):
+        """Запись по устаревшему снимку транзакции не повторяется."""
+        writer = self.make_wrapper()
+        with writer.cursor() as cursor:
+            cursor.execute('CREATE TABLE note (text TEXT)')
+        connections.databases['deferred'] = {
+            'ENGINE': 'yatube.sqlite_backend', 'NAME': self.name,
+            'OPTIONS': {'timeout': 0, 'BUSY_RETRIES': 8},
+        }
+        connections.ensure_defaults('deferred')
+        self.addCleanup(connections.databases.pop, 'deferred')
+        self.addCleanup(delattr, connections._connections, 'deferred')
+        deferred = connections['deferred']
+        self.addCleanup(deferred.close)
+
+        started = time.monotonic()
+        with self.assertRaisesMessage(OperationalError, 'locked'):
+            with transaction.atomic(using='deferred'):
+                with deferred.cursor() as cursor:
+                    cursor.execute('SELECT COUNT(*) FROM note')
+                writer.cursor().execute("INSERT INTO note VALUES ('чужая')")
+                with deferred.cursor() as cursor:
+                    cursor.execute("INSERT INTO note VALUES ('своя')")
+        # восемь пауз заняли бы больше двух секунд
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_bench_sqlite(self):
+        """Сравнение выводит оба варианта."""
+        out = io.StringIO()
+        call_command('bench_sqlite', readers=1, writers=1, seconds=0.2,
+                     stdout=out)
+        self.assertIn('default', out.getvalue())
+        self.assertIn('tuned', out.getvalue())
@@ -0,0 +1,50 @@
+import io
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.template import engines
+from django.test import TestCase, override_settings
+
+from posts.models import Post
+from yatube.template_warmup import LOADERS, warm_up, with_cached_loader
+
+User = get_user_model()
+
+
+class TemplateWarmupTests(TestCase):
+    """Проверка кеширующего загрузчика шаблонов.
+
+    - warm_up разбирает шаблоны проекта заранее, шаблоны admin - нет
+    - bench_templates сравнивает отрисовку index без кеша и с ним
+    """
+
+    def test_warm_up_fills_loader_cache(self):
+        """Проверка, что после прогрева шаблоны ленты уже в кеше."""
+        with override_settings(
+                TEMPLATES=with_cached_loader(settings.TEMPLATES)):
+            self.assertGreater(warm_up(), 0)
+            loader = engines['django'].engine.template_loaders[0]
+            cached = loader.get_template_cache
+        for name in ('base.html', 'posts/index.html',
+                     'includes/post_item.html', 'includes/paginator.html'):
+            self.assertIn(name, cached)
+        self.assertNotIn('admin/base.html', cached)
+
+    def test_warm_up_skips_uncached_engine(self):
+        """Проверка, что без кеширующего загрузчика прогревать нечего."""
+        templates = [dict(backend, OPTIONS=dict(backend['OPTIONS'],
+                                                loaders=LOADERS))
+                     for backend in with_cached_loader(settings.TEMPLATES)]
+        with override_settings(TEMPLATES=templates):
+            self.assertEqual(warm_up(), 0)
+
+    def test_bench_templates(self):
+        """Проверка, что сравнение выводит оба загрузчика."""
+        author = User.objects.create(username='writer')
+        for number in range(3):
+            Post.objects.create(author=author, text=f'Запись {number}')
+        out = io.StringIO()
+        call_command('bench_templates', renders=2, warmup=1, stdout=out)
+        self.assertIn('без кеша', out.getvalue())
+        self.assertIn('кеш загрузчика', out.getvalue())
@@ -0,0 +1,184 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.cache import post_card_key
+from posts.models import (AuthorStats, Comment, Follow, Group, Post,
+                          TimelineEntry)
+from posts.transfer import TABLES, PostTable, import_rows
+
+User = get_user_model()
+
+
+class DataTransferTests(TestCase):
+    """Проверка выгрузки и загрузки данных командами export_data/import_data.
+
+    - выгрузка и загрузка в пустую базу сохраняют записи, даты и связи
+    - имена пользователей разрешаются запросом на порцию, а не на строку
+    - загрузка обновляет ленты подписок, индекс поиска и счётчики
+    - загрузка комментариев сбрасывает карточки их записей
+    - строки со ссылками на неизвестных пользователей пропускаются
+    - даты из файла сохраняются, не мешая другим сохранениям записей
+    - в запросе не больше 999 параметров, как требует SQLite до 3.32
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='writer')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='test_group_title', slug='test-slug',
+            description='test_description'
+        )
+        cls.tmp_dir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def path(self, name):
+        return os.path.join(DataTransferTests.tmp_dir, name)
+
+    def export(self, table, name):
+        call_command('export_data', table, output=self.path(name),
+                     stderr=io.StringIO())
+
+    def load(self, table, name, **options):
+        call_command('import_data', table, self.path(name),
+                     stdout=io.StringIO(), **options)
+
+    def test_round_trip(self):
+        """Проверка, что загрузка выгрузки восстанавливает данные."""
+        posts = [
+            Post.objects.create(
+                author=DataTransferTests.author, text=f'Запись {number}',
+                group=DataTransferTests.group if number % 2 else None
+            )
+            for number in range(3)
+        ]
+        Comment.objects.create(
+            post=posts[0], author=DataTransferTests.reader, text='Ответ'
+        )
+        Follow.objects.create(
+            user=DataTransferTests.reader, author=DataTransferTests.author
+        )
+        expected = list(Post.objects.values_list(
+            'id', 'text', 'pub_date', 'group__slug', 'author__username'
+        ))
+        for table, name in (('posts', 'posts.csv'),
+                            ('comments', 'comments.jsonl'),
+                            ('follows', 'follows.jsonl')):
+            self.export(table, name)
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        TimelineEntry.objects.all().delete()
+
+        for table, name in (('posts', 'posts.csv'),
+                            ('comments', 'comments.jsonl'),
+                            ('follows', 'follows.jsonl')):
+            self.load(table, name)
+
+        self.assertEqual(list(Post.objects.values_list(
+            'id', 'text', 'pub_date', 'group__slug', 'author__username'
+        )), expected)
+        self.assertEqual(Post.objects.get(pk=posts[0].pk).comment_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=DataTransferTests.author)
+            .followers_count, 1
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=DataTransferTests.reader)
+            .count(), 3
+        )
+        if connection.vendor == 'sqlite':
+            response = self.client.get(reverse('search'), {'q': 'Запись'})
+            self.assertEqual(len(response.context['page']), 3)
+
+    def test_comments_drop_post_cards(self):
+        """Проверка, что загруженные комментарии сбрасывают карточку."""
+        post = Post.objects.create(author=DataTransferTests.author,
+                                   text='Запись')
+        key = post_card_key(post.pk, False)
+        cache.set(key, 'старая карточка')
+        import_rows(TABLES['comments'](), [
+            {'post': str(post.pk), 'author': 'reader', 'text': 'Ответ'}
+        ], batch_size=10)
+        self.assertIsNone(cache.get(key))
+
+    def test_usernames_resolved_per_batch(self):
+        """Проверка, что авторы ищутся одним запросом на порцию строк."""
+        with open(self.path('many.jsonl'), 'w', encoding='utf-8') as file:
+            for number in range(1, 21):
+                author = ('writer', 'reader')[number % 2]
+                file.write(json.dumps({'id': 1000 + number, 'text': 'x',
+                                       'author': author}) + '\n')
+        with CaptureQueriesContext(connection) as queries:
+            self.load('posts', 'many.jsonl', batch_size=10)
+        user_queries = [query for query in queries.captured_queries
+                        if 'FROM "auth_user" WHERE "auth_user"."username" IN'
+                        in query['sql']]
+        self.assertEqual(len(user_queries), 1)
+        self.assertEqual(Post.objects.count(), 20)
+
+    def test_unknown_users(self):
+        """Проверка, что незнакомые пользователи пропускаются или создаются."""
+        with open(self.path('follows.csv'), 'w', encoding='utf-8') as file:
+            file.write('user,author\nreader,writer\nstranger,writer\n')
+        self.load('follows', 'follows.csv')
+        self.assertEqual(Follow.objects.count(), 1)
+
+        self.load('follows', 'follows.csv', create_users=True)
+        self.assertEqual(Follow.objects.count(), 2)
+        self.assertFalse(
+            User.objects.get(username='stranger').has_usable_password()
+        )
+
+    def test_dates_kept_without_patching_fields(self):
+        """Проверка, что запись, сохранённая во время загрузки, с датой."""
+        author = DataTransferTests.author
+
+        class SavingTable(PostTable):
+            def imported(self, objects):
+                super().imported(objects)
+                self.saved = Post.objects.create(author=author, text='Новая')
+
+        table = SavingTable()
+        import_rows(table, [{'id': '500', 'author': 'writer', 'text': 'x',
+                             'pub_date': '2019-01-02T03:04:05+00:00'}],
+                    batch_size=10)
+        self.assertEqual(Post.objects.get(pk=500).pub_date.year, 2019)
+        self.assertEqual(table.saved.pub_date.year, timezone.now().year)
+
+    def test_queries_within_sqlite_variable_limit(self):
+        """Проверка, что большая порция делится на запросы до 999 id."""
+        params = []
+
+        def record(execute, sql, query_params, many, context):
+            params.append(len(query_params or ()))
+            return execute(sql, query_params, many, context)
+
+        posts = [{'id': str(1000 + number), 'author': 'writer', 'text': 'x'}
+                 for number in range(1100)]
+        # автор без записей: ленты новых подписчиков не заполняются
+        follows = [{'user': f'follower_{number}', 'author': 'reader'}
+                   for number in range(1100)]
+        with connection.execute_wrapper(record):
+            import_rows(TABLES['posts'](), posts, batch_size=2000)
+            import_rows(TABLES['follows'](create_users=True), follows,
+                        batch_size=2000)
+        self.assertEqual(Post.objects.count(), 1100)
+        self.assertEqual(Follow.objects.count(), 1100)
+        self.assertLessEqual(max(params), 999)
@@ -1,10 +1,28 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image
 
-from posts.models import Group, Post
+from posts import thumbnails
+from posts.models import (AuthorStats, Comment, Follow, Group, Post,
+                          TimelineEntry)
 from posts.forms import PostForm
+from posts.paginators import CursorPage
 
 User = get_user_model()
 
@@ -339,3 +357,1084 @@ class PaginatorWorkRight(TestCase):
             len(obj_list),
             Post.objects.count() - settings.PAGINATOR_DEFAULT_SIZE
         )
+
+
+@override_settings(FEED_CURSOR_PAGINATION=True, PAGINATOR_DEFAULT_SIZE=5)
+class CursorPaginatorWorkRight(TestCase):
+    """Проверка листания лент курсором.
+
+    view_name           objects
+    'index'             posts
+    'group'             posts
+    'profile'           posts
+    'follow_index'      posts
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_test = User.objects.create(
+            username='very_test_user'
+        )
+        cls.user_reader = User.objects.create(
+            username='reader_user'
+        )
+        Follow.objects.create(user=cls.user_reader, author=cls.user_test)
+        cls.group_test = Group.objects.create(
+            title='Test group',
+            description='test_description',
+            slug='test-slug-s'
+        )
+        for i in range(12):
+            Post.objects.create(
+                text='test_text_%s' % i,
+                author=cls.user_test,
+                group=cls.group_test
+            )
+
+    def setUp(self):
+        self.reader = Client()
+        self.reader.force_login(CursorPaginatorWorkRight.user_reader)
+
+    def walk_feed(self, url):
+        """Пройти ленту вперёд до конца, вернуть список порций."""
+        pages = []
+        cursor = None
+        while True:
+            response = self.reader.get(
+                url, {'cursor': cursor} if cursor else None
+            )
+            page = response.context['page']
+            pages.append(page)
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_feeds_walk_all_posts_in_order(self):
+        """Проверка, что курсор выдаёт все посты по порядку без повторов."""
+        user = CursorPaginatorWorkRight.user_test
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+        for url in (reverse('index'),
+                    reverse('group', args=(self.group_test.slug,)),
+                    reverse('profile', args=(user.username,)),
+                    reverse('follow_index')):
+            with self.subTest(url=url):
+                pages = self.walk_feed(url)
+                self.assertIsInstance(pages[0], CursorPage)
+                self.assertEqual([len(page) for page in pages], [5, 5, 2])
+                self.assertEqual(
+                    [post.id for page in pages for post in page], expected
+                )
+                self.assertFalse(pages[0].has_previous())
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Проверка, что ссылка назад ведёт на предыдущую порцию."""
+        first, second, _ = self.walk_feed(reverse('index'))
+        response = self.reader.get(
+            reverse('index'), {'cursor': second.previous_cursor}
+        )
+        page = response.context['page']
+        self.assertEqual(list(page), list(first))
+        self.assertFalse(page.has_previous())
+        self.assertEqual(page.next_cursor, first.next_cursor)
+
+    def test_broken_cursor_gives_first_page(self):
+        """Проверка, что испорченный курсор даёт первую порцию."""
+        response = self.reader.get(reverse('index'), {'cursor': '%%bad'})
+        page = response.context['page']
+        self.assertEqual(len(page), 5)
+        self.assertFalse(page.has_previous())
+
+    def test_paginator_renders_cursor_links(self):
+        """Проверка, что пагинатор выводит ссылки с курсором."""
+        response = self.reader.get(reverse('index'))
+        page = response.context['page']
+        self.assertContains(response, f'?cursor={page.next_cursor}')
+        self.assertNotContains(response, '?page=')
+
+
+@override_settings(COMMENTS_PAGE_SIZE=3)
+class CommentPaginationTests(TestCase):
+    """Проверка порций комментариев на странице записи.
+
+    - страница показывает самые новые комментарии и ссылку «Показать ещё»
+    - фрагмент post_comments отдаёт следующую порцию без формы
+    - число запросов не зависит от числа комментариев
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create(username='writer')
+        cls.post = Post.objects.create(text='test_text',
+                                       author=cls.user_author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.post_url = reverse(
+            'post', args=(self.user_author.username, self.post.pk)
+        )
+        self.comments_url = reverse(
+            'post_comments', args=(self.user_author.username, self.post.pk)
+        )
+
+    def add_comments(self, count):
+        for i in range(count):
+            Comment.objects.create(
+                post=CommentPaginationTests.post,
+                author=CommentPaginationTests.user_author,
+                text='test_comment_%s' % i
+            )
+
+    def test_comments_walk_in_batches(self):
+        """Проверка, что «Показать ещё» догружает все комментарии."""
+        self.add_comments(7)
+        expected = list(
+            Comment.objects.order_by('-created', '-id')
+            .values_list('id', flat=True)
+        )
+        response = self.client.get(self.post_url)
+        page = response.context['comments']
+        self.assertContains(response, 'js-more-comments')
+        batches = [list(page)]
+        while page.has_next():
+            response = self.client.get(self.comments_url,
+                                       {'cursor': page.next_cursor})
+            self.assertNotContains(response, '<form')
+            page = response.context['comments']
+            batches.append(list(page))
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 1])
+        self.assertEqual(
+            [comment.id for batch in batches for comment in batch], expected
+        )
+        self.assertNotContains(response, 'js-more-comments')
+
+    def test_queries_do_not_grow_with_comments(self):
+        """Проверка, что запросов одинаково при 4 и 40 комментариях."""
+        counts = []
+        for total in (4, 40):
+            self.add_comments(total - Comment.objects.count())
+            page = self.client.get(self.post_url).context['comments']
+            with CaptureQueriesContext(connection) as post_queries:
+                self.client.get(self.post_url)
+            with CaptureQueriesContext(connection) as fragment_queries:
+                self.client.get(self.comments_url,
+                                {'cursor': page.next_cursor})
+            counts.append((len(post_queries), len(fragment_queries)))
+        self.assertEqual(counts[0], counts[1])
+
+
+class FeedQueryCountTests(TestCase):
+    """Проверка, что число запросов ленты не зависит от числа карточек.
+
+    Страница ленты: сессия и пользователь, подсчёт записей для
+    пагинатора, сами записи, плюс запросы объекта страницы (группа;
+    автор профиля вместе со счётчиками, признак подписки и валидаторы
+    условного GET; для ленты
+    подписок - проверка нераскладываемых авторов и записи по строкам
+    ленты).
+    """
+
+    FEED_QUERIES = (
+        ('index', 4),
+        ('group', 5),
+        ('profile', 7),
+        ('follow_index', 6),
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create(username='poster_user')
+        cls.user_reader = User.objects.create(username='reader_user')
+        Follow.objects.create(user=cls.user_reader, author=cls.user_author)
+        AuthorStats.objects.for_user(cls.user_author)
+        cls.group_test = Group.objects.create(
+            title='Test group',
+            description='test_description',
+            slug='test-slug'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader = Client()
+        self.reader.force_login(FeedQueryCountTests.user_reader)
+
+    def add_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                text='test_text_%s' % i,
+                author=FeedQueryCountTests.user_author,
+                group=FeedQueryCountTests.group_test
+            )
+            Comment.objects.create(
+                post=post, author=FeedQueryCountTests.user_reader,
+                text='test_comment_%s' % i
+            )
+
+    def url_for(self, name):
+        author = FeedQueryCountTests.user_author
+        args = {
+            'group': (FeedQueryCountTests.group_test.slug,),
+            'profile': (author.username,),
+        }.get(name)
+        return reverse(name, args=args)
+
+    def assert_feed_queries(self):
+        for name, queries in self.FEED_QUERIES:
+            cache.clear()
+            with self.subTest(url=name):
+                with self.assertNumQueries(queries):
+                    self.reader.get(self.url_for(name))
+
+    def test_feed_queries_with_one_post(self):
+        """Проверка числа запросов ленты с одной карточкой."""
+        self.add_posts(1)
+        self.assert_feed_queries()
+
+    def test_feed_queries_with_full_page(self):
+        """Проверка числа запросов ленты с полной страницей карточек."""
+        self.add_posts(settings.PAGINATOR_DEFAULT_SIZE + 2)
+        self.assert_feed_queries()
+
+    def test_feed_renders_comment_count(self):
+        """Проверка, что карточка показывает число комментариев."""
+        self.add_posts(1)
+        response = self.reader.get(reverse('index'))
+        self.assertContains(response, 'Комментариев: 1')
+
+
+class AuthorStatsCountersTests(TestCase):
+    """Проверка поддерживаемых счётчиков профиля и записи.
+
+    Счётчики меняют сигналы создания и удаления записей, комментариев
+    и подписок, а manage.py recount_stats исправляет расхождения.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create(username='poster_user')
+        cls.user_reader = User.objects.create(username='reader_user')
+
+    def setUp(self):
+        self.author = Client()
+        self.author.force_login(AuthorStatsCountersTests.user_author)
+        self.reader = Client()
+        self.reader.force_login(AuthorStatsCountersTests.user_reader)
+
+    def stats_of(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_views_keep_counters(self):
+        """Проверка, что views поддерживают счётчики."""
+        author = AuthorStatsCountersTests.user_author
+        reader = AuthorStatsCountersTests.user_reader
+
+        self.author.post(reverse('new_post'), {'text': 'test_post_text'})
+        self.assertEqual(self.stats_of(author).posts_count, 1)
+
+        post = Post.objects.get(author=author)
+        self.reader.post(
+            reverse('add_comment', args=(author.username, post.id)),
+            {'text': 'test_comment'}
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+        follow_url = reverse('profile_follow', args=(author.username,))
+        self.reader.get(follow_url)
+        self.reader.get(follow_url)
+        self.assertEqual(self.stats_of(author).followers_count, 1)
+        self.assertEqual(self.stats_of(reader).following_count, 1)
+
+        unfollow_url = reverse('profile_unfollow', args=(author.username,))
+        self.reader.get(unfollow_url)
+        self.reader.get(unfollow_url)
+        self.assertEqual(self.stats_of(author).followers_count, 0)
+        self.assertEqual(self.stats_of(reader).following_count, 0)
+
+    def test_follows_outside_views_keep_counters(self):
+        """Проверка счётчиков подписок, созданных и удалённых мимо views."""
+        author = AuthorStatsCountersTests.user_author
+        reader = AuthorStatsCountersTests.user_reader
+        self.reader.get(reverse('profile', args=(author.username,)))
+        Follow.objects.create(user=reader, author=author)
+        self.assertEqual(self.stats_of(author).followers_count, 1)
+
+        response = self.reader.get(
+            reverse('profile_unfollow', args=(author.username,))
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stats_of(author).followers_count, 0)
+        self.assertEqual(self.stats_of(reader).following_count, 0)
+
+        # каскад: подписка удаляется вместе с подписчиком
+        follower = User.objects.create(username='test_user_follower')
+        Follow.objects.create(user=follower, author=author)
+        self.assertEqual(self.stats_of(author).followers_count, 1)
+        follower.delete()
+        self.assertEqual(self.stats_of(author).followers_count, 0)
+
+        # расхождение снизу: счётчик не уходит в минус
+        Follow.objects.create(user=reader, author=author)
+        AuthorStats.objects.filter(user=author).update(followers_count=0)
+        Follow.objects.filter(user=reader).delete()
+        self.assertEqual(self.stats_of(author).followers_count, 0)
+
+    def test_orm_posts_and_comments_counted(self):
+        """Проверка, что записи и комментарии мимо views учитываются."""
+        author = AuthorStatsCountersTests.user_author
+        self.reader.get(reverse('profile', args=(author.username,)))
+        post = Post.objects.create(author=author, text='test_post_text')
+        self.assertEqual(self.stats_of(author).posts_count, 1)
+        for number in range(3):
+            Comment.objects.create(post=post, author=author,
+                                   text=f'test_comment_{number}')
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 3)
+
+        post.delete()
+        self.assertEqual(self.stats_of(author).posts_count, 0)
+        self.assertFalse(Post.objects.filter(author=author).exists())
+
+    def test_deletes_decrement_counters(self):
+        """Проверка, что удаление комментария и записи уменьшает счётчики."""
+        author = AuthorStatsCountersTests.user_author
+        commenter = User.objects.create(username='test_user_commenter')
+        commenter_client = Client()
+        commenter_client.force_login(commenter)
+        self.author.post(reverse('new_post'), {'text': 'test_post_text'})
+        post = Post.objects.get(author=author)
+        url = reverse('add_comment', args=(author.username, post.id))
+        self.reader.post(url, {'text': 'reader_comment'})
+        commenter_client.post(url, {'text': 'commenter_comment'})
+
+        Comment.objects.get(text='reader_comment').delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+        # каскад: комментарий удаляется вместе с его автором
+        commenter.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+        post.delete()
+        self.assertEqual(self.stats_of(author).posts_count, 0)
+
+    def test_profile_shows_counters(self):
+        """Проверка, что профиль выводит счётчики автора."""
+        author = AuthorStatsCountersTests.user_author
+        Post.objects.create(author=author, text='test_post_text')
+        Follow.objects.create(
+            user=AuthorStatsCountersTests.user_reader, author=author
+        )
+        response = self.reader.get(
+            reverse('profile', args=(author.username,))
+        )
+        self.assertEqual(response.context['stats'].posts_count, 1)
+        self.assertEqual(response.context['stats'].followers_count, 1)
+        self.assertContains(response, 'Подписчиков: 1')
+
+    def test_recount_stats_repairs_drift(self):
+        """Проверка, что recount_stats исправляет расхождения."""
+        author = AuthorStatsCountersTests.user_author
+        post = Post.objects.create(author=author, text='test_post_text')
+        Comment.objects.create(
+            post=post, author=author, text='test_comment'
+        )
+        AuthorStats.objects.filter(user=author).update(posts_count=5)
+        Post.objects.filter(pk=post.pk).update(comment_count=0)
+
+        call_command('recount_stats', stdout=open(os.devnull, 'w'))
+
+        stats = self.stats_of(author)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 0)
+        self.assertTrue(
+            AuthorStats.objects.filter(
+                user=AuthorStatsCountersTests.user_reader
+            ).exists()
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+
+class FollowTimelineTests(TestCase):
+    """Проверка материализованной ленты подписок.
+
+    - новая запись раскладывается в ленты подписчиков
+    - подписка добавляет в ленту прежние записи автора
+    - отписка убирает записи автора из ленты
+    - записи авторов с большим числом подписчиков добираются при чтении
+    - отписка до порога не раскладывает записи, это делает push_authors
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create(username='poster_user')
+        cls.user_reader = User.objects.create(username='reader_user')
+
+    def setUp(self):
+        self.reader = Client()
+        self.reader.force_login(FollowTimelineTests.user_reader)
+
+    def follow_page_posts(self):
+        response = self.reader.get(reverse('follow_index'))
+        return list(response.context['page'])
+
+    def toggle_follow(self, view_name):
+        self.reader.get(
+            reverse(view_name, args=(self.user_author.username,))
+        )
+
+    def test_timeline_follows_posts_and_subscriptions(self):
+        """Проверка раскладки, добавления и удаления записей ленты."""
+        reader = FollowTimelineTests.user_reader
+        old_post = Post.objects.create(
+            author=self.user_author, text='test_old_post'
+        )
+        self.toggle_follow('profile_follow')
+        self.assertEqual(self.follow_page_posts(), [old_post])
+
+        new_post = Post.objects.create(
+            author=self.user_author, text='test_new_post'
+        )
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=reader, post=new_post).exists()
+        )
+        self.assertEqual(self.follow_page_posts(), [new_post, old_post])
+
+        self.toggle_follow('profile_unfollow')
+        self.assertFalse(TimelineEntry.objects.filter(user=reader).exists())
+        self.assertEqual(self.follow_page_posts(), [])
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=0)
+    def test_pull_author_posts_read_on_request(self):
+        """Проверка, что записи автора-"звезды" не раскладываются."""
+        self.toggle_follow('profile_follow')
+        post = Post.objects.create(
+            author=self.user_author, text='test_post_text'
+        )
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_page_posts(), [post])
+
+        self.toggle_follow('profile_unfollow')
+        self.assertEqual(self.follow_page_posts(), [])
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=1,
+                       TIMELINE_PUSH_MAX_FOLLOWERS=0)
+    def test_push_back_after_unfollow(self):
+        """Проверка, что раскладку после отписок возвращает push_authors."""
+        other = Client()
+        other.force_login(User.objects.create(username='other_reader'))
+        other.get(reverse('profile_follow', args=('poster_user',)))
+        self.toggle_follow('profile_follow')
+        post = Post.objects.create(
+            author=self.user_author, text='test_post_text'
+        )
+        other.get(reverse('profile_unfollow', args=('poster_user',)))
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_page_posts(), [post])
+
+        # подписчиков больше TIMELINE_PUSH_MAX_FOLLOWERS - рано
+        call_command('push_authors', stdout=io.StringIO())
+        self.assertFalse(TimelineEntry.objects.exists())
+        with override_settings(TIMELINE_PUSH_MAX_FOLLOWERS=1):
+            call_command('push_authors', stdout=io.StringIO())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=FollowTimelineTests.user_reader, post=post
+        ).exists())
+        self.assertFalse(AuthorStats.objects.get(
+            user=self.user_author
+        ).pull_feed)
+        self.assertEqual(self.follow_page_posts(), [post])
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN')
+class FeedQueryPlanTests(TestCase):
+    """Проверка, что запросы лент идут по индексам.
+
+    Каждый SELECT, выполненный при выводе ленты, разбирается через
+    EXPLAIN QUERY PLAN: таблица не должна читаться целиком (SCAN без
+    индекса), а сортировка не должна идти через временное B-дерево.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create(username='poster_user')
+        cls.user_reader = User.objects.create(username='reader_user')
+        cls.group_test = Group.objects.create(
+            title='Test group',
+            description='test_description',
+            slug='test-slug'
+        )
+        reader = Client()
+        reader.force_login(cls.user_reader)
+        reader.get(reverse('profile_follow', args=(cls.user_author,)))
+        for i in range(settings.PAGINATOR_DEFAULT_SIZE + 2):
+            Post.objects.create(
+                text='test_text_%s' % i,
+                author=cls.user_author,
+                group=cls.group_test
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.reader = Client()
+        self.reader.force_login(FeedQueryPlanTests.user_reader)
+
+    def feed_urls(self):
+        return (
+            reverse('index'),
+            reverse('group', args=(FeedQueryPlanTests.group_test.slug,)),
+            reverse('profile', args=(FeedQueryPlanTests.user_author,)),
+            reverse('follow_index'),
+        )
+
+    def assert_plans_use_indexes(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            self.reader.get(url, params)
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT'):
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+                for step in plan:
+                    with self.subTest(url=url, sql=sql, step=step):
+                        self.assertNotIn('TEMP B-TREE', step)
+                        if step.startswith('SCAN'):
+                            self.assertIn('USING', step)
+
+    def test_page_feeds_use_indexes(self):
+        """Проверка планов запросов лент с номером страницы."""
+        for url in self.feed_urls():
+            self.assert_plans_use_indexes(url, {'page': 2})
+
+    @override_settings(FEED_CURSOR_PAGINATION=True)
+    def test_cursor_feeds_use_indexes(self):
+        """Проверка планов запросов лент с курсором."""
+        for url in self.feed_urls():
+            response = self.reader.get(url)
+            self.assert_plans_use_indexes(
+                url, {'cursor': response.context['page'].next_cursor}
+            )
+
+
+class PostCardCacheTests(TestCase):
+    """Проверка кеша карточек записей в лентах.
+
+    Карточка берётся из кеша, пока запись, её комментарии и подборка
+    не менялись, и сбрасывается сигналами при их изменении.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create(username='poster_user')
+        cls.group_test = Group.objects.create(
+            title='test_group_title',
+            description='test_description',
+            slug='test-slug'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=PostCardCacheTests.user_author,
+            text='test_post_text',
+            group=PostCardCacheTests.group_test
+        )
+        self.author = Client()
+        self.author.force_login(PostCardCacheTests.user_author)
+
+    def index_content(self, client=None):
+        return (client or self.client).get(reverse('index')).content.decode()
+
+    def test_card_served_from_cache(self):
+        """Проверка, что карточка берётся из кеша."""
+        self.index_content()
+        Post.objects.filter(pk=self.post.pk).update(text='changed_text')
+        self.assertIn('test_post_text', self.index_content())
+
+    def test_card_dropped_on_post_and_comment_change(self):
+        """Проверка, что карточка сбрасывается при изменении записи."""
+        self.index_content()
+        self.post.text = 'changed_text'
+        self.post.save()
+        self.assertIn('changed_text', self.index_content())
+
+        Comment.objects.create(
+            post=self.post, author=PostCardCacheTests.user_author,
+            text='test_comment'
+        )
+        self.assertIn('Комментариев: 1', self.index_content())
+
+    def test_card_dropped_on_recount(self):
+        """Проверка, что recount_stats сбрасывает исправленные карточки."""
+        Comment.objects.bulk_create([Comment(
+            post=self.post, author=PostCardCacheTests.user_author,
+            text='test_comment'
+        )])
+        self.assertNotIn('Комментариев', self.index_content(self.author))
+        call_command('recount_stats', stdout=io.StringIO())
+        self.assertIn('Комментариев: 1', self.index_content(self.author))
+
+    def test_card_dropped_on_group_change(self):
+        """Проверка, что карточка сбрасывается при изменении подборки."""
+        self.index_content()
+        group = PostCardCacheTests.group_test
+        group.title = 'changed_group_title'
+        group.save()
+        self.assertIn('changed_group_title', self.index_content())
+
+    def test_author_card_cached_separately(self):
+        """Проверка, что кнопку редактирования видит только автор."""
+        edit_url = reverse(
+            'post_edit', args=(self.user_author.username, self.post.pk)
+        )
+        self.assertIn(edit_url, self.index_content(self.author))
+        self.assertNotIn(edit_url, self.index_content())
+
+
+class AnonymousPageCacheTests(TestCase):
+    """Проверка кеша страниц index и group для анонимов.
+
+    - повторный запрос анонима отдаётся из кеша
+    - изменение записи начинает новое поколение страниц
+    - авторизованный пользователь кешем не пользуется
+    - ETag и Last-Modified дают 304 на условный GET
+    - с DummyCache страницы отдаются без кеша
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create(username='poster_user')
+        cls.group_test = Group.objects.create(
+            title='test_group_title',
+            description='test_description',
+            slug='test-slug'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=AnonymousPageCacheTests.user_author,
+            text='test_post_text',
+            group=AnonymousPageCacheTests.group_test
+        )
+        self.urls = (
+            reverse('index'),
+            reverse('group', args=(self.group_test.slug,)),
+        )
+
+    def test_anonymous_page_served_from_cache(self):
+        """Проверка, что страница анонима берётся из кеша."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.client.get(url)
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertContains(response, 'test_post_text')
+
+    def test_post_change_starts_new_generation(self):
+        """Проверка, что после изменения записи страница обновляется."""
+        for url in self.urls:
+            self.client.get(url)
+        self.post.text = 'changed_text'
+        self.post.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'changed_text')
+
+    def test_authorized_user_bypasses_cache(self):
+        """Проверка, что авторизованному страница рендерится заново."""
+        author = Client()
+        author.force_login(AnonymousPageCacheTests.user_author)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.client.get(url)
+                response = author.get(url)
+                self.assertIsNotNone(response.context)
+                self.assertNotIn('ETag', response)
+
+    def test_conditional_get_returns_not_modified(self):
+        """Проверка, что условный GET получает 304."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    ).status_code,
+                    304
+                )
+                self.assertEqual(
+                    self.client.get(
+                        url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                    ).status_code,
+                    304
+                )
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+    }})
+    def test_dummy_cache(self):
+        """Проверка, что без хранящего кеша страницы просто рендерятся."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'test_post_text')
+
+
+class ConditionalGetTests(TestCase):
+    """Проверка условного GET для страниц записи и профиля.
+
+    - совпавший If-None-Match или If-Modified-Since даёт 304 без рендера
+    - комментарий, подписка и правка подборки меняют ETag
+    - авторизованный пользователь не получает Last-Modified
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create(username='poster_user')
+        cls.user_reader = User.objects.create(username='reader_user')
+        AuthorStats.objects.for_user(cls.user_author)
+
+    def setUp(self):
+        self.post = Post.objects.create(
+            author=ConditionalGetTests.user_author, text='test_post_text'
+        )
+        self.reader = Client()
+        self.reader.force_login(ConditionalGetTests.user_reader)
+        self.post_url = reverse(
+            'post', args=(self.user_author.username, self.post.id)
+        )
+        self.profile_url = reverse(
+            'profile', args=(self.user_author.username,)
+        )
+
+    def test_not_modified_without_render(self):
+        """Проверка, что совпавшие валидаторы дают 304 без шаблона."""
+        for url in (self.post_url, self.profile_url):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                for header, value in (
+                        ('HTTP_IF_NONE_MATCH', response['ETag']),
+                        ('HTTP_IF_MODIFIED_SINCE',
+                         response['Last-Modified'])):
+                    not_modified = self.client.get(url, **{header: value})
+                    self.assertEqual(not_modified.status_code, 304)
+                    self.assertIsNone(not_modified.context)
+
+    def test_changes_give_new_etag(self):
+        """Проверка, что комментарий и подписка меняют ETag."""
+        post_etag = self.reader.get(self.post_url)['ETag']
+        profile_etag = self.reader.get(self.profile_url)['ETag']
+
+        self.reader.post(
+            reverse('add_comment',
+                    args=(self.user_author.username, self.post.id)),
+            {'text': 'test_comment'}
+        )
+        response = self.reader.get(
+            self.post_url, HTTP_IF_NONE_MATCH=post_etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'test_comment')
+
+        self.reader.get(
+            reverse('profile_follow', args=(self.user_author.username,))
+        )
+        response = self.reader.get(
+            self.profile_url, HTTP_IF_NONE_MATCH=profile_etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['following'])
+
+    def test_group_rename_gives_new_etag(self):
+        """Проверка, что новое название подборки меняет ETag страниц."""
+        group = Group.objects.create(title='test_group_title',
+                                     slug='test-slug')
+        self.post.group = group
+        self.post.save()
+        etags = {url: self.client.get(url)['ETag']
+                 for url in (self.post_url, self.profile_url)}
+
+        group.title = 'changed_group_title'
+        group.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'changed_group_title')
+
+    def test_authorized_user_gets_own_etag(self):
+        """Проверка, что у авторизованного свой ETag и нет Last-Modified."""
+        anonymous = self.client.get(self.post_url)
+        response = self.reader.get(self.post_url)
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+        self.assertNotIn('Last-Modified', response)
+
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x01\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TransactionTestCase):
+    """Проверка заранее построенных миниатюр.
+
+    Миниатюра строится после коммита записи с картинкой, до этого
+    карточка показывает заглушку; warm_thumbnails строит недостающие.
+    Испорченное изображение не мешает сохранить запись.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user_author = User.objects.create(username='poster_user')
+        self.author = Client()
+        self.author.force_login(self.user_author)
+
+    def upload(self, name='small.gif'):
+        return SimpleUploadedFile(name, SMALL_GIF, content_type='image/gif')
+
+    def test_thumbnail_built_on_new_post(self):
+        """Проверка, что new_post строит миниатюру и лента её выводит."""
+        self.author.post(
+            reverse('new_post'),
+            {'text': 'test_post_text', 'image': self.upload()}
+        )
+        post = Post.objects.get(text='test_post_text')
+        self.assertTrue(post.thumbnail)
+        self.assertTrue(default_storage.exists(post.thumbnail))
+        self.assertContains(self.client.get(reverse('index')),
+                            post.thumbnail_url)
+
+    def test_responsive_variants(self):
+        """Проверка вариантов изображения и разметки <picture>.
+
+        Для маленькой картинки - ширины до основной, форматы - какие
+        умеет Pillow, JPEG всегда последний.
+        """
+        self.author.post(
+            reverse('new_post'),
+            {'text': 'test_post_text', 'image': self.upload()}
+        )
+        post = Post.objects.get(text='test_post_text')
+        variants = json.loads(post.image_variants)
+        types = [mime for mime, _ in variants['sources']]
+        self.assertEqual(
+            types, [spec[1] for spec in thumbnails.available_formats()]
+        )
+        self.assertIn('image/webp', types)
+        self.assertEqual(types[-1], 'image/jpeg')
+        for _, files in variants['sources']:
+            self.assertEqual([width for _, width in files], [480, 960])
+            for name, _ in files:
+                self.assertTrue(default_storage.exists(name))
+
+        response = self.client.get(reverse('index'))
+        for source in post.picture_sources:
+            self.assertContains(
+                response, f'<source type="{source["type"]}" '
+                          f'srcset="{source["srcset"]}"'
+            )
+        self.assertIn(' 960w', post.picture_sources[0]['srcset'])
+
+    def test_thumbnail_rebuilt_on_image_change(self):
+        """Проверка, что новая картинка в post_edit - новая миниатюра."""
+        post = Post.objects.create(
+            author=self.user_author, text='test_post_text',
+            image=self.upload(), thumbnail='old_thumbnail.jpg'
+        )
+        self.author.post(
+            reverse('post_edit', args=('poster_user', post.pk)),
+            {'text': 'test_post_text', 'image': self.upload('other.gif')}
+        )
+        post.refresh_from_db()
+        self.assertNotIn(post.thumbnail, ('', 'old_thumbnail.jpg'))
+
+    def test_placeholder_until_warmed(self):
+        """Проверка заглушки и команды warm_thumbnails."""
+        post = Post.objects.create(
+            author=self.user_author, text='test_post_text',
+            image=self.upload()
+        )
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'card-img bg-light')
+        self.assertNotContains(response, '<img class="card-img"')
+
+        call_command('warm_thumbnails', jobs=1, stdout=io.StringIO())
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail)
+        self.assertContains(self.client.get(reverse('index')),
+                            post.thumbnail_url)
+
+    def test_broken_image_keeps_post(self):
+        """Проверка, что запись с необрабатываемым JPEG сохраняется.
+
+        Обрезанный JPEG проходит проверку ImageField, но не
+        декодируется при построении миниатюры.
+        """
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 40), (200, 30, 30)).save(buffer, 'JPEG')
+        image = SimpleUploadedFile('cut.jpg', buffer.getvalue()[:-40],
+                                   content_type='image/jpeg')
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            response = self.author.post(
+                reverse('new_post'),
+                {'text': 'test_post_text', 'image': image}
+            )
+        self.assertRedirects(response, reverse('index'))
+        post = Post.objects.get(text='test_post_text')
+        self.assertEqual(post.thumbnail, '')
+        self.assertContains(self.client.get(reverse('index')),
+                            'card-img bg-light')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'индекс FTS5 - в SQLite')
+class PostSearchTests(TestCase):
+    """Проверка поиска /search/ по полнотекстовому индексу.
+
+    Индекс обновляется сигналами, результаты ранжируются,
+    фильтруются по подборке и автору и листаются курсором.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create(username='poster_user')
+        cls.user_other = User.objects.create(username='other_user')
+        cls.group_test = Group.objects.create(
+            title='test_group_title',
+            description='test_description',
+            slug='test-slug'
+        )
+
+    def search(self, **params):
+        return self.client.get(reverse('search'), params)
+
+    def found(self, **params):
+        return [post.text for post in self.search(**params).context['page']]
+
+    def create_post(self, text, **fields):
+        fields.setdefault('author', PostSearchTests.user_author)
+        return Post.objects.create(text=text, **fields)
+
+    def test_ranked_and_prefix_search(self):
+        """Проверка ранжирования и поиска по началу слова."""
+        self.create_post('котик спит на диване, а рядом лежат книги')
+        self.create_post('котик котик котик')
+        self.create_post('собака')
+        self.assertEqual(
+            self.found(q='котик'),
+            ['котик котик котик', 'котик спит на диване, а рядом лежат книги']
+        )
+        self.assertEqual(self.found(q='соба'), ['собака'])
+        self.assertEqual(
+            self.found(q='котик', sort='new'),
+            ['котик котик котик', 'котик спит на диване, а рядом лежат книги']
+        )
+        self.assertEqual(self.found(q='котик" OR собака'), [])
+
+    def test_query_without_words(self):
+        """Проверка, что запрос из одних знаков даёт пустой результат."""
+        self.create_post('котик')
+        for query in ('"', '*', '" * :'):
+            for sort in ('', 'new'):
+                with self.subTest(q=query, sort=sort):
+                    self.assertEqual(self.found(q=query, sort=sort), [])
+
+    def test_newest_order_comes_from_index(self):
+        """Проверка, что "сначала новые" сортирует сам индекс FTS5."""
+        for number in range(3):
+            self.create_post(f'котик номер {number}')
+        with CaptureQueriesContext(connection) as queries:
+            self.search(q='котик', sort='new')
+        searches = [query['sql'] for query in queries.captured_queries
+                    if 'MATCH' in query['sql']]
+        self.assertEqual(len(searches), 1)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {searches[0]}')
+            plan = [row[-1] for row in cursor.fetchall()]
+        self.assertFalse([step for step in plan if 'TEMP B-TREE' in step])
+
+    def test_index_follows_post_changes(self):
+        """Проверка, что правка и удаление записи меняют индекс."""
+        post = self.create_post('старый текст')
+        post.text = 'новый текст'
+        post.save()
+        self.assertEqual(self.found(q='старый'), [])
+        self.assertEqual(self.found(q='новый'), ['новый текст'])
+        post.delete()
+        self.assertEqual(self.found(q='новый'), [])
+
+    def test_group_and_author_filters(self):
+        """Проверка фильтров по подборке и автору."""
+        self.create_post('котик в подборке', group=PostSearchTests.group_test)
+        self.create_post('котик другого автора',
+                         author=PostSearchTests.user_other)
+        self.assertEqual(
+            self.found(q='котик', group='test-slug'), ['котик в подборке']
+        )
+        self.assertEqual(
+            self.found(q='котик', author='other_user'),
+            ['котик другого автора']
+        )
+        response = self.search(q='котик', author='nobody')
+        self.assertIsNone(response.context['page'])
+        self.assertFormError(response, 'form', 'author', 'Такого автора нет.')
+
+    def test_cursor_pagination_keeps_query(self):
+        """Проверка, что ссылка на следующую порцию сохраняет запрос."""
+        for number in range(settings.PAGINATOR_DEFAULT_SIZE + 2):
+            self.create_post(f'котик номер {number}')
+        page = self.search(q='котик').context['page']
+        self.assertEqual(len(page), settings.PAGINATOR_DEFAULT_SIZE)
+        self.assertContains(
+            self.search(q='котик'),
+            f'?q=%D0%BA%D0%BE%D1%82%D0%B8%D0%BA&amp;cursor={page.next_cursor}'
+        )
+        rest = self.search(q='котик', cursor=page.next_cursor).context['page']
+        self.assertEqual(len(rest), 2)
+        self.assertFalse(
+            {post.pk for post in page} & {post.pk for post in rest}
+        )
+
+        page = self.search(q='котик', sort='new').context['page']
+        rest = self.search(
+            q='котик', sort='new', cursor=page.next_cursor
+        ).context['page']
+        self.assertEqual(
+            [post.text for post in [*page, *rest]],
+            [f'котик номер {number}'
+             for number in reversed(range(len(page) + len(rest)))]
+        )
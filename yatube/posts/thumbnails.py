@@ -0,0 +1,170 @@
+"""Миниатюры изображений записей, построенные заранее.
+
+Тег {% thumbnail %} строил миниатюру при первом показе, прямо в потоке
+запроса: свежая запись с картинкой или холодный кеш задерживали
+страницу ленты. Поэтому миниатюры строятся после сохранения записи
+(new_post, post_edit) или в фоновом пуле потоков, а до тех пор
+карточка показывает заглушку.
+
+Для каждого изображения строится набор вариантов: кадр 960x339 по
+центру в нескольких ширинах (WIDTHS) и форматах (AVIF, если его умеет
+установленный Pillow, WebP и JPEG). Имена файлов и ширины хранятся
+JSON-ом в Post.image_variants, JPEG основной ширины - в Post.thumbnail,
+так что шаблону для srcset/<picture> не нужно обращаться к хранилищу.
+
+Для уже загруженных изображений - команда warm_thumbnails.
+"""
+import hashlib
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import bump_feed_generation, invalidate_post_cards
+from .models import Post
+
+# кадр, который раньше вырезал {% thumbnail "960x339" crop="center" %}
+BASE_WIDTH, BASE_HEIGHT = 960, 339
+WIDTHS = (480, 960, 1440)
+
+# (формат Pillow, MIME-тип, расширение, параметры сохранения);
+# от лучшего сжатия к худшему - браузер берёт первый знакомый <source>
+FORMATS = (
+    ('AVIF', 'image/avif', 'avif', {'quality': 50}),
+    ('WEBP', 'image/webp', 'webp', {'quality': 75, 'method': 4}),
+    ('JPEG', 'image/jpeg', 'jpg',
+     {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def available_formats():
+    """Форматы из FORMATS, которые умеет записывать установленный Pillow.
+
+    AVIF есть только в новых версиях Pillow или с pillow-avif-plugin.
+    """
+    Image.init()
+    return [spec for spec in FORMATS if spec[0] in Image.SAVE]
+
+
+def _variant_name(image_name, width, extension):
+    digest = hashlib.sha1(image_name.encode()).hexdigest()
+    return f'variants/{digest[:2]}/{digest}/{width}.{extension}'
+
+
+def _save_variant(frame, name, image_format, options):
+    buffer = io.BytesIO()
+    frame.save(buffer, image_format, **options)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def generate(image_name):
+    """Построить варианты изображения image_name.
+
+    Возвращает (имя JPEG основной ширины, JSON для Post.image_variants).
+    Ширины больше исходной не строятся, кроме основной: её, как и
+    прежде, увеличиваем.
+    """
+    with default_storage.open(image_name) as file:
+        image = Image.open(file)
+        # JPEG декодируется сразу в масштабе, достаточном для WIDTHS[-1]
+        image.draft(
+            'RGB', (WIDTHS[-1], WIDTHS[-1] * BASE_HEIGHT // BASE_WIDTH)
+        )
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    widths = [width for width in WIDTHS
+              if width <= max(image.width, BASE_WIDTH)]
+
+    sources, thumbnail = [], None
+    for image_format, mime, extension, options in available_formats():
+        files = []
+        for width in widths:
+            height = round(width * BASE_HEIGHT / BASE_WIDTH)
+            frame = ImageOps.fit(image, (width, height), Image.LANCZOS)
+            name = _save_variant(
+                frame, _variant_name(image_name, width, extension),
+                image_format, options
+            )
+            files.append((name, width))
+            if image_format == 'JPEG' and width == BASE_WIDTH:
+                thumbnail = name
+        sources.append((mime, files))
+    variants = {'width': BASE_WIDTH, 'height': BASE_HEIGHT,
+                'sources': sources}
+    return thumbnail, json.dumps(variants)
+
+
+def store(post_id, image_name, thumbnail, variants):
+    """Записать миниатюры в запись, если изображение не сменилось.
+
+    Пока миниатюры строились, автор мог заменить картинку - тогда
+    миниатюры новой картинки запишет её собственная задача.
+    """
+    return Post.objects.filter(pk=post_id, image=image_name).update(
+        thumbnail=thumbnail, image_variants=variants,
+        updated_at=timezone.now()
+    )
+
+
+def build(post_id, image_name):
+    if store(post_id, image_name, *generate(image_name)):
+        invalidate_post_cards((post_id,))
+        bump_feed_generation()
+
+
+def build_or_log(post_id, image_name):
+    """build(), но ошибка только пишется в журнал.
+
+    Запись к этому времени уже сохранена, её карточка остаётся с
+    заглушкой до warm_thumbnails.
+    """
+    try:
+        build(post_id, image_name)
+    except Exception:
+        logger.exception('Миниатюра для записи %s не построена', post_id)
+
+
+def _build_in_background(post_id, image_name):
+    try:
+        build_or_log(post_id, image_name)
+    finally:
+        # у каждого потока пула своё соединение с базой
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails'
+        )
+    return _executor
+
+
+def schedule(post):
+    """Построить миниатюры изображения записи post после коммита.
+
+    При settings.THUMBNAIL_WORKERS = 0 - в текущем потоке, но тоже после
+    коммита: испорченное изображение не должно откатывать саму запись.
+    """
+    if not post.image:
+        return
+    args = (post.pk, post.image.name)
+    if not settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: build_or_log(*args))
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_build_in_background, *args)
+    )
@@ -0,0 +1,300 @@
+"""Потоковый импорт и экспорт подборок, записей, комментариев и подписок.
+
+Данные - JSONL (объект на строку) или CSV с заголовком, по таблице на
+файл; пользователи и подборки указываются именем и slug, записи - id,
+чтобы комментарии из того же выгруза ссылались на них. Файл читается и
+пишется построчно, в памяти - одна порция строк (batch_size) и словари
+имя -> id уже встреченных пользователей и подборок.
+
+Порция - одна транзакция; вставляется она частями по SQL_CHUNK строк
+через bulk_create(ignore_conflicts=True): строки, которые уже есть (тот
+же id или уникальный ключ), пропускаются, так что прерванный импорт
+можно запустить заново. Даты создания из файла bulk_create заменил бы
+текущими (auto_now_add), их возвращает отдельный UPDATE, см.
+file_dates. bulk_create не шлёт сигналов,
+поэтому ленты подписок, поисковый индекс и кеш карточек записей с
+новыми комментариями обновляются здесь же, по порциям, а счётчики
+пересчитывает recount_stats после импорта.
+"""
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from . import search, timeline
+from .cache import invalidate_post_cards
+from .models import Comment, Follow, Group, Post, User
+
+FORMATS = ('jsonl', 'csv')
+
+# строк на запрос: в SQLite до 3.32 не больше 999 параметров запроса
+SQL_CHUNK = 500
+
+
+def read_rows(file, data_format):
+    """Словари строк файла, без чтения его целиком."""
+    if data_format == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def chunks(items, size=SQL_CHUNK):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _plain(value):
+    # isoformat без потери микросекунд, в отличие от DjangoJSONEncoder
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def write_rows(file, data_format, columns, rows):
+    """Записать rows - кортежи значений columns, вернуть их число."""
+    count = 0
+    if data_format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        values = [_plain(value) for value in row]
+        if data_format == 'csv':
+            writer.writerow(values)
+        else:
+            file.write(json.dumps(dict(zip(columns, values)),
+                                  ensure_ascii=False) + '\n')
+    return count
+
+
+class KeyMap:
+    """Ключ (имя пользователя, slug подборки) -> id, с подгрузкой.
+
+    Недостающие ключи порции строк подгружаются одним запросом, так что
+    на порцию приходится не больше одного запроса, а не по запросу на
+    строку. Если задан create, отсутствующие в базе объекты создаются.
+    """
+
+    def __init__(self, model, field, create=None):
+        self.model = model
+        self.field = field
+        self.create = create
+        self.ids = {}
+
+    def load(self, keys):
+        missing = {key for key in keys if key} - self.ids.keys()
+        if not missing:
+            return
+        self.fetch(missing)
+        missing -= self.ids.keys()
+        if missing and self.create is not None:
+            self.model.objects.bulk_create(
+                [self.create(key) for key in missing], ignore_conflicts=True
+            )
+            self.fetch(missing)
+
+    def fetch(self, keys):
+        for chunk in chunks(keys):
+            self.ids.update(self.model.objects.filter(
+                **{f'{self.field}__in': chunk}
+            ).values_list(self.field, 'pk'))
+
+    def get(self, key):
+        return self.ids.get(key)
+
+
+def _new_user(username):
+    return User(username=username, password=make_password(None))
+
+
+def file_dates(model, objects):
+    """Даты создания из файла у объектов, которых ещё нет в базе.
+
+    Возвращает (поля, [(объект, значения)]) для restore_dates. Поля
+    auto_now_add не отключаются: они общие для всех потоков процесса,
+    и запись, сохранённая параллельно с импортом, осталась бы без даты.
+    Уже существующие строки не трогаем; объекты без id тоже - после
+    bulk_create он неизвестен, такие строки получают время загрузки.
+    """
+    fields = [field.attname for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now_add', False)]
+    objects = [obj for obj in objects if obj.pk is not None]
+    if not fields or not objects:
+        return fields, []
+    existing = set(model.objects.filter(
+        pk__in=[obj.pk for obj in objects]
+    ).values_list('pk', flat=True))
+    return fields, [
+        (obj, [getattr(obj, field) for field in fields])
+        for obj in objects if obj.pk not in existing
+    ]
+
+
+def restore_dates(model, fields, saved):
+    """Вернуть вставленным строкам даты, запомненные file_dates."""
+    for obj, values in saved:
+        for field, value in zip(fields, values):
+            setattr(obj, field, value)
+    if saved:
+        model.objects.bulk_update([obj for obj, _ in saved], fields)
+
+
+class Table:
+    """Описание таблицы для обмена: колонки файла и их сборка в объекты.
+
+    exported - поля values_list в порядке columns, build() - объект по
+    строке файла или None, если строка ссылается на то, чего нет.
+    """
+    model = None
+    columns = ()
+    exported = ()
+
+    def __init__(self, create_users=False):
+        self.users = KeyMap(
+            User, 'username', create=_new_user if create_users else None
+        )
+
+    def export(self, batch_size):
+        return self.model.objects.order_by('pk').values_list(
+            *self.exported
+        ).iterator(chunk_size=batch_size)
+
+    def prepare(self, rows):
+        """Подгрузить всё, на что ссылаются строки порции."""
+
+    def build(self, row):
+        raise NotImplementedError
+
+    def imported(self, objects):
+        """Порция вставлена: обновить то, что обычно делают сигналы."""
+
+
+class GroupTable(Table):
+    model = Group
+    columns = exported = ('title', 'slug', 'description')
+
+    def build(self, row):
+        return Group(title=row['title'], slug=row['slug'],
+                     description=row.get('description') or '')
+
+
+class PostTable(Table):
+    model = Post
+    columns = ('id', 'author', 'group', 'text', 'pub_date', 'image')
+    exported = ('id', 'author__username', 'group__slug', 'text',
+                'pub_date', 'image')
+
+    def __init__(self, create_users=False):
+        super().__init__(create_users)
+        self.groups = KeyMap(Group, 'slug')
+
+    def prepare(self, rows):
+        self.users.load(row['author'] for row in rows)
+        self.groups.load(row.get('group') for row in rows)
+
+    def build(self, row):
+        author_id = self.users.get(row['author'])
+        group_id = self.groups.get(row.get('group'))
+        if author_id is None or row.get('group') and group_id is None:
+            return None
+        return Post(
+            id=int(row['id']), author_id=author_id, group_id=group_id,
+            text=row['text'], pub_date=row.get('pub_date') or timezone.now(),
+            image=row.get('image') or ''
+        )
+
+    def imported(self, objects):
+        post_ids = [post.id for post in objects]
+        search.index_posts(post_ids)
+        timeline.fan_out_many(post_ids)
+
+
+class CommentTable(Table):
+    model = Comment
+    columns = ('id', 'post', 'author', 'text', 'created')
+    exported = ('id', 'post_id', 'author__username', 'text', 'created')
+
+    def prepare(self, rows):
+        self.users.load(row['author'] for row in rows)
+        # записей может быть миллионы - проверяем только id этой порции
+        self.posts = set(Post.objects.filter(
+            pk__in={int(row['post']) for row in rows}
+        ).values_list('pk', flat=True))
+
+    def build(self, row):
+        author_id = self.users.get(row['author'])
+        if author_id is None or int(row['post']) not in self.posts:
+            return None
+        return Comment(
+            id=int(row['id']) if row.get('id') else None,
+            post_id=int(row['post']), author_id=author_id, text=row['text'],
+            created=row.get('created') or timezone.now()
+        )
+
+    def imported(self, objects):
+        invalidate_post_cards({comment.post_id for comment in objects})
+
+
+class FollowTable(Table):
+    model = Follow
+    columns = ('user', 'author')
+    exported = ('user__username', 'author__username')
+
+    def prepare(self, rows):
+        self.users.load(row[column] for row in rows for column in self.columns)
+
+    def build(self, row):
+        user_id = self.users.get(row['user'])
+        author_id = self.users.get(row['author'])
+        if user_id is None or author_id is None or user_id == author_id:
+            return None
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def imported(self, objects):
+        timeline.followed_many(
+            (follow.user_id, follow.author_id) for follow in objects
+        )
+
+
+TABLES = {
+    'groups': GroupTable,
+    'posts': PostTable,
+    'comments': CommentTable,
+    'follows': FollowTable,
+}
+
+
+def import_rows(table, rows, batch_size):
+    """Вставить строки rows порциями, вернуть (принято, пропущено).
+
+    Пропущены строки со ссылками на несуществующих пользователей,
+    подборки или записи; из принятых уже существующие в базе не
+    вставляются. Каждая порция - своя транзакция.
+    """
+    rows = iter(rows)
+    accepted = skipped = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return accepted, skipped
+        with transaction.atomic():
+            for chunk in chunks(batch):
+                table.prepare(chunk)
+                objects = [table.build(row) for row in chunk]
+                objects = [obj for obj in objects if obj is not None]
+                fields, dates = file_dates(table.model, objects)
+                table.model.objects.bulk_create(
+                    objects, ignore_conflicts=True
+                )
+                restore_dates(table.model, fields, dates)
+                table.imported(objects)
+                accepted += len(objects)
+                skipped += len(chunk) - len(objects)
@@ -0,0 +1,214 @@
+"""Потоковый приём изображений записей.
+
+Стандартные обработчики Django держат небольшие файлы в памяти целиком,
+а проверка в forms.ImageField начинается, только когда файл уже принят.
+ImageUploadHandler пишет файл на диск по мере поступления и по первым
+килобайтам решает, стоит ли принимать его дальше:
+
+- сигнатура (magic bytes) - только JPEG, PNG, GIF и WebP;
+- размеры из заголовка: Pillow читает его без декодирования пикселей,
+  слишком большие по числу пикселей изображения отклоняются сразу;
+- файл больше IMAGE_UPLOAD_MAX_SIZE перестаёт записываться на первом
+  лишнем блоке.
+
+Отклонённый файл приходит в форму как RejectedUpload с текстом ошибки,
+PostForm показывает его у поля image. Принятое изображение больше
+IMAGE_UPLOAD_MAX_DIMENSION уменьшается, метаданные (EXIF, XMP,
+комментарии) удаляются; JPEG при этом декодируется сразу в уменьшенном
+масштабе (Image.draft), так что память ограничена размером результата.
+Файл, который при этом не декодируется (обрезан, испорчен), тоже
+приходит в форму как RejectedUpload.
+"""
+import io
+
+from django.conf import settings
+from django.core.files.uploadedfile import (TemporaryUploadedFile,
+                                            UploadedFile)
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+    (b'RIFF', 'WEBP'),
+)
+# в стольких первых байтах должны найтись размеры изображения
+HEADER_LIMIT = 256 * 1024
+
+# метаданные, которые не сохраняем; профиль цвета и прозрачность нужны
+KEEP_INFO = ('icc_profile', 'transparency')
+METADATA_INFO = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+
+
+def detect_format(header):
+    for signature, image_format in SIGNATURES:
+        if header.startswith(signature):
+            if image_format == 'WEBP' and header[8:12] != b'WEBP':
+                return None
+            return image_format
+    return None
+
+
+# ошибки Pillow на испорченном или не том файле; остальное - ошибки кода
+IMAGE_ERRORS = (OSError, SyntaxError, Image.DecompressionBombError)
+
+
+def open_image(file, image_format):
+    """Image.open, который принимает только формат image_format.
+
+    Аргумента formats у Image.open нет до Pillow 7.1, поэтому формат
+    сверяется после открытия; оно читает только заголовок.
+    """
+    image = Image.open(file)
+    if image.format != image_format:
+        image.close()
+        raise UnidentifiedImageError(
+            f'Ожидался {image_format}, а не {image.format}.'
+        )
+    return image
+
+
+class RejectedUpload(UploadedFile):
+    """Файл, отклонённый при приёме, с причиной в error."""
+
+    def __init__(self, name, content_type, error):
+        super().__init__(io.BytesIO(), name, content_type, 0)
+        self.error = error
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        # тело запроса заведомо больше допустимого файла с полями формы -
+        # файлы из него не записываем вовсе
+        self.body_too_large = content_length > (
+            settings.IMAGE_UPLOAD_MAX_SIZE
+            + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        )
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.error = None
+        self.header = b''
+        self.image_format = None
+        self.received = 0
+        if getattr(self, 'body_too_large', False):
+            self.reject(self.size_error())
+
+    def size_error(self):
+        limit = filesizeformat(settings.IMAGE_UPLOAD_MAX_SIZE)
+        return f'Файл больше {limit}.'
+
+    def reject(self, error):
+        self.error = error
+        self.file.close()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.reject(self.size_error())
+            return None
+        if self.image_format is None:
+            self.check_header(raw_data)
+            if self.error:
+                return None
+        self.file.write(raw_data)
+        return None
+
+    def check_header(self, raw_data):
+        """Проверить сигнатуру и размеры по уже полученному началу файла."""
+        self.header += raw_data
+        image_format = detect_format(self.header[:12])
+        if image_format is None:
+            if len(self.header) >= 12:
+                self.reject('Поддерживаются изображения JPEG, PNG, GIF '
+                            'и WebP.')
+            return
+        try:
+            # пиксели не декодируются, только заголовок
+            with open_image(io.BytesIO(self.header), image_format) as image:
+                width, height = image.size
+        except IMAGE_ERRORS:
+            if len(self.header) >= HEADER_LIMIT:
+                self.reject('Не удалось прочитать размеры изображения.')
+            return
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            self.reject('Изображение слишком большое: '
+                        f'{width}x{height} пикселей.')
+            return
+        self.image_format = image_format
+        self.header = b''
+
+    def file_complete(self, file_size):
+        if self.error is None and self.image_format is None:
+            # файл кончился раньше, чем нашлись размеры
+            self.reject('Не удалось прочитать размеры изображения.')
+        if self.error:
+            return RejectedUpload(self.file_name, self.content_type,
+                                  self.error)
+        upload = super().file_complete(file_size)
+        return normalize(upload, self.image_format)
+
+
+def normalize(upload, image_format):
+    """Уменьшить слишком большое изображение и удалить метаданные.
+
+    GIF оставляем как есть: пересохранение потеряет анимацию, а его
+    размеры уже ограничены IMAGE_UPLOAD_MAX_PIXELS. Файл, который не
+    удалось декодировать (например, обрезанный), отклоняется.
+    """
+    result = None
+    try:
+        with open_image(upload, image_format) as image:
+            image = shrink(image, image_format)
+            if image is None:
+                upload.seek(0)
+                return upload
+            result = TemporaryUploadedFile(
+                upload.name, upload.content_type, 0,
+                upload.charset, upload.content_type_extra
+            )
+            image.save(result, image_format,
+                       icc_profile=image.info.get('icc_profile'),
+                       **SAVE_OPTIONS[image_format])
+    except IMAGE_ERRORS:
+        if result is not None:
+            result.close()
+        upload.close()
+        return RejectedUpload(upload.name, upload.content_type,
+                              'Не удалось прочитать изображение.')
+    result.size = result.tell()
+    result.seek(0)
+    upload.close()
+    return result
+
+
+def shrink(image, image_format):
+    """Уменьшенная копия без метаданных или None, если менять нечего."""
+    limit = settings.IMAGE_UPLOAD_MAX_DIMENSION
+    oversize = max(image.size) > limit
+    has_metadata = any(key in image.info for key in METADATA_INFO)
+    if image_format == 'GIF' or not (oversize or has_metadata):
+        return None
+    scale = min(limit / max(image.size), 1)
+    size = (round(image.width * scale), round(image.height * scale))
+    # JPEG декодируется сразу в 1/2, 1/4 или 1/8 масштаба, если
+    # результат не меньше size - полный кадр в памяти не нужен
+    image.draft(image.mode, size)
+    image = image.resize(size, Image.LANCZOS)
+    # поворот по EXIF - уже на уменьшенной копии
+    image = ImageOps.exif_transpose(image)
+    image.info = {key: image.info[key]
+                  for key in KEEP_INFO if key in image.info}
+    return image
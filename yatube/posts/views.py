@@ -3,11 +3,19 @@ from http import HTTPStatus
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import (DateTimeField, Exists, Max, OuterRef,
+                              Subquery)
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
-from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from yatube.replicas import replica_reads
+
+from . import search, thumbnails, timeline
+from .cache import cache_anonymous_page, conditional_page
+from .forms import CommentForm, PostForm, SearchForm
+from .models import (AuthorStats, Comment, Follow, Group, Post, User,
+                     count_subquery)
+from .paginators import CursorPaginator
 
 
 def page_not_found(request, exception):
@@ -38,9 +46,23 @@ def pagination(request, objects):
     return page
 
 
+def feed_pagination(request, posts):
+    """Порция записей для лент: index, group, profile, follow.
+
+    При settings.FEED_CURSOR_PAGINATION лента листается курсором из
+    параметра cursor (см. posts.paginators), иначе - как в pagination.
+    """
+    if not settings.FEED_CURSOR_PAGINATION:
+        return pagination(request, posts)
+    paginator = CursorPaginator(posts, settings.PAGINATOR_DEFAULT_SIZE)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+@replica_reads
+@cache_anonymous_page
 def index(request):
-    post_list = Post.objects.all()
-    page = pagination(request, post_list)
+    post_list = Post.objects.for_feed()
+    page = feed_pagination(request, post_list)
     return render(
         request,
         'posts/index.html',
@@ -48,21 +70,48 @@ def index(request):
     )
 
 
+@replica_reads
+@cache_anonymous_page
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page = pagination(request, post_list)
+    post_list = group.posts.for_feed()
+    page = feed_pagination(request, post_list)
 
     return render(request, 'posts/group.html',
                   {'group': group, 'page': page})
 
 
+@replica_reads
 def group_index(request):
     groups_list = Group.objects.all()
     page = pagination(request, groups_list)
     return render(request, 'posts/group_index.html', {'page': page})
 
 
+def post_search(request):
+    """Поиск записей по тексту с фильтрами по подборке и автору."""
+    form = SearchForm(request.GET or None)
+    page = None
+    if form.is_valid():
+        newest = form.cleaned_data['sort'] == 'new'
+        posts = search.search_posts(
+            form.cleaned_data['q'],
+            group=form.cleaned_data['group'],
+            author=form.cleaned_data['author'],
+            newest=newest,
+        )
+        paginator = search.paginator(
+            posts, settings.PAGINATOR_DEFAULT_SIZE, newest=newest
+        )
+        page = paginator.get_page(request.GET.get('cursor'))
+
+    # параметры поиска для ссылок на соседние порции
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    return render(request, 'posts/search.html',
+                  {'form': form, 'page': page, 'query': query.urlencode()})
+
+
 @login_required
 def new_post(request):
     """For post-obj create form, render and check it, then save model-obj."""
@@ -72,18 +121,86 @@ def new_post(request):
     if form.is_valid():
         new_post = form.save(commit=False)
         new_post.author = request.user
-        new_post.save()
+        with transaction.atomic():
+            new_post.save()
+            thumbnails.schedule(new_post)
         return redirect('index')
 
     return render(request, 'posts/new_post.html',
                   {'form': form, 'edit_flag': False})
 
 
+STATS_STATE = ('followers_count', 'following_count', 'posts_count',
+               'updated_at')
+
+
+def _latest(*dates):
+    return max((date for date in dates if date is not None), default=None)
+
+
+def _newest(queryset, field):
+    return Subquery(queryset.order_by(f'-{field}').values(field)[:1])
+
+
+def profile_validators(request, username):
+    """Данные профиля для условного GET одним запросом.
+
+    Новая запись, подписка и комментарий меняют updated_at счётчиков
+    автора или его записей, правка подборки - её updated_at, поэтому
+    хватает этих дат, счётчиков и признака подписки.
+    """
+    state = User.objects.filter(username=username).annotate(
+        last_post=_newest(
+            Post.objects.filter(author=OuterRef('pk')), 'updated_at'
+        ),
+        last_group=Subquery(
+            Post.objects.filter(author=OuterRef('pk')).order_by().values(
+                'author'
+            ).annotate(last=Max('group__updated_at')).values('last'),
+            output_field=DateTimeField()
+        ),
+        is_followed=Exists(Follow.objects.filter(
+            user_id=request.user.pk, author=OuterRef('pk')
+        )),
+    ).values_list(
+        'pk', 'last_post', 'last_group', 'is_followed',
+        *(f'stats__{field}' for field in STATS_STATE)
+    ).first()
+    if state is None:
+        return None
+    return state, _latest(state[1], state[2], state[-1])
+
+
+def post_validators(request, username, post_id):
+    """Данные страницы записи для условного GET одним запросом.
+
+    Правка записи и её подборки, последний комментарий, число
+    комментариев и счётчики автора.
+    """
+    comments = Comment.objects.filter(post=OuterRef('pk'))
+    state = Post.objects.filter(
+        author__username=username, id=post_id
+    ).annotate(
+        last_comment=_newest(comments, 'created'),
+        comments_total=count_subquery(Comment, 'post'),
+    ).values_list(
+        'updated_at', 'last_comment', 'group__updated_at', 'comments_total',
+        *(f'author__stats__{field}' for field in STATS_STATE)
+    ).first()
+    if state is None:
+        return None
+    return state, _latest(state[0], state[1], state[2], state[-1])
+
+
+@replica_reads
+@conditional_page(profile_validators)
 def profile(request, username):
-    profile_user = get_object_or_404(User, username=username)
+    profile_user = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
 
-    user_posts = profile_user.posts.all()
-    page = pagination(request, user_posts)
+    user_posts = profile_user.posts.for_feed()
+    page = feed_pagination(request, user_posts)
 
     follow_flag = False
     if ((request.user.is_authenticated)
@@ -93,17 +210,49 @@ def profile(request, username):
 
     return render(request, 'posts/profile.html',
                   {'profile_user': profile_user,
+                   'stats': AuthorStats.objects.for_user(profile_user),
                    'page': page, 'following': follow_flag})
 
 
+@replica_reads
+@conditional_page(post_validators)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'author__stats'),
+        author__username=username, id=post_id
+    )
     form = CommentForm(request.POST or None)
     return render(request, 'posts/post.html',
                   {'post': post,
+                   'stats': AuthorStats.objects.for_user(post.author),
                    # 'author': post.author.username,
                    'form': form,
-                   'comments': post.comments.all()})
+                   'comments': comment_page(request, post)})
+
+
+def comment_page(request, post):
+    """Порция комментариев записи от новых к старым.
+
+    Листается курсором по (created, id) из параметра cursor, так что
+    время отрисовки не зависит от числа комментариев записи.
+    """
+    paginator = CursorPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_PAGE_SIZE, date_field='created'
+    )
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+@replica_reads
+@conditional_page(post_validators)
+def post_comments(request, username, post_id):
+    """Следующая порция комментариев фрагментом для «Показать ещё»."""
+    post = get_object_or_404(
+        Post.objects.select_related('author'),
+        author__username=username, id=post_id
+    )
+    return render(request, 'includes/comment_list.html',
+                  {'post': post, 'comments': comment_page(request, post)})
 
 
 @login_required
@@ -116,7 +265,12 @@ def post_edit(request, username, post_id):
     form = PostForm(request.POST or None,
                     files=request.FILES or None, instance=post)
     if form.is_valid():
+        image_changed = 'image' in form.changed_data
+        if image_changed:
+            post.thumbnail = post.image_variants = ''
         post.save()
+        if image_changed:
+            thumbnails.schedule(post)
         return redirect('post', username=post.author.username,
                         post_id=post_id)
 
@@ -132,15 +286,18 @@ def add_comment(request, username, post_id):
         new_comment = form.save(commit=False)
         new_comment.author = request.user
         new_comment.post = post
-        new_comment.save()
+        # счётчик комментариев записи меняет сигнал, в той же транзакции
+        with transaction.atomic():
+            new_comment.save()
     return redirect('post', username=post.author.username,
                     post_id=post.id)
 
 
+@replica_reads
 @login_required
 def follow_index(request):
-    posts_list = Post.objects.filter(author__following__user=request.user)
-    page = pagination(request, posts_list)
+    posts_list = timeline.follow_feed(request.user)
+    page = timeline.hydrate(feed_pagination(request, posts_list))
     return render(
         request,
         'posts/follow.html',
@@ -151,17 +308,23 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     profile_user = get_object_or_404(User, username=username)
-    if ((request.user != profile_user)
-        and (not Follow.objects.filter(
-            user=request.user, author=profile_user).exists())):
-        Follow.objects.create(user=request.user, author=profile_user)
+    if request.user != profile_user:
+        with transaction.atomic():
+            _, created = Follow.objects.get_or_create(
+                user=request.user, author=profile_user
+            )
+            if created:
+                timeline.followed(request.user, profile_user)
     return redirect('profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     profile_user = get_object_or_404(User, username=username)
-    if Follow.objects.filter(user=request.user,
-                             author=profile_user).exists():
-        Follow.objects.get(user=request.user, author=profile_user).delete()
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(
+            user=request.user, author=profile_user
+        ).delete()
+        if deleted:
+            timeline.unfollowed(request.user, profile_user)
     return redirect('profile', username=username)
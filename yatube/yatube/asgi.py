@@ -0,0 +1,173 @@
+"""
+ASGI config for yatube project.
+
+Django 2.2 не умеет ASGI: обработчик запросов и ORM синхронные. Здесь
+WSGI-приложение проекта (с прогревом шаблонов из yatube.wsgi)
+обёрнуто в ASGI: событийный цикл сервера (uvicorn, daphne, hypercorn)
+принимает соединения и читает тела запросов, а Django отрабатывает
+запрос в пуле из ASGI_THREADS потоков. Медленный клиент, который долго
+шлёт тело запроса, так не занимает поток Django.
+
+Это не асинхронные views: каждый запрос целиком занимает поток пула,
+одновременно отрабатывается не больше ASGI_THREADS запросов, и ждать
+базу или кеш без потока view не умеют - для этого нужен Django 3.1+.
+
+Тело ответа отдаётся по частям, как его выдаёт WSGI-приложение
+(потоковые ответы API - порциями): поток пула передаёт каждую часть
+событийному циклу и ждёт её отправки. Если клиент отключился, поток
+перестаёт читать ответ и закрывает его.
+
+    uvicorn yatube.asgi:application --workers 4
+"""
+import asyncio
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from yatube.wsgi import application as wsgi_application
+
+# тело запроса больше этого размера ждёт обработки во временном файле
+MAX_BODY_IN_MEMORY = 1024 * 1024
+
+
+def build_environ(scope, body):
+    """Окружение WSGI (PEP 3333) для HTTP-запроса ASGI."""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin1'),
+        'PATH_INFO': scope['path'].encode().decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        if name in environ:
+            value = f'{environ[name]},{value}'
+        environ[name] = value
+    return environ
+
+
+def run_wsgi(application, environ, send, disconnected):
+    """Вызвать WSGI-приложение и отдать ответ через send по частям.
+
+    Работает в потоке пула: send(message) передаёт сообщение ASGI
+    событийному циклу и ждёт отправки, disconnected - threading.Event,
+    выставленный при отключении клиента. Ответ читается и закрывается
+    в том же потоке, что и создан: соединения с базой у Django свои у
+    каждого потока.
+    """
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [
+            (name.lower().encode('latin1'), value.encode('latin1'))
+            for name, value in headers
+        ]
+
+    def start():
+        if not response.get('started'):
+            response['started'] = True
+            send({'type': 'http.response.start',
+                  'status': response['status'],
+                  'headers': response['headers']})
+
+    result = application(environ, start_response)
+    try:
+        for chunk in result:
+            if disconnected.is_set():
+                return
+            if chunk:
+                start()
+                send({'type': 'http.response.body', 'body': chunk,
+                      'more_body': True})
+        if not disconnected.is_set():
+            start()
+            send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+
+class WsgiToAsgi:
+    """ASGI-приложение, отрабатывающее запросы WSGI-приложения в потоках."""
+
+    def __init__(self, application, threads):
+        self.application = application
+        self.executor = ThreadPoolExecutor(
+            threads, thread_name_prefix='asgi'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f'Неподдерживаемый тип ASGI: {scope["type"]}')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(MAX_BODY_IN_MEMORY)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+        loop = asyncio.get_running_loop()
+        disconnected = threading.Event()
+        watcher = loop.create_task(self.wait_disconnect(receive, disconnected))
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        try:
+            await loop.run_in_executor(
+                self.executor, run_wsgi, self.application,
+                build_environ(scope, body), send_from_thread, disconnected
+            )
+        finally:
+            watcher.cancel()
+            body.close()
+
+    async def wait_disconnect(self, receive, disconnected):
+        """Тело запроса прочитано: следующее сообщение - отключение."""
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+                return
+
+
+application = WsgiToAsgi(wsgi_application, settings.ASGI_THREADS)
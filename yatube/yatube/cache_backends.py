@@ -0,0 +1,327 @@
+"""Общий для процессов кеш в файле SQLite.
+
+LocMemCache у каждого процесса свой: с ростом числа воркеров падает
+доля попаданий, а сброс ключа в одном воркере не виден остальным.
+SQLiteCache хранит всё в одном файле, не требует отдельного сервиса и
+годится для нескольких процессов на одной машине:
+
+- LRU-вытеснение по времени последнего чтения, ограничения по числу
+  записей (MAX_ENTRIES) и по суммарному размеру значений (MAX_SIZE);
+- атомарные incr/decr для счётчиков поколений (posts.cache): целые
+  числа хранятся как INTEGER и меняются одним UPDATE;
+- WAL-журнал, чтобы чтения не ждали записей.
+
+Настройка в settings.CACHES:
+
+    'BACKEND': 'yatube.cache_backends.SQLiteCache',
+    'LOCATION': '/path/to/cache.sqlite3',
+    'OPTIONS': {'MAX_ENTRIES': 100000, 'MAX_SIZE': 256 * 1024 * 1024},
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL,
+        size INTEGER NOT NULL
+    )""",
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    """CREATE TABLE IF NOT EXISTS cache_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        entries INTEGER NOT NULL,
+        size INTEGER NOT NULL
+    )""",
+    'INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0)',
+    # число и размер записей поддерживаются триггерами,
+    # чтобы не считать COUNT(*) и SUM(size) при каждой записи
+    """CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache
+    BEGIN
+        UPDATE cache_stats
+        SET entries = entries + 1, size = size + NEW.size;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache
+    BEGIN
+        UPDATE cache_stats
+        SET entries = entries - 1, size = size - OLD.size;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache
+    BEGIN
+        UPDATE cache_stats SET size = size - OLD.size + NEW.size;
+    END""",
+)
+
+# не обновлять время чтения чаще, чем раз в столько секунд:
+# иначе каждое попадание превращается в запись
+ACCESS_GRANULARITY = 1.0
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = os.path.abspath(location)
+        options = params.get('OPTIONS', {})
+        self._max_size = int(options.get('MAX_SIZE', 0)) or None
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    # соединения
+
+    def _connection(self):
+        """Соединение текущего потока; после fork открывается новое."""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = self._connect()
+            local.pid = os.getpid()
+        return local.connection
+
+    def _connect(self):
+        directory = os.path.dirname(self._path)
+        os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self._path, timeout=self._busy_timeout,
+            isolation_level=None, check_same_thread=False
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        # иначе INSERT OR REPLACE не вызывает триггер удаления
+        # и счётчики cache_stats расходятся с таблицей
+        connection.execute('PRAGMA recursive_triggers=ON')
+        with _Transaction(connection):
+            for statement in SCHEMA:
+                connection.execute(statement)
+        return connection
+
+    def close(self, **kwargs):
+        # соединение живёт весь процесс, как пул: закрывать после
+        # каждого запроса (сигнал request_finished) незачем
+        pass
+
+    # (де)сериализация
+
+    def _encode(self, value):
+        if type(value) is int:
+            return value, 8
+        data = pickle.dumps(value, self.pickle_protocol)
+        return sqlite3.Binary(data), len(data)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    # чтение
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        made = {}
+        for key in keys:
+            cache_key = self.make_key(key, version=version)
+            self.validate_key(cache_key)
+            made[cache_key] = key
+
+        connection = self._connection()
+        now = time.time()
+        placeholders = ', '.join('?' * len(made))
+        rows = connection.execute(
+            f'SELECT key, value, expires, accessed FROM cache '
+            f'WHERE key IN ({placeholders})',
+            list(made)
+        ).fetchall()
+
+        found, expired, stale = {}, [], []
+        for cache_key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                expired.append(cache_key)
+                continue
+            found[made[cache_key]] = self._decode(value)
+            if accessed < now - ACCESS_GRANULARITY:
+                stale.append(cache_key)
+        if expired or stale:
+            with _Transaction(connection):
+                self._delete_keys(connection, expired)
+                connection.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?',
+                    ((now, cache_key) for cache_key in stale)
+                )
+        return found
+
+    def has_key(self, key, version=None):
+        cache_key = self.make_key(key, version=version)
+        self.validate_key(cache_key)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (cache_key, time.time())
+        ).fetchone()
+        return row is not None
+
+    # запись
+
+    def _store(self, connection, cache_key, value, timeout, mode):
+        data, size = self._encode(value)
+        cursor = connection.execute(
+            f'INSERT OR {mode} INTO cache '
+            f'(key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)',
+            (cache_key, data, self._expires(timeout), time.time(), size)
+        )
+        return cursor.rowcount > 0
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        connection = self._connection()
+        with _Transaction(connection):
+            for key, value in data.items():
+                cache_key = self.make_key(key, version=version)
+                self.validate_key(cache_key)
+                self._store(connection, cache_key, value, timeout, 'REPLACE')
+            self._cull(connection)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        cache_key = self.make_key(key, version=version)
+        self.validate_key(cache_key)
+        connection = self._connection()
+        with _Transaction(connection):
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (cache_key, time.time())
+            )
+            added = self._store(connection, cache_key, value, timeout,
+                                'IGNORE')
+            if added:
+                self._cull(connection)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cache_key = self.make_key(key, version=version)
+        self.validate_key(cache_key)
+        now = time.time()
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ?, accessed = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), now, cache_key, now)
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно изменить целое значение ключа, как в memcached.
+
+        Ключа нет или в нём не целое число -> ValueError.
+        """
+        cache_key = self.make_key(key, version=version)
+        self.validate_key(cache_key)
+        connection = self._connection()
+        with _Transaction(connection):
+            cursor = connection.execute(
+                "UPDATE cache SET value = value + ?, accessed = ? "
+                "WHERE key = ? AND typeof(value) = 'integer' "
+                "AND (expires IS NULL OR expires > ?)",
+                (delta, time.time(), cache_key, time.time())
+            )
+            if cursor.rowcount == 0:
+                raise ValueError(f"Key '{key}' not found")
+            (value,) = connection.execute(
+                'SELECT value FROM cache WHERE key = ?', (cache_key,)
+            ).fetchone()
+        return value
+
+    # удаление
+
+    @staticmethod
+    def _delete_keys(connection, cache_keys):
+        connection.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            ((cache_key,) for cache_key in cache_keys)
+        )
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        cache_keys = []
+        for key in keys:
+            cache_key = self.make_key(key, version=version)
+            self.validate_key(cache_key)
+            cache_keys.append(cache_key)
+        if not cache_keys:
+            return
+        connection = self._connection()
+        with _Transaction(connection):
+            self._delete_keys(connection, cache_keys)
+
+    def clear(self):
+        connection = self._connection()
+        with _Transaction(connection):
+            connection.execute('DELETE FROM cache')
+
+    def _cull(self, connection):
+        """Вытеснить просроченные, затем давно не читанные записи."""
+        entries, size = connection.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        over_entries = entries > self._max_entries
+        over_size = self._max_size is not None and size > self._max_size
+        if not (over_entries or over_size):
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        while True:
+            entries, size = connection.execute(
+                'SELECT entries, size FROM cache_stats'
+            ).fetchone()
+            over_entries = entries > self._max_entries
+            over_size = self._max_size is not None and size > self._max_size
+            if not (over_entries or over_size) or not entries:
+                return
+            # как в стандартных бэкендах: освобождаем 1/CULL_FREQUENCY
+            count = max(entries // self._cull_frequency, 1)
+            connection.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (count,)
+            )
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT: блокировка на запись берётся сразу.
+
+    Иначе два процесса, начавшие с чтения, упрутся друг в друга
+    при повышении блокировки и один получит SQLITE_BUSY без ожидания.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.connection.execute('COMMIT')
+        else:
+            self.connection.execute('ROLLBACK')
@@ -0,0 +1,288 @@
+"""Замеры каждого запроса: SQL, шаблоны, кеш, полное время.
+
+MetricsMiddleware ставится первой в MIDDLEWARE и для каждого запроса
+собирает имя view, число и время запросов к базе, время отрисовки
+шаблонов, попадания и промахи кеша и полное время ответа. Дальше:
+
+- доля запросов (METRICS_LOG_SAMPLE_RATE) и все медленные, дольше
+  METRICS_SLOW_REQUEST_MS, пишутся строкой JSON в лог yatube.requests;
+- всё суммируется в памяти процесса и отдаётся view metrics (только
+  по токену METRICS_TOKEN) в текстовом формате Prometheus. У каждого
+  воркера свои суммы: Prometheus опрашивает воркеры по отдельности или
+  складывает их сам.
+
+Запросы к базе считает execute_wrapper, шаблоны и кеш - обёртки над
+методами Django, которые ставит install(): без DEBUG и без сохранения
+текстов запросов, поэтому годится для production, в отличие от
+django-debug-toolbar.
+"""
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template.backends.django import Template
+
+logger = logging.getLogger('yatube.requests')
+
+# границы корзин гистограммы времени ответа, секунды
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+_local = threading.local()
+_installed = False
+_install_lock = threading.Lock()
+
+
+class RequestStats:
+    """Замеры одного запроса; вложенные вызовы не считаются дважды."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.depth = defaultdict(int)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+def current():
+    return getattr(_local, 'stats', None)
+
+
+def _outermost(kind, function, on_done):
+    """Обёртка, которая замеряет только внешний из вложенных вызовов.
+
+    Шаблон карточки рисуется внутри шаблона ленты, get_many кеша
+    вызывает get - учитывается только внешний вызов.
+    """
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        stats = current()
+        if stats is None or stats.depth[kind]:
+            return function(*args, **kwargs)
+        stats.depth[kind] += 1
+        started = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            stats.depth[kind] -= 1
+        on_done(stats, time.perf_counter() - started, args, result)
+        return result
+    return wrapper
+
+
+def _template_done(stats, elapsed, args, result):
+    stats.template_time += elapsed
+
+
+_MISSING = object()
+
+
+def _instrument_get(get):
+    def done(stats, elapsed, args, value):
+        if value is _MISSING:
+            stats.cache_misses += 1
+        else:
+            stats.cache_hits += 1
+
+    # промах отличается от сохранённого None только по своему default
+    measured = _outermost(
+        'cache', lambda self, key, version: get(self, key, _MISSING, version),
+        done
+    )
+
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        value = measured(self, key, version)
+        return default if value is _MISSING else value
+    return wrapper
+
+
+def _instrument_get_many(get_many):
+    def done(stats, elapsed, args, values):
+        keys = list(args[1])
+        stats.cache_hits += len(values)
+        stats.cache_misses += len(keys) - len(values)
+    return _outermost('cache', get_many, done)
+
+
+def install():
+    """Поставить обёртки на отрисовку шаблонов и чтение кешей.
+
+    Один раз на процесс; классы кешей берутся из settings.CACHES.
+    """
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        Template.render = _outermost(
+            'template', Template.render, _template_done
+        )
+        for backend in {type(caches[alias]) for alias in settings.CACHES}:
+            backend.get = _instrument_get(backend.get)
+            backend.get_many = _instrument_get_many(backend.get_many)
+        _installed = True
+
+
+class Registry:
+    """Суммы замеров по view для /metrics, общие для потоков процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.buckets = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+        # счётчики-количества остаются int, времена становятся float
+        self.sums = defaultdict(lambda: defaultdict(int))
+
+    def add(self, view, method, status, duration, stats):
+        with self.lock:
+            self.requests[(view, method, f'{status // 100}xx')] += 1
+            self.buckets[view][bisect_left(DURATION_BUCKETS, duration)] += 1
+            sums = self.sums[view]
+            sums['duration'] += duration
+            sums['db_queries'] += stats.queries
+            sums['db_time'] += stats.db_time
+            sums['template_time'] += stats.template_time
+            sums['cache_hits'] += stats.cache_hits
+            sums['cache_misses'] += stats.cache_misses
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.buckets.clear()
+            self.sums.clear()
+
+    def render(self):
+        """Текст в формате Prometheus exposition 0.0.4."""
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self.lock:
+            family('yatube_requests_total', 'counter',
+                   'Запросы по view, методу и классу ответа.')
+            for (view, method, status), count in sorted(
+                    self.requests.items()):
+                lines.append(
+                    f'yatube_requests_total{{view="{view}",'
+                    f'method="{method}",status="{status}"}} {count}'
+                )
+            family('yatube_request_duration_seconds', 'histogram',
+                   'Полное время ответа.')
+            for view, counts in sorted(self.buckets.items()):
+                total = 0
+                for bound, count in zip(DURATION_BUCKETS + ('+Inf',),
+                                        counts):
+                    total += count
+                    lines.append(
+                        f'yatube_request_duration_seconds_bucket'
+                        f'{{view="{view}",le="{bound}"}} {total}'
+                    )
+                lines.append(f'yatube_request_duration_seconds_sum'
+                             f'{{view="{view}"}} '
+                             f'{self.sums[view]["duration"]:.6f}')
+                lines.append(f'yatube_request_duration_seconds_count'
+                             f'{{view="{view}"}} {total}')
+            for name, key, help_text in SUMS:
+                family(name, 'counter', help_text)
+                for view, sums in sorted(self.sums.items()):
+                    # repr без потери точности: :g после 1e6 округляет
+                    lines.append(f'{name}{{view="{view}"}} {sums[key]!r}')
+        return '\n'.join(lines) + '\n'
+
+
+SUMS = (
+    ('yatube_db_queries_total', 'db_queries', 'Запросы к базе.'),
+    ('yatube_db_query_seconds_total', 'db_time', 'Время запросов к базе.'),
+    ('yatube_template_render_seconds_total', 'template_time',
+     'Время отрисовки шаблонов.'),
+    ('yatube_cache_hits_total', 'cache_hits', 'Попадания в кеш.'),
+    ('yatube_cache_misses_total', 'cache_misses', 'Промахи кеша.'),
+)
+
+registry = Registry()
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    # нераспознанные адреса - одной меткой, а не по метке на адрес
+    return match.view_name if match is not None else 'unresolved'
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        stats = RequestStats()
+        _local.stats = stats
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        duration = time.perf_counter() - started
+        view = _view_name(request)
+        registry.add(view, request.method, response.status_code,
+                     duration, stats)
+        if (duration * 1000 >= settings.METRICS_SLOW_REQUEST_MS
+                or random.random() < settings.METRICS_LOG_SAMPLE_RATE):
+            logger.info(json.dumps({
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'db_queries': stats.queries,
+                'db_ms': round(stats.db_time * 1000, 2),
+                'template_ms': round(stats.template_time * 1000, 2),
+                'cache_hits': stats.cache_hits,
+                'cache_misses': stats.cache_misses,
+            }, ensure_ascii=False))
+        return response
+
+
+def authorized(request):
+    """Запрос с METRICS_TOKEN и, если адреса заданы, с METRICS_ALLOWED_IPS."""
+    if not settings.METRICS_TOKEN:
+        return False
+    if (settings.METRICS_ALLOWED_IPS and request.META.get('REMOTE_ADDR')
+            not in settings.METRICS_ALLOWED_IPS):
+        return False
+    return hmac.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', '').encode(),
+        f'Bearer {settings.METRICS_TOKEN}'.encode()
+    )
+
+
+def metrics(request):
+    """Суммы замеров процесса для Prometheus, остальным - 404."""
+    if not authorized(request):
+        raise Http404
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4'
+    )
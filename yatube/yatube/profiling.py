@@ -0,0 +1,168 @@
+"""Профили медленных запросов.
+
+ProfilingMiddleware включается настройкой PROFILER и профилирует каждый
+PROFILER_EVERY-й запрос; профиль сохраняется, если запрос шёл дольше
+PROFILER_SLOW_MS. Файлы называются по времени, имени маршрута и
+длительности и лежат в PROFILER_DIR, старше последних PROFILER_KEEP
+удаляются.
+
+- PROFILER = 'sampler': фоновый поток раз в PROFILER_INTERVAL_MS
+  снимает стеки потоков, занятых запросами. Замедляет запрос мало,
+  поэтому можно профилировать каждый запрос и оставлять медленные.
+  Файлы .collapsed - свёрнутые стеки ("a;b;c число") для flamegraph.pl
+  или speedscope.
+- PROFILER = 'cprofile': cProfile, точные счётчики вызовов, но запрос
+  заметно медленнее - лучше вместе с PROFILER_EVERY. Файлы .prof для
+  pstats и snakeviz.
+
+Без PROFILER middleware отключается при загрузке (MiddlewareNotUsed) и
+в обработке запросов не участвует.
+"""
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from itertools import count
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+
+PROFILERS = ('sampler', 'cprofile')
+
+
+def collapse(frame):
+    """Стек кадра одной строкой, от внешнего вызова к внутреннему."""
+    names = []
+    while frame is not None:
+        names.append(
+            f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}'
+        )
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler(threading.Thread):
+    """Поток, который снимает стеки потоков с активными запросами."""
+
+    def __init__(self, interval):
+        super().__init__(name='profiler', daemon=True)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.active = {}
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.sample()
+
+    def sample(self):
+        """Снять по стеку с каждого наблюдаемого потока.
+
+        Стеки сворачиваются без блокировки, а счётчики меняются под ней
+        и только у потоков, которые всё ещё наблюдаются: после unwatch()
+        запрос перебирает свой счётчик при записи профиля.
+        """
+        with self.lock:
+            active = list(self.active.items())
+        if not active:
+            return
+        frames = sys._current_frames()
+        samples = [(thread_id, stacks, collapse(frames[thread_id]))
+                   for thread_id, stacks in active if thread_id in frames]
+        with self.lock:
+            for thread_id, stacks, stack in samples:
+                if self.active.get(thread_id) is stacks:
+                    stacks[stack] += 1
+
+    def watch(self):
+        stacks = Counter()
+        with self.lock:
+            self.active[threading.get_ident()] = stacks
+        return stacks
+
+    def unwatch(self):
+        with self.lock:
+            self.active.pop(threading.get_ident(), None)
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    # поток запускается при первом запросе, а не при импорте: после
+    # fork в воркере gunicorn потоков родителя уже нет
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None or not _sampler.is_alive():
+            _sampler = StackSampler(settings.PROFILER_INTERVAL_MS / 1000)
+            _sampler.start()
+        return _sampler
+
+
+def rotate(directory, keep):
+    """Оставить в directory только keep последних профилей."""
+    paths = [entry.path for entry in os.scandir(directory)
+             if entry.name.endswith(('.collapsed', '.prof'))]
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:-keep] if keep else paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # удалил соседний процесс
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.PROFILER:
+            raise MiddlewareNotUsed
+        if settings.PROFILER not in PROFILERS:
+            raise ImproperlyConfigured(
+                f'PROFILER должен быть одним из {PROFILERS}, '
+                f'а не {settings.PROFILER!r}'
+            )
+        self.get_response = get_response
+        self.counter = count(1)
+
+    def __call__(self, request):
+        number = next(self.counter)
+        if number % settings.PROFILER_EVERY:
+            return self.get_response(request)
+        started = time.perf_counter()
+        if settings.PROFILER == 'cprofile':
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.disable()
+        else:
+            sampler = get_sampler()
+            profile = sampler.watch()
+            try:
+                response = self.get_response(request)
+            finally:
+                sampler.unwatch()
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms >= settings.PROFILER_SLOW_MS:
+            self.save(request, profile, duration_ms, number)
+        return response
+
+    def save(self, request, profile, duration_ms, number):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        directory = settings.PROFILER_DIR
+        os.makedirs(directory, exist_ok=True)
+        name = (f'{time.strftime("%Y%m%d-%H%M%S")}-'
+                f'{view.replace(":", "-")}-{duration_ms:.0f}ms-'
+                f'{os.getpid()}-{number}')
+        path = os.path.join(directory, name)
+        if isinstance(profile, cProfile.Profile):
+            profile.dump_stats(path + '.prof')
+        else:
+            with open(path + '.collapsed', 'w') as file:
+                file.writelines(f'{stack} {samples}\n'
+                                for stack, samples in profile.items())
+        rotate(directory, settings.PROFILER_KEEP)
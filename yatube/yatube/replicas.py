@@ -0,0 +1,134 @@
+"""Чтение лент и страниц записей с реплик базы.
+
+Реплики - псевдонимы из settings.DATABASE_REPLICAS. ReplicaRouter
+отправляет на случайную из них чтения моделей REPLICATED_APPS, но
+только внутри view, помеченных replica_reads, и только в GET и HEAD.
+Всё остальное, в том числе сессии и любые записи, идёт в default.
+
+Реплика отстаёт от основной базы, поэтому после записи пользователь
+читает основную базу:
+
+- в том же запросе - после первой записи через ORM;
+- в следующих запросах - пока жива кука PIN_COOKIE, которую
+  ReplicaPinMiddleware ставит на REPLICA_PIN_SECONDS после запроса с
+  записью или с небезопасным методом (POST).
+
+Общие кеши (posts.cache) не заполняются данными с реплики: страница
+для анонимов при промахе кеша рендерится по default (primary_reads),
+а карточки, отрисованные по реплике, в кеш не кладутся. Иначе
+отставшая копия, прочитанная уже после сброса кеша записью, жила бы
+в нём весь срок хранения.
+
+Для разработки и тестов реплики - файлы SQLite, которые sync()
+перезаписывает копией основной базы (команда sync_replicas) вместо
+настоящей репликации.
+"""
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+REPLICATED_APPS = {'posts', 'auth'}
+PIN_COOKIE = 'primary_reads'
+SAFE_METHODS = ('GET', 'HEAD')
+
+_local = threading.local()
+
+
+def pinned(request):
+    return PIN_COOKIE in request.COOKIES
+
+
+def reading_replica():
+    """Идут ли сейчас чтения текущего потока на реплики."""
+    return getattr(_local, 'replica', False)
+
+
+@contextmanager
+def primary_reads():
+    """Читать default внутри блока, даже во view с replica_reads."""
+    replica = reading_replica()
+    _local.replica = False
+    try:
+        yield
+    finally:
+        # после записи в блоке реплики до конца запроса не читаем
+        _local.replica = replica and not getattr(_local, 'wrote', False)
+
+
+def replica_reads(view):
+    """Разрешить view читать с реплик, если запрос не привязан к default."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (not settings.DATABASE_REPLICAS
+                or request.method not in SAFE_METHODS or pinned(request)):
+            return view(request, *args, **kwargs)
+        _local.replica = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _local.replica = False
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (reading_replica()
+                and model._meta.app_label in REPLICATED_APPS):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        # запись видна только в default: дальше читаем оттуда же
+        _local.replica = False
+        _local.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # на репликах те же объекты, что и в default
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # схема реплик приходит вместе с данными из default
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaPinMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.wrote = False
+        response = self.get_response(request)
+        if settings.DATABASE_REPLICAS and (
+                _local.wrote or request.method not in SAFE_METHODS):
+            response.set_cookie(PIN_COOKIE, '1',
+                                max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+def sync(aliases=None):
+    """Копировать default в реплики SQLite целиком, онлайн-бэкапом.
+
+    Подмена репликации для разработки и тестов: читатели реплики во
+    время копирования видят либо старое, либо новое состояние.
+    """
+    source = sqlite3.connect(
+        connections['default'].settings_dict['NAME'], uri=True
+    )
+    try:
+        for alias in aliases or settings.DATABASE_REPLICAS:
+            target = sqlite3.connect(
+                connections[alias].settings_dict['NAME'], uri=True
+            )
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+    finally:
+        source.close()
@@ -40,6 +40,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.profiling.ProfilingMiddleware',
+    'yatube.replicas.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,15 +72,38 @@ TEMPLATES = [
     },
 ]
 
+# разобрать шаблоны проекта при старте процесса (yatube.template_warmup);
+# имеет смысл только с кеширующим загрузчиком, как в settings_production
+TEMPLATES_WARMUP = False
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
+# потоков Django на процесс при запуске через yatube.asgi
+ASGI_THREADS = int(os.environ.get('YATUBE_ASGI_THREADS', 8))
 
+# SQLite в режиме WAL, с повтором запросов при блокировке
+# (yatube.sqlite_backend)
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.sqlite_backend',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 }
 
+# реплики только для чтения (yatube.replicas): YATUBE_DB_REPLICAS=2 -
+# файлы db.replica1.sqlite3 и db.replica2.sqlite3, которые обновляет
+# sync_replicas; в тестах реплики указывают на тестовую default
+DATABASE_REPLICAS: List[str] = []
+for number in range(1, int(os.environ.get('YATUBE_DB_REPLICAS', 0)) + 1):
+    DATABASE_REPLICAS.append(f'replica{number}')
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'yatube.sqlite_backend',
+        'NAME': os.path.join(BASE_DIR, f'db.replica{number}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['yatube.replicas.ReplicaRouter']
+# сколько секунд после записи читать основную базу, а не реплики
+REPLICA_PIN_SECONDS = 5
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -109,6 +135,15 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# изображения принимаются потоково, с проверкой по заголовку,
+# см. posts.uploads
+FILE_UPLOAD_HANDLERS = ['posts.uploads.ImageUploadHandler']
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40 * 1000 * 1000
+# большие изображения при приёме уменьшаются до этого размера по длинной
+# стороне, с запасом для самого широкого варианта posts.thumbnails
+IMAGE_UPLOAD_MAX_DIMENSION = 1920
+
 LOGIN_URL = '/auth/login/'
 LOGIN_REDIRECT_URL = 'index'
 
@@ -121,4 +156,88 @@ CACHES = {
     }
 }
 
+# общий для всех процессов кеш в файле SQLite: YATUBE_CACHE=sqlite
+if os.environ.get('YATUBE_CACHE') == 'sqlite':
+    CACHES['default'] = {
+        'BACKEND': 'yatube.cache_backends.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache.sqlite3')
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
+    }
+
 PAGINATOR_DEFAULT_SIZE = 10
+# наибольшая порция ленты в JSON API (posts.api), параметр limit
+API_PAGE_MAX_SIZE = 100
+# комментариев на странице записи и в одной догрузке «Показать ещё»
+COMMENTS_PAGE_SIZE = 20
+
+# карточки записей сбрасываются сигналами, срок хранения - страховка
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# страницы index и group для анонимов, устаревают со сменой поколения лент
+ANONYMOUS_PAGE_CACHE_TIMEOUT = 60 * 10
+
+# миниатюры изображений строятся после сохранения записи: в фоновом
+# пуле из стольких потоков или, при 0, после коммита в потоке запроса
+THUMBNAIL_WORKERS = int(os.environ.get('YATUBE_THUMBNAIL_WORKERS', 0))
+
+# листать ленты записей курсором по (pub_date, id) вместо номера страницы
+FEED_CURSOR_PAGINATION = False
+
+# лента подписок: авторов с большим числом подписчиков не раскладываем
+# по лентам при публикации, а добираем их записи при чтении
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000
+# автор, опустившийся после отписок до этого порога, снова раскладывается
+# командой push_authors; зазор между порогами гасит колебания около первого
+TIMELINE_PUSH_MAX_FOLLOWERS = 9000
+# сколько последних записей автора добавить в ленту при подписке
+TIMELINE_BACKFILL_SIZE = 1000
+TIMELINE_BATCH_SIZE = 1000
+
+# замеры запросов (yatube.metrics): в лог yatube.requests строкой JSON
+# пишется эта доля запросов и все запросы дольше METRICS_SLOW_REQUEST_MS;
+# выборку включает settings_production, в разработке и тестах её нет
+METRICS_LOG_SAMPLE_RATE = float(
+    os.environ.get('YATUBE_METRICS_SAMPLE_RATE', 0)
+)
+METRICS_SLOW_REQUEST_MS = 500
+# /metrics для Prometheus - только с заголовком Authorization: Bearer
+# METRICS_TOKEN, без токена в настройках страницы нет (404). За
+# обратным прокси REMOTE_ADDR у всех 127.0.0.1, поэтому адреса
+# METRICS_ALLOWED_IPS - лишь дополнительное ограничение, пусто - любые
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = []
+
+# профили медленных запросов (yatube.profiling): 'sampler' или
+# 'cprofile'; без значения профилирование выключено
+PROFILER = os.environ.get('YATUBE_PROFILER') or None
+# профилировать каждый N-й запрос, сохранять профили дольше порога
+PROFILER_EVERY = int(os.environ.get('YATUBE_PROFILER_EVERY', 1))
+PROFILER_SLOW_MS = int(os.environ.get('YATUBE_PROFILER_SLOW_MS', 500))
+PROFILER_INTERVAL_MS = 5
+PROFILER_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILER_KEEP = 200
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'requests': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'yatube.requests': {
+            'handlers': ['requests'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,34 @@
+"""Настройки для production: DJANGO_SETTINGS_MODULE=yatube.settings_production.
+
+Отличаются от yatube.settings выключенным DEBUG, ключом и адресами из
+окружения, постоянными соединениями с базой, выборочным логом замеров
+запросов и кешированием шаблонов: кеширующий загрузчик и прогрев всех
+шаблонов проекта при старте процесса (yatube.template_warmup).
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, TEMPLATES
+from .template_warmup import with_cached_loader
+
+DEBUG = False
+
+SECRET_KEY = os.environ['YATUBE_SECRET_KEY']
+
+ALLOWED_HOSTS = os.environ.get('YATUBE_ALLOWED_HOSTS', 'localhost').split(',')
+
+# соединение с базой и его кеш страниц живут между запросами; запись
+# в atomic() сразу берёт блокировку записи (yatube.sqlite_backend)
+DATABASES['default'].update({
+    'CONN_MAX_AGE': 600,
+    'OPTIONS': {'timeout': 5, 'BUSY_RETRIES': 5,
+                'TRANSACTION_MODE': 'IMMEDIATE'},
+})
+
+TEMPLATES = with_cached_loader(TEMPLATES)
+TEMPLATES_WARMUP = True
+
+# в лог yatube.requests - каждый сотый запрос (yatube.metrics)
+METRICS_LOG_SAMPLE_RATE = float(
+    os.environ.get('YATUBE_METRICS_SAMPLE_RATE', 0.01)
+)
@@ -0,0 +1,130 @@
+"""SQLite с настройками для одновременных чтений и записей.
+
+Встроенный бэкенд открывает файл с журналом по умолчанию (DELETE):
+запись add_comment или profile_follow блокирует чтения index до своего
+завершения. Этот бэкенд при каждом соединении:
+
+- включает WAL: читатели не ждут писателя и видят последнее
+  подтверждённое состояние;
+- synchronous=NORMAL: в режиме WAL не теряет целостности, а fsync
+  делается при checkpoint, а не при каждой транзакции;
+- задаёт mmap_size и cache_size - чтение страниц без лишних копий и
+  больший кеш страниц соединения;
+- если SQLITE_BUSY ("database is locked") всё же вернулся вне
+  транзакции или в транзакции с TRANSACTION_MODE IMMEDIATE - повторяет
+  запрос с нарастающей паузой, а не отдаёт ошибку 500.
+
+Вместе с CONN_MAX_AGE соединение и его кеш страниц живут между
+запросами. Настройка в settings.DATABASES:
+
+    'ENGINE': 'yatube.sqlite_backend',
+    'CONN_MAX_AGE': 600,
+    'OPTIONS': {
+        'timeout': 5,
+        'PRAGMAS': {'mmap_size': 256 * 1024 * 1024},
+        'BUSY_RETRIES': 5,
+        'TRANSACTION_MODE': 'IMMEDIATE',
+    },
+
+PRAGMAS дополняют и заменяют DEFAULT_PRAGMAS. TRANSACTION_MODE
+IMMEDIATE берёт блокировку записи в начале atomic(): транзакция, которая
+сначала читает, а потом пишет, ждёт своей очереди (timeout), а не
+получает SQLITE_BUSY без ожидания при попытке начать запись.
+
+В отложенной (DEFERRED, по умолчанию) транзакции SQLITE_BUSY не
+повторяется: если снимок транзакции устарел (SQLITE_BUSY_SNAPSHOT -
+после её первого чтения кто-то записал), запись в этой транзакции не
+удастся никогда, сколько ни жди.
+"""
+import random
+import time
+
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # отрицательное значение - в килобайтах: 64 МБ на соединение
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+# первая пауза перед повтором, секунды; дальше удваивается
+BUSY_BACKOFF = 0.01
+
+
+def is_busy(error):
+    return 'database is locked' in str(error)
+
+
+class RetryingCursorWrapper(base.SQLiteCursorWrapper):
+    """Курсор, повторяющий запрос при SQLITE_BUSY.
+
+    Запрос, получивший SQLITE_BUSY, ничего не изменил, и вне транзакции
+    его можно выполнить заново. Внутри atomic() - только если
+    транзакция начата BEGIN IMMEDIATE или EXCLUSIVE: у отложенной
+    транзакции SQLITE_BUSY может означать устаревший снимок, и повтор
+    лишь потратит время всех пауз.
+    """
+    retries = 0
+    # DatabaseWrapper, создавший курсор
+    database = None
+
+    def can_retry(self):
+        database = self.database
+        return (database is None or not database.in_atomic_block
+                or database.transaction_mode in ('IMMEDIATE', 'EXCLUSIVE'))
+
+    def _retry(self, method, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return method(*args)
+            except base.Database.OperationalError as error:
+                if (attempt == self.retries or not is_busy(error)
+                        or not self.can_retry()):
+                    raise
+            # пауза со случайной добавкой, чтобы повторы не совпадали
+            time.sleep(BUSY_BACKOFF * 2 ** attempt * (1 + random.random()))
+
+    def execute(self, query, params=None):
+        return self._retry(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self._retry(super().executemany, query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # ключи OPTIONS этого бэкенда, остальные передаются sqlite3.connect
+    OWN_OPTIONS = ('PRAGMAS', 'BUSY_RETRIES', 'TRANSACTION_MODE')
+
+    def __init__(self, settings_dict, alias='default'):
+        super().__init__(settings_dict, alias)
+        options = settings_dict.get('OPTIONS', {})
+        self.pragmas = {**DEFAULT_PRAGMAS, **options.get('PRAGMAS', {})}
+        self.transaction_mode = options.get('TRANSACTION_MODE')
+        self.cursor_class = type('RetryingCursorWrapper',
+                                 (RetryingCursorWrapper,),
+                                 {'retries': options.get('BUSY_RETRIES', 5)})
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for key in self.OWN_OPTIONS:
+            params.pop(key, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=self.cursor_class)
+        cursor.database = self
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,79 @@
+"""Кеширующий загрузчик шаблонов и его прогрев при старте процесса.
+
+Без кеширующего загрузчика (DEBUG и debug в OPTIONS) каждый запрос
+заново читает и разбирает base.html, includes/post_item.html,
+includes/paginator.html и остальные шаблоны страницы. С ним шаблон
+разбирается один раз на процесс - при первом запросе, который его
+рисует, или заранее, в warm_up(), чтобы первые запросы после
+перезапуска воркеров не платили за разбор.
+"""
+import os
+
+CACHED_LOADER = 'django.template.loaders.cached.Loader'
+LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def with_cached_loader(template_settings):
+    """Копия настройки TEMPLATES с кеширующим загрузчиком и без debug.
+
+    APP_DIRS заменяется загрузчиком app_directories: Django не
+    разрешает задавать APP_DIRS вместе с loaders.
+    """
+    result = []
+    for backend in template_settings:
+        backend = dict(backend)
+        options = dict(backend.get('OPTIONS', {}))
+        if backend['BACKEND'].endswith('.DjangoTemplates'):
+            options['context_processors'] = [
+                processor
+                for processor in options.get('context_processors', [])
+                if processor != 'django.template.context_processors.debug'
+            ]
+            options['loaders'] = [(CACHED_LOADER, LOADERS)]
+            options['debug'] = False
+            backend['APP_DIRS'] = False
+        backend['OPTIONS'] = options
+        result.append(backend)
+    return result
+
+
+def template_names(directory):
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith('.html'):
+                path = os.path.relpath(os.path.join(root, name), directory)
+                yield path.replace(os.sep, '/')
+
+
+def warm_up():
+    """Разобрать шаблоны проекта в кеш загрузчика, вернуть их число.
+
+    Берутся шаблоны из каталогов внутри BASE_DIR (templates/ и
+    templates/ приложений проекта); шаблоны admin и других пакетов
+    разбираются, как обычно, при первом обращении. Движки без
+    кеширующего загрузчика пропускаются.
+    """
+    from django.conf import settings
+    from django.template import engines
+    from django.template.backends.django import DjangoTemplates
+    from django.template.loaders.cached import Loader
+
+    warmed = 0
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for loader in backend.engine.template_loaders:
+            if not isinstance(loader, Loader):
+                continue
+            names = set()
+            for inner in loader.loaders:
+                for directory in inner.get_dirs():
+                    if str(directory).startswith(settings.BASE_DIR):
+                        names.update(template_names(directory))
+            for name in sorted(names):
+                backend.get_template(name)
+            warmed += len(names)
+    return warmed
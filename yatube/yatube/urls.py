@@ -19,11 +19,15 @@ from django.urls import include, path
 from django.conf.urls.static import static
 from django.conf import settings
 
+from yatube import metrics
+
 handler404 = "posts.views.page_not_found"
 handler500 = "posts.views.server_error"
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics.metrics, name='metrics'),
+    path('api/v1/', include('posts.api_urls', namespace='api')),
     path('', include('posts.urls')),
     path('about/', include('about.urls', namespace='about')),
     path('auth/', include('django.contrib.auth.urls')),